@@ -1,10 +1,19 @@
 # This file is developed to set up the API interface for data collection
-from abc import ABC, abstractmethod
+import contextlib
+import pickle
+import queue
+import time
+import warnings
 import requests
+from abc import ABC, abstractmethod
 import concurrent.futures
-import threading
-# helper still waited to be developed
-from helpers import get_graph_ql_web_link
+from api_integration.http_session import SessionPool
+from api_integration.response_cache import ResponseCache, make_cache_key
+from api_integration.checkpoint import RequestCheckpoint
+from api_integration.instrumentation import RunMetrics, count_rows, profile_run
+from api_integration.retry_policy import RetryPolicy, TokenBucket, parse_retry_after
+from data_structures.chunked_results import ChunkedResults
+from sql.helpers import get_graph_ql_web_link
 
 
 class APIInputParams:
@@ -17,6 +26,7 @@ class APIInputParams:
             headers: dict = None,
             pivot_function_params: dict = None,
             unpivot_function_params: dict = None,
+            response_decoder=None,
     ) -> None:
         """
             create a parameter objects that holds various parameters sent to APIs
@@ -26,6 +36,8 @@ class APIInputParams:
             :param headers:
             :param pivot_function_params:
             :param unpivot_function_params:
+            :param response_decoder: callable turning the streamed response body (file like,
+            bytes) into the object handed to the pivot function, response.json() if None
             """
         self.url = url
         self.request_type = request_type
@@ -34,13 +46,71 @@ class APIInputParams:
         self.pivot_function_params = pivot_function_params
         self.unpivot_function_params = unpivot_function_params
         self.headers = headers
+        self.response_decoder = response_decoder
 
 NO_OF_WORKERS = 20
+# connection drops, timeouts and truncated bodies, worth another attempt
+_TRANSIENT_ERRORS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError
+)
+
+
+class APIRequestError(Exception):
+
+    def __init__(self, failures: list) -> None:
+        """
+        raised by get_appian_data once every request has been dispatched and at least one failed
+        :param failures: list of (index, APIInputParams, exception) tuples ordered by index
+        """
+        self.failures = failures
+        super().__init__(
+            f'{len(failures)} API request(s) failed: ' + '; '.join(
+                f'#{idx} {api_obj.url}: {exc!r}'
+                for idx, api_obj, exc in failures[:5]
+            )
+        )
+
 
 class APIDataParser:
-        def __init__(self):
-            self._APPIAN_DATA = []
-            self._lock = threading.lock()
+        # requests are sent through the keep-alive sessions of a SessionPool
+        _USES_SESSION_POOL = True
+
+        def __init__(
+                self,
+                session_pool: SessionPool = None,
+                response_cache: ResponseCache = None,
+                response_observer=None,
+                retry_policy: RetryPolicy = None,
+                rate_limiter: TokenBucket = None,
+                transformer=None,
+                metrics: RunMetrics = None
+        ):
+            """
+            :param session_pool: keep-alive sessions shared by the workers, a pool sized to
+            NO_OF_WORKERS is created if not provided and _USES_SESSION_POOL is set
+            :param response_cache: decoded responses are looked up here before a request is
+            sent, nothing is cached if None
+            :param response_observer: called with (pivot_function_params, elapsed seconds,
+            decoded response) after every request, see APIEndPint.observe_response
+            :param retry_policy: timeouts and retries of failed requests, a single attempt
+            without timeout if None
+            :param rate_limiter: paces the requests of every worker sharing it
+            :param transformer: ProcessTransformer running pivot/unpivot on worker processes with
+            the functions it was created with, they run in the calling thread if None
+            :param metrics: stage timers, latencies, bytes and rows are recorded here
+            """
+            self._results = ChunkedResults()
+            if session_pool is None and self._USES_SESSION_POOL:
+                session_pool = SessionPool(NO_OF_WORKERS)
+            self._session_pool = session_pool
+            self._response_cache = response_cache
+            self._response_observer = response_observer
+            self._retry_policy = retry_policy
+            self._rate_limiter = rate_limiter
+            self._transformer = transformer
+            self._metrics = metrics
 
         def api_request(
                 self,
@@ -53,7 +123,8 @@ class APIDataParser:
                 pivot_function_params: dict = None,
                 unpivot_function=None,
                 unpivot_function_params: dict = None,
-                thread_id: int = None):
+                thread_id: int = None,
+                response_decoder=None):
             """
             sends requests to APIs
             :param url: rul
@@ -66,17 +137,18 @@ class APIDataParser:
             :param unpivot_function: function to prepare a print like data format
             :param unpivot_function_params: parameters used in the unpivot_function function
             :param thread_id: can be passed for diagnostics
-            :return:
+            :param response_decoder: decodes the streamed response body, see APIInputParams
+            :return: rows added to the results, with a transformer a future of the rows the
+            caller adds with add_rows, so the thread can go on fetching
             """
-            if request_type == 'get':
-                response_data = self.api_get_request(
-                    url, params, data, headers
-                )
-            elif request_type == 'post':
-                response_data = self.api_post_request(
-                    url, params, data, headers
+            response_data = self.fetch(
+                url, request_type, params, data, headers, response_decoder, pivot_function_params
+            )
+            if self._transformer is not None:
+                return self._transformer.submit(
+                    response_data, pivot_function_params, unpivot_function_params
                 )
-            self.process_response(
+            return self.process_response(
                 response_data,
                 pivot_function,
                 pivot_function_params,
@@ -84,12 +156,110 @@ class APIDataParser:
                 unpivot_function_params
             )
 
+        def observe_response(self, pivot_function_params: dict, started: float, response_data):
+            """
+            reports a response received from the network to the observer, cache hits are not
+            reported as their near zero latency would skew the query planner
+            :param pivot_function_params: identifies the request
+            :param started: time.perf_counter() before the successful attempt was sent
+            :param response_data: decoded response
+            """
+            elapsed = time.perf_counter() - started
+            if self._metrics is not None:
+                self._metrics.observe('request_latency', elapsed)
+            if self._response_observer is not None:
+                self._response_observer(pivot_function_params, elapsed, response_data)
+
+        @property
+        def metrics(self):
+            return self._metrics
+
+        def fetch(
+                self,
+                url: str,
+                request_type: str,
+                params: dict = None,
+                data: dict = None,
+                headers: dict = None,
+                response_decoder=None,
+                pivot_function_params: dict = None,
+                ) -> dict:
+            """
+            sends a get or post request and returns the decoded response
+            :param url: url
+            :param request_type: post or get
+            :param params: parameters passed on to the request call
+            :param data: data passed on to the request call
+            :param headers: headers
+            :param response_decoder: decodes the streamed response body, see APIInputParams
+            :param pivot_function_params: identifies the request to the response observer
+            :return: dict
+            """
+            if request_type not in ('get', 'post'):
+                raise ValueError('Only get and post requests are allowed')
+            cache_key = None
+            if self._response_cache is not None:
+                cache_key = make_cache_key(url, request_type, params, data, response_decoder)
+                response_data = self._response_cache.get(cache_key)
+                if response_data is not None:
+                    if self._metrics is not None:
+                        self._metrics.count('cache_hits')
+                    return response_data
+            send_request = (
+                self.api_get_request if request_type == 'get' else self.api_post_request
+            )
+            attempt = 0
+            while True:
+                if self._rate_limiter is not None:
+                    self._rate_limiter.acquire()
+                try:
+                    # latency of the attempt that succeeded, rate limiting and backoff excluded
+                    started = time.perf_counter()
+                    response_data = send_request(url, params, data, headers, response_decoder)
+                    break
+                except Exception as e:
+                    delay = self.get_retry_delay(e, attempt)
+                    if delay is None:
+                        raise
+                if self._metrics is not None:
+                    self._metrics.count('retries')
+                time.sleep(delay)
+                attempt += 1
+            if self._rate_limiter is not None:
+                self._rate_limiter.on_success()
+            self.observe_response(pivot_function_params, started, response_data)
+            if cache_key is not None:
+                self._response_cache.put(cache_key, response_data, url)
+            return response_data
+
+        def get_retry_delay(self, exception: Exception, attempt: int):
+            """
+            seconds to wait before retrying a failed request, the rate limiter is slowed down on
+            throttled responses
+            :param exception: raised by the request
+            :param attempt: 0 based number of the attempt that failed
+            :return: float or None if the exception should be raised
+            """
+            if isinstance(exception, requests.HTTPError) and exception.response is not None:
+                status = exception.response.status_code
+                retry_after = parse_retry_after(exception.response.headers.get('Retry-After'))
+            elif isinstance(exception, _TRANSIENT_ERRORS):
+                status, retry_after = None, None
+            else:
+                return None
+            if status == 429 and self._rate_limiter is not None:
+                self._rate_limiter.on_throttled()
+            if self._retry_policy is None:
+                return None
+            return self._retry_policy.retry_delay(attempt, status, retry_after)
+
         def api_get_request(
             self,
             url:str,
             params:dict=None,
             data:dict=None,
             headers:dict=None,
+            response_decoder=None,
         ) -> dict:
             """
             get request
@@ -97,16 +267,20 @@ class APIDataParser:
             :param params: get parameters
             :param data: get data
             :param headers: headers
+            :param response_decoder: decodes the streamed response body, see APIInputParams
             :return: dict
             """
-            response = requests.get(
-                url=url if url is not None else None,
-                params=params if params is not None else None,
-                data=data if data is not None else None,
-                headers=headers if headers is not None else None,
+            started = time.perf_counter()
+            response = self._session_pool.request(
+                'get',
+                url=url,
+                params=params,
+                data=data,
+                headers=headers,
+                stream=response_decoder is not None,
+                timeout=self._get_timeout(),
                 )
-            response.raise_for_status()
-            return response.json()
+            return self.decode_and_record(response, response_decoder, started)
 
         def api_post_request(
                 self,
@@ -114,6 +288,7 @@ class APIDataParser:
                 params:dict=None,
                 data:dict=None,
                 headers:dict=None,
+                response_decoder=None,
                 ):
             """
             get data from Appian API returning JSON
@@ -121,16 +296,67 @@ class APIDataParser:
             :param params: graphql statement
             :param data: returned data
             :param headers: headers
+            :param response_decoder: decodes the streamed response body, see APIInputParams
             :return: dict
             """
-            response = requests.post(
-                url=url if url is not None else None,
-                params=params if params is not None else None,
-                data=data if data is not None else None,
-                headers=headers if headers is not None else None,
+            started = time.perf_counter()
+            response = self._session_pool.request(
+                'post',
+                url=url,
+                params=params,
+                data=data,
+                headers=headers,
+                stream=response_decoder is not None,
+                timeout=self._get_timeout(),
             )
-            response.raise_for_status()
-            return response.json()
+            return self.decode_and_record(response, response_decoder, started)
+
+        def _get_timeout(self):
+            return None if self._retry_policy is None else self._retry_policy.timeout
+
+        def decode_and_record(self, response, response_decoder=None, started: float = None):
+            """
+            decode_response recording the http time, time to headers, decode time and bytes of
+            the request. A streamed body is downloaded while it is decoded, its download time
+            counts as decode
+            :param response: requests.Response
+            :param response_decoder: see decode_response
+            :param started: time.perf_counter() before the request was sent
+            :return: dict
+            """
+            metrics = self._metrics
+            if metrics is None:
+                return self.decode_response(response, response_decoder)
+            decode_started = time.perf_counter()
+            metrics.add_time('http', decode_started - started)
+            metrics.observe('time_to_headers', response.elapsed.total_seconds())
+            request = response.request
+            metrics.count('bytes_out', len(request.url) + len(request.body or b''))
+            try:
+                return self.decode_response(response, response_decoder)
+            finally:
+                metrics.add_time('decode', time.perf_counter() - decode_started)
+                # bytes read off the socket, before decompression
+                metrics.count('bytes_in', response.raw.tell())
+
+        @staticmethod
+        def decode_response(response, response_decoder=None):
+            """
+            checks the status and decodes the body, response_decoder reads the body as a stream
+            :param response: requests.Response
+            :param response_decoder: decodes the streamed response body, see APIInputParams
+            :return: dict
+            """
+            if response_decoder is None:
+                response.raise_for_status()
+                return response.json()
+            try:
+                response.raise_for_status()
+                response.raw.decode_content = True
+                return response_decoder(response.raw)
+            finally:
+                # a fully read body has already gone back to the pool, anything else is dropped
+                response.close()
 
         def process_response(
                 self,
@@ -147,26 +373,287 @@ class APIDataParser:
             :param pivot_params: parameters sent to pivot function
             :param unpivot_function: turns columnar data into print like form
             :param unpivot_params: parameters sent to unpivot function
-            :return:
+            :return: rows added to the results
+            """
+            rows = self.transform_response(
+                response_json,
+                pivot_function,
+                pivot_params,
+                unpivot_function,
+                unpivot_params,
+                self._metrics
+            )
+            self._results.add(rows)
+            return rows
+
+        def add_rows(self, rows) -> None:
             """
+            adds rows that did not come from a request, e.g. loaded from a checkpoint
+            :param rows: dict or list of rows
+            """
+            self._results.add(rows)
 
-            pivot_data = (
-                response_json if pivot_function is None
-                else pivot_function(response_json, pivot_params)
+        @staticmethod
+        def transform_response(
+                response_json: dict,
+                pivot_function=None,
+                pivot_params=None,
+                unpivot_function=None,
+                unpivot_params=None,
+                metrics: RunMetrics = None
+                ):
+            """
+            applies pivot and unpivot functions without keeping the result
+            :param response_json: returned data
+            :param pivot_function: turns data into columnar form
+            :param pivot_params: parameters sent to pivot function
+            :param unpivot_function: turns columnar data into print like form
+            :param unpivot_params: parameters sent to unpivot function
+            :param metrics: both functions are timed as stages named after them, rows are
+            counted
+            :return: dict or list of rows
+            """
+            if metrics is None:
+                pivot_data = (
+                    response_json if pivot_function is None
+                    else pivot_function(response_json, pivot_params)
+                )
+                return (
+                    pivot_data if unpivot_function is None
+                    else unpivot_function(pivot_data, unpivot_params)
+                )
+            pivot_data = response_json
+            if pivot_function is not None:
+                with metrics.timer('pivot:' + getattr(pivot_function, '__name__', 'pivot')):
+                    pivot_data = pivot_function(response_json, pivot_params)
+            rows = pivot_data
+            if unpivot_function is not None:
+                with metrics.timer('unpivot:' + getattr(unpivot_function, '__name__', 'unpivot')):
+                    rows = unpivot_function(pivot_data, unpivot_params)
+            metrics.count('rows', count_rows(rows))
+            return rows
+
+        @property
+        def _APPIAN_DATA(self) -> list:
+            return self.get_data()
+
+        def get_data(self) -> list:
+            """
+            every processed row merged into a single list, or into a single
+            ColumnarDatapointStore if the responses were pivoted into stores and not unpivoted
+            :return: list or ColumnarDatapointStore
+            """
+            return self._results.merge()
+
+        def iter_chunks(self):
+            """
+            lazy iterator over the processed responses, one chunk of rows per response
+            """
+            return self._results.iter_chunks()
+
+
+def _as_completed(futures: dict):
+    """
+    concurrent.futures.as_completed over a dict of futures that grows while it is iterated, a
+    future whose result is another future is followed: the latter is added under the same
+    value and yielded once done
+    :param futures: future -> value
+    """
+    completed = queue.Queue()
+    for future in futures:
+        future.add_done_callback(completed.put)
+    remaining = len(futures)
+    while remaining:
+        future = completed.get()
+        remaining -= 1
+        if not future.cancelled() and future.exception() is None:
+            result = future.result()
+            if isinstance(result, concurrent.futures.Future):
+                futures[result] = futures[future]
+                result.add_done_callback(completed.put)
+                remaining += 1
+                continue
+        yield future
+
+
+class APIEndPint(ABC):
+
+    # number of requests in flight at once, subclasses can lower or raise it
+    _NO_OF_WORKERS = NO_OF_WORKERS
+    # gzip request bodies sent by get_appian_data
+    _COMPRESS_REQUESTS = False
+    # 'thread' runs requests on a ThreadPoolExecutor, 'async' on an asyncio event loop
+    _API_ENGINE = 'thread'
+    # number of requests in flight at once when the async engine is used
+    _ASYNC_CONCURRENCY_LIMIT = 1000
+    # seconds a decoded response is served from the response cache, None disables the cache
+    _RESPONSE_CACHE_TTL = None
+    # memory held by the response cache
+    _RESPONSE_CACHE_MAX_BYTES = 256 * 2 ** 20
+    # directory keeping cached responses between runs, memory only if None
+    _RESPONSE_CACHE_DIR = None
+    # timeouts and retries of failed requests
+    _RETRY_POLICY = RetryPolicy()
+    # requests per second sent by all workers together, adapted down on 429 responses.
+    # None sends requests as fast as the workers allow
+    _RATE_LIMIT = None
+    # worker processes running pivot/unpivot, e.g. os.cpu_count(). None runs them in the
+    # I/O threads, fine for light pivots, the pool start up is not worth it there
+    _PIVOT_PROCESSES = None
+    # JSON metrics report written by write_metrics_report, None writes nothing
+    _METRICS_REPORT = None
+    # cProfile dump of the block run under profile(), None does not profile
+    _PROFILE_DUMP = None
+
+    def __getstate__(self) -> dict:
+        # pivot functions are bound methods, the end point travels with them to the pivot
+        # processes without its sessions and metrics
+        state = self.__dict__.copy()
+        state.pop('_session_pool', None)
+        state.pop('_metrics', None)
+        return state
+
+    def get_metrics(self) -> RunMetrics:
+        """
+        stage timers, request latencies, bytes and rows of this end point instance, recorded by
+        every pull it runs
+        :return: RunMetrics
+        """
+        metrics = getattr(self, '_metrics', None)
+        if metrics is None:
+            metrics = RunMetrics()
+            self._metrics = metrics
+        return metrics
+
+    def get_metrics_report(self) -> dict:
+        """
+        the metrics together with connection reuse, response cache and rate limiter counters
+        :return: dict
+        """
+        return self.get_metrics().report(self._get_metrics_extra())
+
+    def _get_metrics_extra(self) -> dict:
+        extra = {}
+        if getattr(self, '_session_pool', None) is not None:
+            # every new connection paid DNS and TLS
+            extra['connections'] = self.get_session_pool_stats()
+        if self.get_response_cache() is not None:
+            extra['response_cache'] = self.get_response_cache_stats()
+        if self.get_rate_limiter() is not None:
+            extra['rate_limiter'] = self.get_rate_limiter().get_stats()
+        return extra
+
+    def write_metrics_report(self, destination=None):
+        """
+        writes get_metrics_report as JSON, called at the end of a run. A report that can not be
+        written is warned about, it never fails the run
+        :param destination: path or text stream, defaults to _METRICS_REPORT
+        :return: the report or None if there is no destination or it could not be written
+        """
+        destination = destination if destination is not None else self._METRICS_REPORT
+        if destination is None:
+            return None
+        try:
+            return self.get_metrics().write_report(destination, self._get_metrics_extra())
+        except OSError as e:
+            warnings.warn(f'metrics report {destination} not written: {e}')
+            return None
+
+    def profile(self, dump_path: str = None):
+        """
+        context manager profiling the block with cProfile, see profile_run
+        :param dump_path: defaults to _PROFILE_DUMP, nothing is profiled if both are None
+        """
+        return profile_run(dump_path if dump_path is not None else self._PROFILE_DUMP)
+
+    def get_session_pool(self, pool_size: int = None) -> SessionPool:
+        """
+        keep-alive sessions reused by every get_appian_data call of this end point
+        :param pool_size: connections kept per host, defaults to _NO_OF_WORKERS. A later call
+        with more workers grows the pools
+        :return: SessionPool
+        """
+        session_pool = getattr(self, '_session_pool', None)
+        if session_pool is None:
+            session_pool = SessionPool(
+                pool_size if pool_size is not None else self._NO_OF_WORKERS,
+                compress_requests=self._COMPRESS_REQUESTS
             )
+            self._session_pool = session_pool
+        elif pool_size is not None:
+            session_pool.set_pool_size(pool_size)
+        return session_pool
 
-            unpivot_data = (
-                pivot_data if unpivot_function is None
-                else unpivot_function(pivot_data, unpivot_params)
+    def get_session_pool_stats(self) -> dict:
+        """
+        connection reuse counters of the end point sessions
+        :return: dict
+        """
+        return self.get_session_pool().get_stats()
+
+    def get_response_cache(self):
+        """
+        response cache of the end point class, shared by its instances so repeated pulls in one
+        process are served locally too. None if _RESPONSE_CACHE_TTL is not set
+        :return: ResponseCache or None
+        """
+        if not self._RESPONSE_CACHE_TTL:
+            return None
+        end_point_class = type(self)
+        response_cache = end_point_class.__dict__.get('_response_cache')
+        if response_cache is None:
+            response_cache = ResponseCache(
+                ttl=self._RESPONSE_CACHE_TTL,
+                max_bytes=self._RESPONSE_CACHE_MAX_BYTES,
+                cache_dir=self._RESPONSE_CACHE_DIR
             )
-            with self._lock:
-                if isinstance(unpivot_data, dict):
-                    self._APPIAN_DATA.append(unpivot_data)
-                else:
-                    self._APPIAN_DATA = self._APPIAN_DATA+unpivot_data
+            end_point_class._response_cache = response_cache
+        return response_cache
+
+    def observe_response(self, pivot_function_params: dict, elapsed: float, response_data):
+        """
+        hook called from the workers after every response of this end point was fetched and
+        decoded, end points override it to tune their requests. Has to be thread safe
+        :param pivot_function_params: pivot_function_params of the request
+        :param elapsed: seconds spent fetching and decoding
+        :param response_data: decoded response
+        """
+        pass
 
+    def get_rate_limiter(self):
+        """
+        token bucket of the end point class, shared by its instances and workers so the rate
+        learnt from throttled responses carries over. None if _RATE_LIMIT is not set
+        :return: TokenBucket or None
+        """
+        if not self._RATE_LIMIT:
+            return None
+        end_point_class = type(self)
+        rate_limiter = end_point_class.__dict__.get('_rate_limiter')
+        if rate_limiter is None:
+            rate_limiter = TokenBucket(self._RATE_LIMIT)
+            end_point_class._rate_limiter = rate_limiter
+        return rate_limiter
 
-class APIEndPint(ABC):
+    def get_transformer(self, pivot_function=None, unpivot_function=None):
+        """
+        process pool for the pivot/unpivot of one pull, see ProcessTransformer
+        :return: ProcessTransformer or None if _PIVOT_PROCESSES is not set or there is nothing to
+        transform
+        """
+        if not self._PIVOT_PROCESSES or (pivot_function is None and unpivot_function is None):
+            return None
+        # imported here, the transformer builds on top of this module
+        from api_integration.process_transform import ProcessTransformer
+        return ProcessTransformer(pivot_function, unpivot_function, self._PIVOT_PROCESSES)
+
+    def get_response_cache_stats(self) -> dict:
+        """
+        hit/miss counters of the response cache, empty if caching is disabled
+        :return: dict
+        """
+        response_cache = self.get_response_cache()
+        return response_cache.get_stats() if response_cache is not None else {}
 
     @abstractmethod
     def build_graph_ql_query_list(self) -> list:
@@ -192,42 +679,184 @@ class APIEndPint(ABC):
 
     def get_appian_data(
             self,
-            list_with_api_objects:list,
-            pivot_function:None,
-            unpivot_function:None,
-            )->list:
+            list_with_api_objects: list,
+            pivot_function=None,
+            unpivot_function=None,
+            max_workers: int = None,
+            fail_fast: bool = False,
+            as_chunks: bool = False,
+            checkpoint: RequestCheckpoint = None,
+            transform_processes: bool = True,
+            ) -> list:
         """
-        pulls data from graph ql API call
+        pulls data from graph ql API call, all requests are submitted up front and collected
+        as they complete so the pull scales with the number of workers
         :param list_with_api_objects: contains api objects that contain input API parameters
         :param pivot_function: turns JSON response into a list of data points
         :param unpivot_function: turns the list of data points into how business expects to receive
         their data
-        :param unpivot_function: procedure
+        :param max_workers: concurrency limit, defaults to _NO_OF_WORKERS of the end point
+        (_ASYNC_CONCURRENCY_LIMIT when _API_ENGINE is 'async')
+        :param fail_fast: cancel outstanding requests and raise on the first failure instead of
+        raising APIRequestError with every failure once all requests are done
+        :param as_chunks: return a lazy iterator over per-response chunks instead of one list
+        :param checkpoint: rows of completed requests are spilled here as they land and
+        requests completed by an earlier run are loaded instead of sent, the checkpoint is
+        cleared once every request succeeded
+        :param transform_processes: pivot/unpivot on the _PIVOT_PROCESSES pool, False runs them
+        in this process e.g. for functions that update state of the caller
         """
-
-        appian_data = APIDataParser()
-        with concurrent.futures.ThreadPoolExecutor(
-            max_workers=NO_OF_WORKERS
-        ) as executor:
-            for idx, api_obj in enumerate(list_with_api_objects):
-                if not isinstance(api_obj, APIInputParams):
-                    raise ValueError("list needs to contain valid APIInputParams objects")
-                res = executor.submit(
-                    lambda p: appian_data.api_request(*p),
-                    [
-                        api_obj.url,
-                        api_obj.request_type,
-                        api_obj.params,
-                        api_obj.data,
-                        api_obj.headers,
-                        pivot_function,
-                        api_obj.unpivot_function_params,
-                        idx
-                    ]
+        transform_functions = (
+            (pivot_function, unpivot_function) if transform_processes else (None, None)
+        )
+        if self._API_ENGINE == 'async':
+            # imported here, the async engine builds on top of this module
+            from api_integration.async_engine import run_appian_data_async
+            with self.get_transformer(*transform_functions) or (
+                    contextlib.nullcontext()
+            ) as transformer:
+                return run_appian_data_async(
+                    list_with_api_objects,
+                    pivot_function,
+                    unpivot_function,
+                    concurrency_limit=(
+                        max_workers if max_workers is not None
+                        else self._ASYNC_CONCURRENCY_LIMIT
+                    ),
+                    fail_fast=fail_fast,
+                    as_chunks=as_chunks,
+                    response_cache=self.get_response_cache(),
+                    response_observer=self.observe_response,
+                    checkpoint=checkpoint,
+                    retry_policy=self._RETRY_POLICY,
+                    rate_limiter=self.get_rate_limiter(),
+                    transformer=transformer,
+                    metrics=self.get_metrics()
                 )
-                if res.exception() is not None:
-                    raise res.exception()
-        return appian_data._APPIAN_DATA
+        for api_obj in list_with_api_objects:
+            if not isinstance(api_obj, APIInputParams):
+                raise ValueError("list needs to contain valid APIInputParams objects")
 
+        max_workers = max_workers if max_workers is not None else self._NO_OF_WORKERS
+        transformer = self.get_transformer(*transform_functions)
+        appian_data = APIDataParser(
+            self.get_session_pool(max_workers),
+            self.get_response_cache(),
+            self.observe_response,
+            self._RETRY_POLICY,
+            self.get_rate_limiter(),
+            transformer,
+            self.get_metrics()
+        )
+        failures = []
+        pending_objects = list(enumerate(list_with_api_objects))
+        request_keys = {}
+        if checkpoint is not None:
+            pending_objects = []
+            for idx, api_obj in enumerate(list_with_api_objects):
+                request_key = checkpoint.request_key(api_obj, pivot_function, unpivot_function)
+                if checkpoint.is_completed(request_key):
+                    try:
+                        appian_data.add_rows(checkpoint.load(request_key))
+                        continue
+                    except (OSError, EOFError, pickle.UnpicklingError):
+                        # an unreadable spill file is fetched again
+                        pass
+                request_keys[idx] = request_key
+                pending_objects.append((idx, api_obj))
+        with transformer or contextlib.nullcontext(), concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers
+        ) as executor:
+            futures = {
+                executor.submit(
+                    appian_data.api_request,
+                    api_obj.url,
+                    api_obj.request_type,
+                    params=api_obj.params,
+                    data=api_obj.data,
+                    headers=api_obj.headers,
+                    pivot_function=pivot_function,
+                    pivot_function_params=api_obj.pivot_function_params,
+                    unpivot_function=unpivot_function,
+                    unpivot_function_params=api_obj.unpivot_function_params,
+                    thread_id=idx,
+                    response_decoder=api_obj.response_decoder
+                ): (idx, api_obj)
+                for idx, api_obj in pending_objects
+            }
+            # with a transformer a request resolves to the future of its rows, followed until
+            # the rows are back
+            for future in _as_completed(futures):
+                exception = future.exception()
+                if exception is None:
+                    if transformer is not None:
+                        appian_data.add_rows(future.result())
+                        appian_data.metrics.count('rows', count_rows(future.result()))
+                    if checkpoint is not None:
+                        checkpoint.save(request_keys[futures[future][0]], future.result())
+                    continue
+                if fail_fast:
+                    # requests that have not started yet are dropped, running ones finish
+                    for pending in futures:
+                        pending.cancel()
+                    raise exception
+                idx, api_obj = futures[future]
+                failures.append((idx, api_obj, exception))
 
+        if failures:
+            raise APIRequestError(sorted(failures, key=lambda __: __[0]))
+        if checkpoint is not None:
+            checkpoint.clear()
+        return appian_data.iter_chunks() if as_chunks else appian_data.get_data()
 
+    def stream_appian_data(
+            self,
+            list_with_api_objects: list,
+            sink,
+            pivot_function=None,
+            unpivot_function=None,
+            max_workers: int = None,
+            transform_workers: int = 1,
+            queue_size: int = None,
+            fail_fast: bool = False,
+    ) -> int:
+        """
+        streaming counterpart of get_appian_data, every response is pivoted, unpivoted and handed
+        to sink as soon as it arrives so nothing is accumulated
+        :param list_with_api_objects: contains api objects that contain input API parameters
+        :param sink: called with each chunk of rows e.g. RowWriter.write_rows
+        :param pivot_function: turns JSON response into a list of data points
+        :param unpivot_function: turns the list of data points into how business expects to receive
+        their data
+        :param max_workers: concurrency limit, defaults to _NO_OF_WORKERS of the end point
+        :param transform_workers: number of threads running pivot/unpivot
+        :param queue_size: capacity of the queues between the stages
+        :param fail_fast: stop fetching on the first failure and raise it
+        :return: number of chunks handed to the sink
+        """
+        # imported here, the pipeline builds on top of this module
+        from api_integration.streaming_pipeline import StreamingPipeline
+        max_workers = max_workers if max_workers is not None else self._NO_OF_WORKERS
+        with self.get_transformer(pivot_function, unpivot_function) or (
+                contextlib.nullcontext()
+        ) as transformer:
+            if transformer is not None:
+                # a transform thread waits on one pivot process at a time
+                transform_workers = max(transform_workers, self._PIVOT_PROCESSES)
+            pipeline = StreamingPipeline(
+                APIDataParser(
+                    self.get_session_pool(max_workers),
+                    self.get_response_cache(),
+                    self.observe_response,
+                    self._RETRY_POLICY,
+                    self.get_rate_limiter(),
+                    metrics=self.get_metrics()
+                ),
+                pivot_function,
+                unpivot_function,
+                fetch_workers=max_workers,
+                transform_workers=transform_workers,
+                queue_size=queue_size,
+                transformer=transformer
+            )
+            return pipeline.run(list_with_api_objects, sink, fail_fast=fail_fast)
@@ -0,0 +1,484 @@
+# This file is developed to run the API integration on an asyncio event loop
+import asyncio
+import functools
+import io
+import json
+import pickle
+import time
+from api_integration.api_interface import APIDataParser
+from api_integration.api_interface import APIInputParams
+from api_integration.api_interface import APIRequestError
+from api_integration.response_cache import ResponseCache, make_cache_key
+from api_integration.checkpoint import RequestCheckpoint
+from api_integration.retry_policy import RetryPolicy, TokenBucket, parse_retry_after
+from api_integration.instrumentation import RunMetrics, count_rows
+
+try:
+    import aiohttp
+except ImportError:
+    # the thread engine keeps working without aiohttp
+    aiohttp = None
+
+ASYNC_CONCURRENCY_LIMIT = 1000
+
+
+class AsyncAPIDataParser(APIDataParser):
+    # requests are sent through the aiohttp session
+    _USES_SESSION_POOL = False
+
+    def __init__(
+            self,
+            session,
+            semaphore: asyncio.Semaphore,
+            pivot_executor=None,
+            response_cache: ResponseCache = None,
+            response_observer=None,
+            retry_policy: RetryPolicy = None,
+            rate_limiter: TokenBucket = None,
+            transformer=None,
+            metrics: RunMetrics = None
+    ):
+        """
+        asyncio counterpart of APIDataParser, responses are fetched on the event loop while
+        JSON decoding, pivot and unpivot run on pivot_executor
+        :param session: aiohttp.ClientSession
+        :param semaphore: bounds the number of requests in flight
+        :param pivot_executor: executor for decode/pivot/unpivot, None uses the loop default
+        :param response_cache: see APIDataParser
+        :param response_observer: see APIDataParser
+        :param retry_policy: see APIDataParser
+        :param rate_limiter: see APIDataParser, waited on without blocking the loop
+        :param transformer: see APIDataParser, decoding stays on pivot_executor
+        :param metrics: see APIDataParser
+        """
+        super().__init__(
+            response_cache=response_cache,
+            response_observer=response_observer,
+            retry_policy=retry_policy,
+            rate_limiter=rate_limiter,
+            transformer=transformer,
+            metrics=metrics
+        )
+        self._timeout = None
+        if retry_policy is not None:
+            self._timeout = aiohttp.ClientTimeout(
+                sock_connect=retry_policy.connect_timeout,
+                sock_read=retry_policy.read_timeout
+            )
+        self._session = session
+        self._semaphore = semaphore
+        self._pivot_executor = pivot_executor
+
+    async def api_request(
+            self,
+            url: str,
+            request_type: str,
+            params: dict = None,
+            data: dict = None,
+            headers: dict = None,
+            pivot_function=None,
+            pivot_function_params: dict = None,
+            unpivot_function=None,
+            unpivot_function_params: dict = None,
+            thread_id: int = None,
+            response_decoder=None):
+        """
+        sends requests to APIs, see APIDataParser.api_request
+        """
+        loop = asyncio.get_running_loop()
+        cache_key = None
+        if self._response_cache is not None:
+            cache_key = make_cache_key(url, request_type, params, data, response_decoder)
+            # unpickling a large response is kept off the event loop as well
+            response_data = await loop.run_in_executor(
+                self._pivot_executor,
+                self._response_cache.get,
+                cache_key
+            )
+            if response_data is not None:
+                if self._metrics is not None:
+                    self._metrics.count('cache_hits')
+                if self._transformer is not None:
+                    return await self.transform_in_process(
+                        response_data, pivot_function_params, unpivot_function_params
+                    )
+                return await loop.run_in_executor(
+                    self._pivot_executor,
+                    functools.partial(
+                        self.process_response,
+                        response_data,
+                        pivot_function,
+                        pivot_function_params,
+                        unpivot_function,
+                        unpivot_function_params
+                    )
+                )
+        if request_type == 'get':
+            send_request = self.api_get_request
+        elif request_type == 'post':
+            send_request = self.api_post_request
+        else:
+            raise ValueError('Only get and post requests are allowed')
+        attempt = 0
+        while True:
+            if self._rate_limiter is not None:
+                await asyncio.sleep(self._rate_limiter.reserve())
+            try:
+                async with self._semaphore:
+                    # time spent waiting for the semaphore is not part of the latency
+                    started = time.perf_counter()
+                    raw_response = await send_request(url, params, data, headers)
+                break
+            except Exception as e:
+                delay = self.get_retry_delay(e, attempt)
+                if delay is None:
+                    raise
+            if self._metrics is not None:
+                self._metrics.count('retries')
+            # the semaphore is released while backing off
+            await asyncio.sleep(delay)
+            attempt += 1
+        if self._rate_limiter is not None:
+            self._rate_limiter.on_success()
+        if self._transformer is not None:
+            response_data = await loop.run_in_executor(
+                self._pivot_executor,
+                functools.partial(
+                    self.decode_raw_response,
+                    raw_response,
+                    pivot_function_params,
+                    response_decoder,
+                    cache_key,
+                    url,
+                    started
+                )
+            )
+            del raw_response
+            return await self.transform_in_process(
+                response_data, pivot_function_params, unpivot_function_params
+            )
+        return await loop.run_in_executor(
+            self._pivot_executor,
+            functools.partial(
+                self.process_raw_response,
+                raw_response,
+                pivot_function,
+                pivot_function_params,
+                unpivot_function,
+                unpivot_function_params,
+                response_decoder,
+                cache_key,
+                url,
+                started
+            )
+        )
+
+    async def transform_in_process(
+            self,
+            response_data: dict,
+            pivot_params: dict = None,
+            unpivot_params: dict = None
+    ):
+        """
+        awaits the pivot/unpivot of a decoded response on the transformer processes
+        :return: rows added to the results
+        """
+        rows = await asyncio.wrap_future(
+            self._transformer.submit(response_data, pivot_params, unpivot_params)
+        )
+        self.add_rows(rows)
+        if self._metrics is not None:
+            self._metrics.count('rows', count_rows(rows))
+        return rows
+
+    def get_retry_delay(self, exception: Exception, attempt: int):
+        """
+        see APIDataParser.get_retry_delay, for aiohttp exceptions
+        """
+        if isinstance(exception, aiohttp.ClientResponseError):
+            status = exception.status
+            retry_after = parse_retry_after(
+                exception.headers.get('Retry-After') if exception.headers else None
+            )
+        elif isinstance(
+                exception,
+                (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError)
+        ):
+            status, retry_after = None, None
+        else:
+            return None
+        if status == 429 and self._rate_limiter is not None:
+            self._rate_limiter.on_throttled()
+        if self._retry_policy is None:
+            return None
+        return self._retry_policy.retry_delay(attempt, status, retry_after)
+
+    async def api_get_request(
+            self,
+            url: str,
+            params: dict = None,
+            data: dict = None,
+            headers: dict = None,
+    ) -> bytes:
+        """
+        get request
+        :return: raw response body
+        """
+        started = time.perf_counter()
+        async with self._session.get(
+            url, params=params, data=data, headers=headers, timeout=self._timeout
+        ) as response:
+            response.raise_for_status()
+            raw_response = await response.read()
+        self.record_raw_response(response, raw_response, started)
+        return raw_response
+
+    async def api_post_request(
+            self,
+            url: str,
+            params: dict = None,
+            data: dict = None,
+            headers: dict = None,
+    ) -> bytes:
+        """
+        post request
+        :return: raw response body
+        """
+        started = time.perf_counter()
+        async with self._session.post(
+            url, params=params, data=data, headers=headers, timeout=self._timeout
+        ) as response:
+            response.raise_for_status()
+            raw_response = await response.read()
+        self.record_raw_response(response, raw_response, started)
+        return raw_response
+
+    def record_raw_response(self, response, raw_response: bytes, started: float) -> None:
+        """
+        records the http time and bytes of a request, see APIDataParser.decode_and_record
+        """
+        if self._metrics is None:
+            return
+        self._metrics.add_time('http', time.perf_counter() - started)
+        self._metrics.count('bytes_in', len(raw_response))
+
+    def process_raw_response(
+            self,
+            raw_response: bytes,
+            pivot_function=None,
+            pivot_params=None,
+            unpivot_function=None,
+            unpivot_params=None,
+            response_decoder=None,
+            cache_key: str = None,
+            url: str = None,
+            started: float = None
+    ):
+        """
+        decodes the body and hands it over to process_response, runs off the event loop
+        :param cache_key: the decoded response is cached under this key if set
+        :param url: endpoint of the request, selects the cache ttl
+        :param started: time.perf_counter() before the request was sent, reported to the
+        response observer
+        """
+        response_data = self.decode_raw_response(
+            raw_response, pivot_params, response_decoder, cache_key, url, started
+        )
+        del raw_response
+        return self.process_response(
+            response_data,
+            pivot_function,
+            pivot_params,
+            unpivot_function,
+            unpivot_params
+        )
+
+
+    def decode_raw_response(
+            self,
+            raw_response: bytes,
+            pivot_params=None,
+            response_decoder=None,
+            cache_key: str = None,
+            url: str = None,
+            started: float = None
+    ) -> dict:
+        """
+        decodes the body, caches it and reports it to the response observer, see
+        process_raw_response
+        :return: decoded response
+        """
+        decode_started = time.perf_counter()
+        response_data = (
+            json.loads(raw_response) if response_decoder is None
+            else response_decoder(io.BytesIO(raw_response))
+        )
+        if self._metrics is not None:
+            self._metrics.add_time('decode', time.perf_counter() - decode_started)
+        if cache_key is not None:
+            self._response_cache.put(cache_key, response_data, url)
+        if started is not None:
+            self.observe_response(pivot_params, started, response_data)
+        return response_data
+
+
+async def _spill_rows(request, checkpoint: RequestCheckpoint, request_key: str, executor):
+    """
+    awaits a request and writes its rows to the checkpoint off the event loop
+    """
+    rows = await request
+    await asyncio.get_running_loop().run_in_executor(
+        executor, checkpoint.save, request_key, rows
+    )
+    return rows
+
+
+async def get_appian_data_async(
+        list_with_api_objects: list,
+        pivot_function=None,
+        unpivot_function=None,
+        concurrency_limit: int = ASYNC_CONCURRENCY_LIMIT,
+        fail_fast: bool = False,
+        pivot_executor=None,
+        as_chunks: bool = False,
+        response_cache: ResponseCache = None,
+        response_observer=None,
+        checkpoint: RequestCheckpoint = None,
+        retry_policy: RetryPolicy = None,
+        rate_limiter: TokenBucket = None,
+        transformer=None,
+        metrics: RunMetrics = None,
+) -> list:
+    """
+    pulls data from the APIs on the running event loop, takes the same input as
+    APIEndPint.get_appian_data
+    :param list_with_api_objects: contains api objects that contain input API parameters
+    :param pivot_function: turns JSON response into a list of data points
+    :param unpivot_function: turns the list of data points into how business expects to receive
+    their data
+    :param concurrency_limit: maximum number of requests in flight
+    :param fail_fast: cancel outstanding requests and raise on the first failure
+    :param pivot_executor: executor for decode/pivot/unpivot, None uses the loop default
+    :param as_chunks: return a lazy iterator over per-response chunks instead of one list
+    :param response_cache: decoded responses are looked up here before a request is sent
+    :param response_observer: called after every response, see APIDataParser
+    :param checkpoint: see APIEndPint.get_appian_data
+    :param retry_policy: timeouts and retries of failed requests
+    :param rate_limiter: paces the requests, shared with other runs of the end point
+    :param transformer: ProcessTransformer running pivot/unpivot, created with the same
+    functions
+    :param metrics: stage timers, latencies, bytes and rows are recorded here
+    :return: list
+    """
+    if aiohttp is None:
+        raise ImportError("the async engine requires aiohttp, pip install aiohttp")
+    for api_obj in list_with_api_objects:
+        if not isinstance(api_obj, APIInputParams):
+            raise ValueError("list needs to contain valid APIInputParams objects")
+
+    connector = aiohttp.TCPConnector(
+        limit=concurrency_limit,
+        limit_per_host=concurrency_limit
+    )
+    async with aiohttp.ClientSession(connector=connector) as session:
+        appian_data = AsyncAPIDataParser(
+            session,
+            asyncio.Semaphore(concurrency_limit),
+            pivot_executor,
+            response_cache,
+            response_observer,
+            retry_policy,
+            rate_limiter,
+            transformer,
+            metrics
+        )
+        pending_objects = list(enumerate(list_with_api_objects))
+        request_keys = {}
+        if checkpoint is not None:
+            pending_objects = []
+            for idx, api_obj in enumerate(list_with_api_objects):
+                request_key = checkpoint.request_key(api_obj, pivot_function, unpivot_function)
+                if checkpoint.is_completed(request_key):
+                    try:
+                        appian_data.add_rows(checkpoint.load(request_key))
+                        continue
+                    except (OSError, EOFError, pickle.UnpicklingError):
+                        # an unreadable spill file is fetched again
+                        pass
+                request_keys[idx] = request_key
+                pending_objects.append((idx, api_obj))
+        tasks = []
+        for idx, api_obj in pending_objects:
+            request = appian_data.api_request(
+                api_obj.url,
+                api_obj.request_type,
+                params=api_obj.params,
+                data=api_obj.data,
+                headers=api_obj.headers,
+                pivot_function=pivot_function,
+                pivot_function_params=api_obj.pivot_function_params,
+                unpivot_function=unpivot_function,
+                unpivot_function_params=api_obj.unpivot_function_params,
+                thread_id=idx,
+                response_decoder=api_obj.response_decoder
+            )
+            if checkpoint is not None:
+                request = _spill_rows(request, checkpoint, request_keys[idx], pivot_executor)
+            tasks.append(asyncio.ensure_future(request))
+        if fail_fast:
+            try:
+                await asyncio.gather(*tasks)
+            except Exception:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+        else:
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            failures = [
+                (idx, api_obj, result)
+                for (idx, api_obj), result in zip(pending_objects, results)
+                if isinstance(result, BaseException)
+            ]
+            if failures:
+                raise APIRequestError(failures)
+    if checkpoint is not None:
+        checkpoint.clear()
+    return appian_data.iter_chunks() if as_chunks else appian_data.get_data()
+
+
+def run_appian_data_async(
+        list_with_api_objects: list,
+        pivot_function=None,
+        unpivot_function=None,
+        concurrency_limit: int = ASYNC_CONCURRENCY_LIMIT,
+        fail_fast: bool = False,
+        as_chunks: bool = False,
+        response_cache: ResponseCache = None,
+        response_observer=None,
+        checkpoint: RequestCheckpoint = None,
+        retry_policy: RetryPolicy = None,
+        rate_limiter: TokenBucket = None,
+        transformer=None,
+        metrics: RunMetrics = None,
+) -> list:
+    """
+    blocking entry point of the async engine, used by APIEndPint.get_appian_data
+    """
+    return asyncio.run(
+        get_appian_data_async(
+            list_with_api_objects,
+            pivot_function,
+            unpivot_function,
+            concurrency_limit=concurrency_limit,
+            fail_fast=fail_fast,
+            as_chunks=as_chunks,
+            response_cache=response_cache,
+            response_observer=response_observer,
+            checkpoint=checkpoint,
+            retry_policy=retry_policy,
+            rate_limiter=rate_limiter,
+            transformer=transformer,
+            metrics=metrics
+        )
+    )
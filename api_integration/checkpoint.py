@@ -0,0 +1,130 @@
+# This file is developed to resume API pulls from the requests that already completed
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+
+from api_integration.local_storage import ensure_private_dir, open_private_file
+from api_integration.local_storage import write_private_file
+
+_SPILL_SUFFIX = '.pkl'
+# statements of the run as they were first planned, see save_plan
+_PLAN_FILE = 'plan.json'
+
+
+def _function_name(function) -> str:
+    return None if function is None else f'{function.__module__}.{function.__qualname__}'
+
+
+def make_run_key(*run_args) -> str:
+    """
+    sha256 of whatever identifies a run, e.g. the command line dict
+    :param run_args: JSON serializable values
+    :return: hex digest
+    """
+    payload = json.dumps(run_args, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class RequestCheckpoint:
+
+    def __init__(self, spill_dir: str, run_key: str, max_age: float = 24 * 3600):
+        """
+        spill directory of a run, the rows of every completed request are written to their own
+        file as soon as the request is processed. A run started again with the same run key
+        loads them instead of sending the requests again. The directories have to belong to the
+        current user and are made private, spill files that are not private files of the user
+        are never unpickled
+        :param spill_dir: parent directory of the runs e.g. get_private_dir('checkpoints')
+        :param run_key: see make_run_key
+        :param max_age: seconds after which a checkpoint left behind is ignored and removed
+        """
+        self._run_dir = os.path.join(ensure_private_dir(spill_dir), run_key)
+        if os.path.isdir(self._run_dir) and time.time() - os.path.getmtime(self._run_dir) > max_age:
+            shutil.rmtree(self._run_dir, ignore_errors=True)
+        ensure_private_dir(self._run_dir)
+        self._completed = {
+            name[:-len(_SPILL_SUFFIX)]
+            for name in os.listdir(self._run_dir)
+            if name.endswith(_SPILL_SUFFIX)
+        }
+
+    @staticmethod
+    def request_key(api_obj, pivot_function=None, unpivot_function=None) -> str:
+        """
+        identifies a request together with the functions its rows come from
+        :param api_obj: APIInputParams
+        :param pivot_function: pivot function the rows were built with
+        :param unpivot_function: unpivot function the rows were built with
+        :return: hex digest
+        """
+        return make_run_key(
+            api_obj.url,
+            api_obj.request_type,
+            api_obj.params,
+            api_obj.data,
+            api_obj.pivot_function_params,
+            api_obj.unpivot_function_params,
+            _function_name(pivot_function),
+            _function_name(unpivot_function)
+        )
+
+    def _spill_path(self, key: str) -> str:
+        return os.path.join(self._run_dir, key + _SPILL_SUFFIX)
+
+    def is_completed(self, key: str) -> bool:
+        return key in self._completed
+
+    def load(self, key: str):
+        """
+        rows of a completed request
+        :param key: see request_key
+        :return: rows as returned by the pivot/unpivot functions
+        """
+        with open_private_file(self._spill_path(key)) as f:
+            return pickle.load(f)
+
+    def save(self, key: str, rows) -> None:
+        """
+        persists the rows of a completed request, a crash while writing leaves no partial file
+        :param key: see request_key
+        :param rows: rows as returned by the pivot/unpivot functions
+        """
+        write_private_file(
+            self._spill_path(key), pickle.dumps(rows, protocol=pickle.HIGHEST_PROTOCOL)
+        )
+        self._completed.add(key)
+
+    def load_plan(self):
+        """
+        plan saved by an earlier attempt of the run
+        :return: decoded plan or None if there is none or it can not be read
+        """
+        try:
+            with open_private_file(os.path.join(self._run_dir, _PLAN_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_plan(self, plan) -> None:
+        """
+        keeps what the requests of the run were built from, e.g. the query batches. A request
+        key covers the batching of its request, an attempt started again has to send the same
+        requests to find the spilled ones whatever the planner would choose by then
+        :param plan: JSON serializable
+        """
+        write_private_file(
+            os.path.join(self._run_dir, _PLAN_FILE), json.dumps(plan).encode('utf-8')
+        )
+
+    def __len__(self) -> int:
+        return len(self._completed)
+
+    def clear(self) -> None:
+        """
+        removes the spill directory, called once every request of the run completed
+        """
+        shutil.rmtree(self._run_dir, ignore_errors=True)
+        self._completed = set()
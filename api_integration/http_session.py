@@ -0,0 +1,180 @@
+# This file is developed to share keep-alive HTTP connections between the API workers
+import gzip
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class SessionPool:
+
+    def __init__(
+            self,
+            pool_size: int,
+            per_thread: bool = False,
+            compress_requests: bool = False,
+            compress_responses: bool = True,
+    ) -> None:
+        """
+        holds requests sessions whose connection pools are sized to the number of workers so
+        that TCP+TLS connections to the API hosts are reused between requests
+        :param pool_size: number of connections kept alive per host, normally the worker count
+        :param per_thread: give every worker thread its own session instead of one shared session,
+        the session of a thread that ended is closed when the next one is handed out
+        :param compress_requests: gzip request bodies and send Content-Encoding: gzip
+        :param compress_responses: ask the server for gzip/deflate encoded responses
+        """
+        self._pool_size = pool_size
+        self._per_thread = per_thread
+        self._compress_requests = compress_requests
+        self._compress_responses = compress_responses
+        self._lock = threading.Lock()
+        self._sessions = []
+        self._shared_session = None
+        # thread -> session of the thread, per_thread only
+        self._thread_sessions = {}
+
+    def _mount_adapter(self, session: requests.Session) -> None:
+        adapter = HTTPAdapter(
+            pool_connections=self._pool_size,
+            pool_maxsize=self._pool_size
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+    def _new_session(self) -> requests.Session:
+        """
+        creates a session with a keep-alive adapter mounted for http and https
+        :return: requests.Session
+        """
+        session = requests.Session()
+        self._mount_adapter(session)
+        session.headers['Connection'] = 'keep-alive'
+        session.headers['Accept-Encoding'] = (
+            'gzip, deflate' if self._compress_responses else 'identity'
+        )
+        self._sessions.append(session)
+        return session
+
+    def get_session(self) -> requests.Session:
+        """
+        returns the session the calling thread should use
+        :return: requests.Session
+        """
+        if self._per_thread:
+            thread = threading.current_thread()
+            session = self._thread_sessions.get(thread)
+            if session is None:
+                with self._lock:
+                    self._close_dead_thread_sessions()
+                    session = self._thread_sessions[thread] = self._new_session()
+            return session
+        if self._shared_session is None:
+            with self._lock:
+                if self._shared_session is None:
+                    self._shared_session = self._new_session()
+        return self._shared_session
+
+    def _close_dead_thread_sessions(self) -> None:
+        """
+        closes the sessions of the threads that ended, e.g. the workers of an earlier
+        get_appian_data call. Call with the lock held
+        """
+        for thread in [thread for thread in self._thread_sessions if not thread.is_alive()]:
+            session = self._thread_sessions.pop(thread)
+            session.close()
+            self._sessions.remove(session)
+
+    def set_pool_size(self, pool_size: int) -> None:
+        """
+        grows the connection pools of every session to pool_size, a smaller size keeps the
+        current pools
+        :param pool_size: connections kept alive per host
+        """
+        with self._lock:
+            if pool_size <= self._pool_size:
+                return
+            self._pool_size = pool_size
+            for session in self._sessions:
+                adapters = set(session.adapters.values())
+                self._mount_adapter(session)
+                # idle connections of the old pools are closed, busy ones are dropped on release
+                for adapter in adapters:
+                    adapter.close()
+
+    def request(
+            self,
+            method: str,
+            url: str,
+            params: dict = None,
+            data: dict = None,
+            headers: dict = None,
+            **kwargs
+    ) -> requests.Response:
+        """
+        sends a request over a pooled connection
+        :param method: get or post
+        :param url: url
+        :param params: query string parameters
+        :param data: request body
+        :param headers: headers
+        :param kwargs: passed on to Session.send e.g. timeout or stream
+        :return: requests.Response
+        """
+        session = self.get_session()
+        request = session.prepare_request(
+            requests.Request(
+                method.upper(),
+                url,
+                params=params,
+                data=data,
+                headers=headers
+            )
+        )
+        if self._compress_requests and request.body:
+            body = (
+                request.body.encode('utf-8') if isinstance(request.body, str)
+                else request.body
+            )
+            request.body = gzip.compress(body)
+            request.headers['Content-Encoding'] = 'gzip'
+            request.headers['Content-Length'] = str(len(request.body))
+        settings = session.merge_environment_settings(
+            request.url, {}, kwargs.pop('stream', None), None, None
+        )
+        return session.send(request, **{**settings, **kwargs})
+
+    def get_stats(self) -> dict:
+        """
+        connection reuse counters, a miss is a request that had to open a new connection
+        :return: dict with requests, hits, misses and sessions
+        """
+        num_requests = 0
+        num_connections = 0
+        with self._lock:
+            sessions = list(self._sessions)
+        for session in sessions:
+            for adapter in set(session.adapters.values()):
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    pool = pools.get(key)
+                    if pool is None:
+                        continue
+                    num_requests += pool.num_requests
+                    num_connections += pool.num_connections
+        return {
+            'requests': num_requests,
+            'hits': max(num_requests - num_connections, 0),
+            'misses': num_connections,
+            'sessions': len(sessions)
+        }
+
+    def close(self) -> None:
+        """
+        closes every session and the connections they keep alive
+        """
+        with self._lock:
+            for session in self._sessions:
+                session.close()
+            self._sessions = []
+            self._shared_session = None
+            self._thread_sessions = {}
@@ -0,0 +1,183 @@
+# This file is developed to time the stages of an API pull and report them at the end of a run
+import bisect
+import contextlib
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+
+# upper bounds in seconds of the latency histogram buckets, the last bucket is open ended
+_LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0
+)
+_PERCENTILES = (50, 90, 99)
+
+
+def count_rows(rows) -> int:
+    """
+    rows of a pivot/unpivot result, a dict counts as a single row
+    """
+    if isinstance(rows, dict):
+        return 1
+    return len(rows) if hasattr(rows, '__len__') else 0
+
+
+class RunMetrics:
+
+    def __init__(self):
+        """
+        per-stage timers, latency histograms and counters of a run. Recording is a
+        perf_counter pair and a few additions under a lock, cheap enough to stay on in
+        production. Thread safe
+        """
+        self._lock = threading.Lock()
+        # stage -> [calls, seconds, max seconds]
+        self._stages = {}
+        # name -> [count per bucket, sum, max]
+        self._histograms = {}
+        self._counters = {}
+        self._started = time.time()
+        self._started_perf = time.perf_counter()
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            timer = self._stages.get(stage)
+            if timer is None:
+                self._stages[stage] = [1, seconds, seconds]
+                return
+            timer[0] += 1
+            timer[1] += seconds
+            if seconds > timer[2]:
+                timer[2] = seconds
+
+    @contextlib.contextmanager
+    def timer(self, stage: str):
+        """
+        times the block as a call of stage, failures included
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - started)
+
+    def observe(self, name: str, seconds: float) -> None:
+        """
+        adds a latency to the histogram of name
+        """
+        idx = bisect.bisect_left(_LATENCY_BUCKETS, seconds)
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = [[0] * (len(_LATENCY_BUCKETS) + 1), 0.0, 0.0]
+            histogram[0][idx] += 1
+            histogram[1] += seconds
+            if seconds > histogram[2]:
+                histogram[2] = seconds
+
+    def count(self, name: str, value: int = 1) -> None:
+        """
+        adds value to the counter of name e.g. bytes_in or rows
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    @staticmethod
+    def _percentile(buckets: list, total: int, percentile: int, max_seconds: float) -> float:
+        """
+        upper bound of the bucket the percentile falls in
+        """
+        rank = total * percentile / 100.0
+        seen = 0
+        for idx, bucket_count in enumerate(buckets):
+            seen += bucket_count
+            if seen >= rank:
+                return _LATENCY_BUCKETS[idx] if idx < len(_LATENCY_BUCKETS) else max_seconds
+        return max_seconds
+
+    def report(self, extra: dict = None) -> dict:
+        """
+        JSON serializable snapshot of everything recorded so far
+        :param extra: added to the report as is e.g. connection or cache stats
+        :return: dict
+        """
+        with self._lock:
+            stages = {
+                stage: {
+                    'calls': calls,
+                    'seconds': round(seconds, 6),
+                    'mean_seconds': round(seconds / calls, 6),
+                    'max_seconds': round(max_seconds, 6)
+                }
+                for stage, (calls, seconds, max_seconds) in sorted(self._stages.items())
+            }
+            histograms = {}
+            for name, (buckets, seconds, max_seconds) in sorted(self._histograms.items()):
+                total = sum(buckets)
+                histograms[name] = {
+                    'count': total,
+                    'mean_seconds': round(seconds / total, 6),
+                    'max_seconds': round(max_seconds, 6),
+                    **{
+                        f'p{percentile}_seconds': self._percentile(
+                            buckets, total, percentile, max_seconds
+                        )
+                        for percentile in _PERCENTILES
+                    },
+                    'buckets': {
+                        (f'le_{_LATENCY_BUCKETS[idx]}' if idx < len(_LATENCY_BUCKETS)
+                         else 'inf'): bucket_count
+                        for idx, bucket_count in enumerate(buckets)
+                        if bucket_count
+                    }
+                }
+            counters = dict(sorted(self._counters.items()))
+        report = {
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self._started)),
+            'wall_seconds': round(time.perf_counter() - self._started_perf, 6),
+            'stages': stages,
+            'latency': histograms,
+            'counters': counters
+        }
+        if extra:
+            report.update(extra)
+        return report
+
+    def write_report(self, destination=sys.stderr, extra: dict = None) -> dict:
+        """
+        writes the report as JSON
+        :param destination: path or text stream
+        :param extra: see report
+        :return: the report
+        """
+        report = self.report(extra)
+        if isinstance(destination, str):
+            temp_path = f'{destination}.{os.getpid()}.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump(report, f, indent=2)
+            os.replace(temp_path, destination)
+        else:
+            destination.write(json.dumps(report, indent=2) + '\n')
+        return report
+
+
+@contextlib.contextmanager
+def profile_run(dump_path: str = None):
+    """
+    cProfile of the block written to dump_path, read it with pstats or snakeviz. Only the
+    calling thread is profiled, worker threads show up as the time spent waiting on them.
+    Nothing is profiled if dump_path is None
+    :param dump_path: file the stats are dumped to
+    """
+    if dump_path is None:
+        yield None
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(dump_path)
@@ -0,0 +1,85 @@
+# This file is developed to keep local caches of the API pulls in directories only their user can reach
+import os
+import stat
+import threading
+
+# parent of every local cache, one directory per user
+_LOCAL_STORAGE_ROOT = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+    'appian_fdr'
+)
+
+
+def _get_uid():
+    # no uids on windows, the profile directory is private there
+    return os.getuid() if hasattr(os, 'getuid') else None
+
+
+def get_private_dir(name: str) -> str:
+    """
+    path of a cache directory under the cache directory of the user, see ensure_private_dir
+    :param name: directory name e.g. response_cache
+    :return: str
+    """
+    return os.path.join(_LOCAL_STORAGE_ROOT, name)
+
+
+def ensure_private_dir(path: str) -> str:
+    """
+    creates the directory readable by its owner only. An existing directory has to be a real
+    directory owned by the current user, its group/other permissions are removed
+    :param path: directory
+    :return: path
+    :raises PermissionError: the directory belongs to another user or is a symlink
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    path_stat = os.lstat(path)
+    uid = _get_uid()
+    if uid is None:
+        return path
+    if not stat.S_ISDIR(path_stat.st_mode) or path_stat.st_uid != uid:
+        raise PermissionError(f'{path} is not a directory owned by the current user')
+    if stat.S_IMODE(path_stat.st_mode) & 0o077:
+        os.chmod(path, 0o700)
+    return path
+
+
+def open_private_file(path: str):
+    """
+    opens a file of a private directory for reading, files that are symlinks, belong to another
+    user or can be written by group/other are refused so their content is never loaded
+    :param path: file
+    :return: binary file object
+    :raises PermissionError: the file can not be trusted
+    """
+    fd = os.open(path, os.O_RDONLY | getattr(os, 'O_NOFOLLOW', 0))
+    file_stat = os.fstat(fd)
+    uid = _get_uid()
+    if uid is not None and (
+            not stat.S_ISREG(file_stat.st_mode)
+            or file_stat.st_uid != uid
+            or file_stat.st_mode & 0o022
+    ):
+        os.close(fd)
+        raise PermissionError(f'{path} is not a private file of the current user')
+    return os.fdopen(fd, 'rb')
+
+
+def write_private_file(path: str, *chunks: bytes) -> None:
+    """
+    writes the file readable by its owner only, through a temporary file so readers never see
+    a partial file
+    :param path: file
+    :param chunks: content
+    """
+    temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
@@ -0,0 +1,92 @@
+# This file is developed to run pivot/unpivot on worker processes next to the I/O threads
+import concurrent.futures
+import multiprocessing
+from api_integration.api_interface import APIDataParser
+
+# pivot and unpivot functions of a worker process, set once by the pool initializer so the
+# tasks only carry the response and the function parameters
+_worker_functions = (None, None)
+
+
+def _init_worker(pivot_function, unpivot_function) -> None:
+    global _worker_functions
+    _worker_functions = (pivot_function, unpivot_function)
+
+
+def _transform_in_worker(response_json: dict, pivot_params: dict, unpivot_params: dict):
+    pivot_function, unpivot_function = _worker_functions
+    return APIDataParser.transform_response(
+        response_json,
+        pivot_function,
+        pivot_params,
+        unpivot_function,
+        unpivot_params
+    )
+
+
+def _get_mp_context():
+    # the I/O threads are already running when workers start, forking them could copy a held
+    # lock into the child
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+class ProcessTransformer:
+
+    def __init__(self, pivot_function=None, unpivot_function=None, processes: int = None):
+        """
+        process pool running the pure python pivot/unpivot loops on every core instead of in
+        the I/O threads, where they hold the GIL the network threads need. The functions are
+        pickled once per worker, bound methods take their instance along so end points have to
+        be picklable, see APIEndPint.__getstate__. Rows come back pickled, a
+        ColumnarDatapointStore as its numpy arrays
+        :param pivot_function: turns JSON response into a list of data points
+        :param unpivot_function: turns the list of data points into how business expects to receive
+        their data
+        :param processes: worker processes, defaults to the number of cores
+        """
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=_get_mp_context(),
+            initializer=_init_worker,
+            initargs=(pivot_function, unpivot_function)
+        )
+
+    def submit(
+            self,
+            response_json: dict,
+            pivot_params: dict = None,
+            unpivot_params: dict = None
+    ) -> concurrent.futures.Future:
+        """
+        hands a decoded response to a worker
+        :param response_json: decoded response
+        :param pivot_params: parameters sent to pivot function
+        :param unpivot_params: parameters sent to unpivot function
+        :return: future of the rows
+        """
+        return self._executor.submit(
+            _transform_in_worker, response_json, pivot_params, unpivot_params
+        )
+
+    def transform(
+            self,
+            response_json: dict,
+            pivot_params: dict = None,
+            unpivot_params: dict = None
+    ):
+        """
+        blocking submit, the calling thread releases the GIL while the worker runs
+        :return: dict or list of rows
+        """
+        return self.submit(response_json, pivot_params, unpivot_params).result()
+
+    def shutdown(self, cancel_futures: bool = False) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=cancel_futures)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # outstanding work of a failed pull is dropped
+        self.shutdown(cancel_futures=exc_type is not None)
@@ -0,0 +1,261 @@
+# This file is developed to serve repeated API requests from a local cache
+import hashlib
+import json
+import os
+import pickle
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+from api_integration.local_storage import ensure_private_dir, open_private_file
+from api_integration.local_storage import write_private_file
+
+# expiry timestamp written in front of the pickled response in the disk files
+_DISK_HEADER = struct.Struct('<d')
+_DISK_SUFFIX = '.pkl'
+_MISS = object()
+
+
+def make_cache_key(
+        url: str,
+        request_type: str,
+        params: dict = None,
+        data: dict = None,
+        response_decoder=None
+) -> str:
+    """
+    sha256 of the request, headers are left out as they carry credentials rather than the query.
+    The decoder is part of the key as it changes what is cached
+    :param url: url
+    :param request_type: get or post
+    :param params: parameters passed on to the request call
+    :param data: data passed on to the request call
+    :param response_decoder: decoder set on APIInputParams
+    :return: hex digest
+    """
+    decoder_name = (
+        None if response_decoder is None
+        else f'{response_decoder.__module__}.{response_decoder.__qualname__}'
+    )
+    payload = json.dumps(
+        [url, request_type, params, data, decoder_name],
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+
+    def __init__(
+            self,
+            ttl: float = 3600,
+            max_bytes: int = 256 * 2 ** 20,
+            cache_dir: str = None,
+            disk_max_bytes: int = 2 * 2 ** 30,
+            endpoint_ttls: dict = None
+    ):
+        """
+        two tier cache of decoded API responses, an in-memory LRU in front of an optional
+        directory of pickle files. Responses are kept pickled, so the size bound is exact and a
+        hit hands out a fresh copy the pivot functions can not alter for later hits. The disk
+        directory has to belong to the current user and is made private, files that are not
+        private files of the user are never unpickled
+        :param ttl: seconds a response stays valid
+        :param max_bytes: memory tier size, least recently used responses are evicted first
+        :param cache_dir: directory of the disk tier e.g. get_private_dir('response_cache'),
+        memory only if None
+        :param disk_max_bytes: disk tier size, least recently used files are removed first
+        :param endpoint_ttls: url -> ttl overriding ttl for single endpoints
+        """
+        self._ttl = ttl
+        self._max_bytes = max_bytes
+        self._cache_dir = cache_dir
+        self._disk_max_bytes = disk_max_bytes
+        self._endpoint_ttls = dict(endpoint_ttls or {})
+        self._lock = threading.Lock()
+        # key -> (expires_at, pickled response)
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        # key -> file size, least recently used first
+        self._disk = OrderedDict()
+        self._disk_bytes = 0
+        self._stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'evictions': 0
+        }
+        if cache_dir is not None:
+            ensure_private_dir(cache_dir)
+            self._load_disk_index()
+
+    def _load_disk_index(self) -> None:
+        entries = []
+        for entry in os.scandir(self._cache_dir):
+            if entry.is_file() and entry.name.endswith(_DISK_SUFFIX):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-len(_DISK_SUFFIX)], stat.st_size))
+        for __, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self._cache_dir, key + _DISK_SUFFIX)
+
+    def get_ttl(self, url: str) -> float:
+        """
+        ttl of the endpoint
+        :param url: url
+        :return: seconds
+        """
+        return self._endpoint_ttls.get(url, self._ttl)
+
+    def set_ttl(self, url: str, ttl: float) -> None:
+        self._endpoint_ttls[url] = ttl
+
+    def get(self, key: str, default=None):
+        """
+        looks the key up in memory and then on disk, a disk hit is promoted to memory
+        :param key: see make_cache_key
+        :param default: returned on a miss
+        :return: decoded response
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    blob = entry[1]
+                else:
+                    self._drop_memory(key)
+                    self._stats['expired'] += 1
+                    entry = None
+        if entry is not None:
+            return pickle.loads(blob)
+
+        value = self._get_from_disk(key, now)
+        if value is _MISS:
+            with self._lock:
+                self._stats['misses'] += 1
+            return default
+        return value
+
+    def _get_from_disk(self, key: str, now: float):
+        if self._cache_dir is None:
+            return _MISS
+        with self._lock:
+            if key not in self._disk:
+                return _MISS
+            self._disk.move_to_end(key)
+        try:
+            with open_private_file(self._disk_path(key)) as cache_file:
+                expires_at, = _DISK_HEADER.unpack(cache_file.read(_DISK_HEADER.size))
+                blob = cache_file.read() if expires_at > now else None
+        except (OSError, struct.error):
+            with self._lock:
+                self._drop_disk(key)
+            return _MISS
+        with self._lock:
+            if blob is None:
+                self._drop_disk(key)
+                self._stats['expired'] += 1
+                return _MISS
+            self._stats['disk_hits'] += 1
+            self._put_memory(key, expires_at, blob)
+        return pickle.loads(blob)
+
+    def put(self, key: str, value, url: str = None) -> None:
+        """
+        caches a decoded response in both tiers
+        :param key: see make_cache_key
+        :param value: decoded response, has to be picklable
+        :param url: endpoint of the request, selects the ttl
+        """
+        ttl = self.get_ttl(url)
+        if not ttl or ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._put_memory(key, expires_at, blob)
+        if self._cache_dir is not None:
+            self._put_disk(key, expires_at, blob)
+
+    def _put_memory(self, key: str, expires_at: float, blob: bytes) -> None:
+        if len(blob) > self._max_bytes:
+            return
+        self._drop_memory(key)
+        self._memory[key] = (expires_at, blob)
+        self._memory_bytes += len(blob)
+        while self._memory_bytes > self._max_bytes:
+            oldest = next(iter(self._memory))
+            self._drop_memory(oldest)
+            self._stats['evictions'] += 1
+
+    def _put_disk(self, key: str, expires_at: float, blob: bytes) -> None:
+        size = _DISK_HEADER.size + len(blob)
+        if size > self._disk_max_bytes:
+            return
+        try:
+            write_private_file(self._disk_path(key), _DISK_HEADER.pack(expires_at), blob)
+        except OSError:
+            # the disk tier is best effort, the memory tier still has the response
+            return
+        with self._lock:
+            self._disk_bytes -= self._disk.pop(key, 0)
+            self._disk[key] = size
+            self._disk_bytes += size
+            while self._disk_bytes > self._disk_max_bytes:
+                oldest = next(iter(self._disk))
+                self._drop_disk(oldest)
+                self._stats['evictions'] += 1
+
+    def _drop_memory(self, key: str) -> None:
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= len(entry[1])
+
+    def _drop_disk(self, key: str) -> None:
+        size = self._disk.pop(key, None)
+        if size is None:
+            return
+        self._disk_bytes -= size
+        try:
+            os.remove(self._disk_path(key))
+        except OSError:
+            pass
+
+    def clear(self) -> None:
+        """
+        empties both tiers
+        """
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            for key in list(self._disk):
+                self._drop_disk(key)
+
+    def get_stats(self) -> dict:
+        """
+        hit/miss counters and the size of both tiers
+        :return: dict
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+            stats['memory_bytes'] = self._memory_bytes
+            stats['disk_entries'] = len(self._disk)
+            stats['disk_bytes'] = self._disk_bytes
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_ratio'] = (
+            (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        )
+        return stats
+
+    def __len__(self) -> int:
+        return len(self._memory)
@@ -0,0 +1,190 @@
+# This file is developed to retry failed API requests and pace them to the server rate limit
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# throttled or temporarily unavailable, anything else is not retried
+_RETRY_STATUSES = (408, 429, 500, 502, 503, 504)
+_THROTTLE_STATUS = 429
+
+
+def parse_retry_after(value, now: float = None):
+    """
+    seconds to wait from a Retry-After header, given in seconds or as an HTTP date
+    :param value: header value
+    :param now: current time.time(), for dates
+    :return: float or None if missing or not understood
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+    return max(0.0, retry_at - (now if now is not None else time.time()))
+
+
+class RetryPolicy:
+
+    def __init__(
+            self,
+            max_attempts: int = 5,
+            backoff_base: float = 0.5,
+            backoff_max: float = 30.0,
+            connect_timeout: float = 10.0,
+            read_timeout: float = 300.0,
+            retry_statuses: tuple = _RETRY_STATUSES,
+            retry_after_max: float = 120.0,
+    ):
+        """
+        how a request is retried: exponential backoff with full jitter, so workers failing
+        together do not come back together, a Retry-After sent by the server is honoured instead
+        :param max_attempts: attempts including the first one
+        :param backoff_base: upper bound of the first delay, doubled on every attempt
+        :param backoff_max: upper bound of any delay
+        :param connect_timeout: seconds to open a connection
+        :param read_timeout: seconds to wait for the server between bytes of the response
+        :param retry_statuses: HTTP statuses worth retrying
+        :param retry_after_max: Retry-After values above this are cut down to it
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retry_statuses = frozenset(retry_statuses)
+        self.retry_after_max = retry_after_max
+
+    @property
+    def timeout(self) -> tuple:
+        """
+        (connect, read) timeout as requests expects it
+        """
+        return self.connect_timeout, self.read_timeout
+
+    def backoff(self, attempt: int) -> float:
+        """
+        full jitter delay after the given failed attempt, 0 based
+        """
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def retry_delay(self, attempt: int, status: int = None, retry_after: float = None):
+        """
+        delay before the next attempt
+        :param attempt: 0 based number of the attempt that failed
+        :param status: HTTP status of the failure, None for connection errors and timeouts
+        :param retry_after: seconds from the Retry-After header
+        :return: seconds or None if the request should not be retried
+        """
+        if attempt + 1 >= self.max_attempts:
+            return None
+        if status is not None and status not in self.retry_statuses:
+            return None
+        if retry_after is not None:
+            # jittered as well, or every throttled worker comes back in the same instant
+            return min(retry_after, self.retry_after_max) + random.uniform(0, self.backoff_base)
+        return self.backoff(attempt)
+
+
+class TokenBucket:
+
+    def __init__(
+            self,
+            rate: float,
+            capacity: float = None,
+            min_rate: float = 0.5,
+            max_rate: float = None,
+            increase: float = None,
+            decrease_factor: float = 0.5,
+            decrease_interval: float = 1.0,
+    ):
+        """
+        request limiter shared by every worker of an end point. Tokens refill at rate per second
+        up to capacity and a request takes one. The rate adapts additive increase/multiplicative
+        decrease: it is cut on every throttled response and grows back slowly with successful
+        ones, so the pace settles just under the server limit
+        :param rate: requests per second to start with
+        :param capacity: burst size, defaults to a tenth of a second of requests
+        :param min_rate: the rate is never cut below this
+        :param max_rate: the rate never grows above this, defaults to rate
+        :param increase: requests per second added per second of successful requests,
+        defaults to 5% of max_rate
+        :param decrease_factor: the rate is multiplied by this when throttled
+        :param decrease_interval: throttled responses within this many seconds of a cut are
+        counted but do not cut the rate again
+        """
+        self._max_rate = max_rate if max_rate is not None else rate
+        self._min_rate = min(min_rate, self._max_rate)
+        self._rate = rate
+        self._capacity = capacity if capacity is not None else max(1.0, rate / 10)
+        self._increase = increase if increase is not None else 0.05 * self._max_rate
+        self._decrease_factor = decrease_factor
+        self._decrease_interval = decrease_interval
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self._stats = {'acquired': 0, 'waited': 0.0, 'throttled': 0}
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """
+        takes a token, the caller has to wait the returned seconds before sending. Used by the
+        async engine, which waits on the event loop
+        :return: seconds to wait
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            self._stats['acquired'] += 1
+            wait = 0.0 if self._tokens >= 0 else -self._tokens / self._rate
+            self._stats['waited'] += wait
+            return wait
+
+    def acquire(self) -> None:
+        """
+        blocks until a request may be sent
+        """
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def on_success(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # additive increase, spread over the requests sent in a second
+            self._rate = min(self._max_rate, self._rate + self._increase / max(self._rate, 1.0))
+
+    def on_throttled(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._stats['throttled'] += 1
+            # requests in flight when the limit was hit come back throttled together, the rate is
+            # cut once for them
+            if now - self._last_decrease < self._decrease_interval:
+                return
+            self._last_decrease = now
+            self._rate = max(self._min_rate, self._rate * self._decrease_factor)
+            self._tokens = min(self._tokens, 0.0)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['rate'] = self._rate
+        return stats
@@ -0,0 +1,190 @@
+# This file is developed to stream API responses through pivot/unpivot into a writer
+import queue
+import threading
+from api_integration.api_interface import APIDataParser
+from api_integration.api_interface import APIInputParams
+from api_integration.api_interface import APIRequestError
+
+# marks the end of the work on a stage queue
+_STOP = object()
+
+
+class StreamingPipeline:
+
+    def __init__(
+            self,
+            parser: APIDataParser,
+            pivot_function=None,
+            unpivot_function=None,
+            fetch_workers: int = 20,
+            transform_workers: int = 1,
+            queue_size: int = None,
+            transformer=None,
+    ):
+        """
+        fetch -> transform -> write pipeline connected by bounded queues. A stage blocks when
+        the next one falls behind, so at most queue_size responses and row chunks are held in
+        memory whatever the number of requests
+        :param parser: sends the requests, its session pool is reused
+        :param pivot_function: turns JSON response into a list of data points
+        :param unpivot_function: turns the list of data points into how business expects to receive
+        their data
+        :param fetch_workers: number of requests in flight
+        :param transform_workers: number of threads running pivot/unpivot
+        :param queue_size: capacity of each stage queue, defaults to fetch_workers
+        :param transformer: ProcessTransformer the transform threads hand the responses to,
+        created with the same pivot/unpivot functions
+        """
+        self._parser = parser
+        self._pivot_function = pivot_function
+        self._unpivot_function = unpivot_function
+        self._fetch_workers = fetch_workers
+        self._transform_workers = transform_workers
+        self._transformer = transformer
+        queue_size = queue_size if queue_size is not None else fetch_workers
+        self._transform_queue = queue.Queue(maxsize=queue_size)
+        self._write_queue = queue.Queue(maxsize=queue_size)
+        self._failures = []
+        self._failures_lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def run(
+            self,
+            list_with_api_objects: list,
+            sink,
+            fail_fast: bool = False,
+    ) -> int:
+        """
+        runs every request through the pipeline, sink is called from the calling thread
+        :param list_with_api_objects: contains api objects that contain input API parameters
+        :param sink: called with each chunk of rows e.g. RowWriter.write_rows
+        :param fail_fast: stop fetching on the first failure and raise it
+        :return: number of chunks handed to the sink
+        """
+        for api_obj in list_with_api_objects:
+            if not isinstance(api_obj, APIInputParams):
+                raise ValueError("list needs to contain valid APIInputParams objects")
+        self._fail_fast = fail_fast
+
+        work_queue = queue.Queue()
+        for idx, api_obj in enumerate(list_with_api_objects):
+            work_queue.put((idx, api_obj))
+
+        fetchers = [
+            threading.Thread(target=self._fetch_stage, args=(work_queue,), daemon=True)
+            for __ in range(max(1, min(self._fetch_workers, len(list_with_api_objects))))
+        ]
+        transformers = [
+            threading.Thread(target=self._transform_stage, daemon=True)
+            for __ in range(max(1, self._transform_workers))
+        ]
+        for worker in fetchers + transformers:
+            worker.start()
+
+        def close_stages():
+            for worker in fetchers:
+                worker.join()
+            for __ in transformers:
+                self._transform_queue.put(_STOP)
+            for worker in transformers:
+                worker.join()
+            self._write_queue.put(_STOP)
+
+        closer = threading.Thread(target=close_stages, daemon=True)
+        closer.start()
+
+        chunks = 0
+        try:
+            while True:
+                rows = self._write_queue.get()
+                if rows is _STOP:
+                    break
+                sink(rows)
+                chunks += 1
+        except BaseException:
+            # the writer failed, stop the other stages and drain so they can exit
+            self._stop_event.set()
+            while closer.is_alive():
+                try:
+                    self._write_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            raise
+        closer.join()
+
+        if self._failures:
+            failures = sorted(self._failures, key=lambda __: __[0])
+            if fail_fast:
+                raise failures[0][2]
+            raise APIRequestError(failures)
+        return chunks
+
+    def _record_failure(self, idx: int, api_obj: APIInputParams, exception: Exception) -> None:
+        with self._failures_lock:
+            self._failures.append((idx, api_obj, exception))
+        if self._fail_fast:
+            self._stop_event.set()
+
+    def _fetch_stage(self, work_queue: queue.Queue) -> None:
+        while not self._stop_event.is_set():
+            try:
+                idx, api_obj = work_queue.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                response_data = self._parser.fetch(
+                    api_obj.url,
+                    api_obj.request_type,
+                    api_obj.params,
+                    api_obj.data,
+                    api_obj.headers,
+                    api_obj.response_decoder,
+                    api_obj.pivot_function_params
+                )
+            except Exception as e:
+                self._record_failure(idx, api_obj, e)
+                continue
+            self._put(self._transform_queue, (idx, api_obj, response_data))
+
+    def _transform_stage(self) -> None:
+        while True:
+            item = self._transform_queue.get()
+            if item is _STOP:
+                return
+            if self._stop_event.is_set():
+                continue
+            idx, api_obj, response_data = item
+            try:
+                if self._transformer is not None:
+                    rows = self._transformer.transform(
+                        response_data,
+                        api_obj.pivot_function_params,
+                        api_obj.unpivot_function_params
+                    )
+                else:
+                    rows = self._parser.transform_response(
+                        response_data,
+                        self._pivot_function,
+                        api_obj.pivot_function_params,
+                        self._unpivot_function,
+                        api_obj.unpivot_function_params,
+                        self._parser.metrics
+                    )
+            except Exception as e:
+                self._record_failure(idx, api_obj, e)
+                continue
+            del response_data, item
+            if isinstance(rows, dict):
+                rows = [rows]
+            self._put(self._write_queue, rows)
+
+    def _put(self, stage_queue: queue.Queue, item) -> None:
+        """
+        blocking put that gives up once the pipeline is being stopped
+        """
+        while not self._stop_event.is_set():
+            try:
+                stage_queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
@@ -1,30 +1,89 @@
 import requests
-from datetime import datetime
 import json
 import sys
 import csv
+import hashlib
+import os
 
 from api_integration.api_interface import APIEndPint
-from data_structures.ordered_fdr_date import DataOrderedContainer
+from data_structures.ordered_fdr_data import DataOrderedContainer, ColumnarOrderedContainer
 from config.appian_fdr_config import AppianFDRConfig
 from config.appian_fdr_config import _APPIAN_TEMPLATE_NAME_KEY
 from config.appian_fdr_config import _APPIAN_NICKNAME_LIST_KEY
 from config.appian_fdr_config import _APPIAN_FDR_ID_LIST_KEY
+from config.appian_fdr_config import _APPIAN_START_DATE_KEY
+from config.appian_fdr_config import _APPIAN_END_DATE_KEY
 from api_integration.api_interface import APIInputParams
-from sql.helpers import list_to_string, unwrap_nick_temps_and_sectors
+from api_integration.api_interface import APIDataParser
+from api_integration.checkpoint import RequestCheckpoint, make_run_key
+from api_integration.local_storage import get_private_dir
+from sql.helpers import unwrap_nick_temps_and_sectors
 from sql.helpers import get_graph_ql_web_link, get_value_from_api_dict
+from sql.helpers import parse_statement_date
 from sql.helpers import _HELIOS_NICKNAME_TEMPLATE_SECTOR_TUPLE_KEY
 from config.fdr_template_mapping import FDRTemplateMap
+from writers.row_writers import get_row_writer
+from appian_graphql.fdr_response_decoder import decode_fdr_response
+from appian_graphql.fdr_response_decoder import stream_decode_fdr_response
+from appian_graphql.fdr_watermarks import FDRWatermarkStore, window_date
+from appian_graphql.query_planner import FDRQueryPlanner, planned_pivot, count_datapoints
+from appian_graphql.query_planner import planned_unpivot
+from appian_graphql.query_planner import _QUERY_GROUP, _QUERY_BATCH
+from appian_graphql.statement_compiler import CompiledStatement, compile_statement
+from data_structures.datapoint_snapshot import DatapointSnapshot, DatapointSnapshotWriter
+from data_structures.datapoint_snapshot import snapshot_segment
+
+
+def _id_sort_key(value) -> tuple:
+    """
+    numeric ids sort by value, anything else after them as text
+    """
+    return (0, int(value), '') if str(value).isdigit() else (1, 0, str(value))
+
+
+class _MultiPivot:
+
+    def __init__(self, pivot_functions: list):
+        # a class rather than a closure so the pivots can be pickled to pivot processes
+        self._pivot_functions = [planned_pivot(function) for function in pivot_functions]
+        self.__name__ = '+'.join(
+            getattr(function, '__name__', 'pivot') for function in pivot_functions
+        )
+
+    def __call__(self, p_json_data: dict, metadata: dict = None) -> tuple:
+        return tuple(function(p_json_data, metadata) for function in self._pivot_functions)
 
 
 class FDRHandle(APIEndPint):
+    # parse responses incrementally, lower peak memory for a slower decode
+    _LOW_MEMORY_DECODE = False
+    # off, a cached response hides statements changed in Appian since it was fetched. Analysts
+    # re-running the same pulls can set e.g. 15 * 60, and get_private_dir('response_cache') as
+    # _RESPONSE_CACHE_DIR to share the cache across runs
+    _RESPONSE_CACHE_TTL = None
+    # snapshot kept by get_incremental_data
+    _SNAPSHOT_DIR = get_private_dir('fdr_snapshot')
+    # statements dated up to this many days before the watermark are fetched again
+    _INCREMENTAL_LOOKBACK_DAYS = 7
+    # latency/size observations the query planner tunes its chunk sizes from
+    _QUERY_PLANNER_STATE = os.path.join(get_private_dir('query_planner'), 'state.json')
+    # off, every completed request would be pickled on the collecting thread. Long pulls that
+    # should resume where a failed run stopped can set get_private_dir('checkpoints')
+    _CHECKPOINT_DIR = None
+    # checkpoints older than this are discarded instead of resumed
+    _CHECKPOINT_MAX_AGE = 24 * 3600
+    # timing report of the run, None writes nothing, see APIEndPint.write_metrics_report.
+    # Concurrent runs need a path of their own, e.g. under get_private_dir('metrics')
+    _METRICS_REPORT = None
 
     def __init__(
             self,
             cmd_arg_str: str,
             operation_mode: str,
             fdr_type: str,
-            graph_statement: str
+            graph_statement: str,
+            engine: str = None,
+            columnar: bool = False
     ):
         """
         Builds initial statement given the input dictionary. cmd_arg_str is received as string at first
@@ -33,94 +92,320 @@ class FDRHandle(APIEndPint):
         :param operation_mode: annual or latest, FDR data aggregation
         :param fdr_type: core, complimentary or all
         :param graph_statement:
+        :param engine: 'thread' or 'async', overrides the API engine of the class
+        :param columnar: pivot_function returns a ColumnarDatapointStore instead of dict rows
         """
+        if engine is not None:
+            self._API_ENGINE = engine
         self._config = AppianFDRConfig()
         self._FDR_MAP = FDRTemplateMap(fdr_type)
-        self._FDRStatements = (
-            self.build_graph_ql_query_list(
-                json.loads(cmd_arg_str),
-                graph_statement
+        # kept to rebuild the statements of an incremental pull
+        self._json_headers = json.loads(cmd_arg_str)
+        self._graph_statement = graph_statement
+        self._query_planner = FDRQueryPlanner(state_path=self._QUERY_PLANNER_STATE)
+        with self.get_metrics().timer('build_statements'):
+            self._query_batches = self.plan_queries(self._json_headers)
+            self._FDRStatements = (
+                self.build_graph_ql_query_list(
+                    self._json_headers,
+                    graph_statement,
+                    self._query_batches
+                )
             )
-        )
-        self._OFC = DataOrderedContainer(operation_mode)
+        self._operation_mode = operation_mode
+        self._columnar = columnar
+
+    def __getstate__(self) -> dict:
+        # what the pivot functions need in a pivot process, see APIEndPint.__getstate__
+        state = super().__getstate__()
+        for attr in ('_query_planner', '_query_batches', '_FDRStatements', '_FDRData'):
+            state.pop(attr, None)
+        return state
+
+    def plan_queries(self, json_headers: dict) -> list:
+        """
+        the query planner splits large nickname lists into chunks and merges small
+        template/sector groups that share a query
+        :param json_headers: HTTP headers passed via Helios call
+        :return: list of QueryBatch
+        """
+        groups = [
+            _QUERY_GROUP(
+                self._FDR_MAP.get_template_name(template_id, sector_id),
+                self._FDR_MAP.get_fdr(template_id, sector_id),
+                template_id,
+                sector_id,
+                nicknames_matching_template
+            )
+            for (template_id, sector_id), nicknames_matching_template
+            in self.group_nicknames(json_headers)
+        ]
+        return self._query_planner.plan(groups)
 
     def build_graph_ql_query_list(
             self,
             json_headers: dict,
-            graph_statement: str
+            graph_statement: str,
+            batches: list = None
     ) -> list:
         """
-        Prepares FDR graph ql statement list
+        Prepares FDR graph ql statement list, one statement per query batch
         :param json_headers: HTTP headers passed via Helios call
         :param graph_statement: function to get the latest graph statement
+        :param batches: see plan_queries, planned from json_headers if None
         :return:
         """
-        graph_ql = graph_statement
+        statement = self.compile_graph_statement(graph_statement)
+        statement_values = self.get_statement_values(json_headers)
+        if batches is None:
+            batches = self.plan_queries(json_headers)
+        statement_list = []
+        for batch in batches:
+            template_id, sector_id, __ = batch.parts[0]
+            api_input = self.build_api_input(
+                statement, statement_values, template_id, sector_id, batch.nicknames
+            )
+            api_input.pivot_function_params['template_name'] = batch.template_name
+            api_input.pivot_function_params['nickname_count'] = len(batch.nicknames)
+            if len(batch.parts) > 1:
+                # merged query, planned_pivot splits the response by nickname and
+                # planned_unpivot the datapoints, each part keeps its own unpivot params
+                api_input.pivot_function_params['parts'] = [
+                    {
+                        'template_id': part_template_id,
+                        'sector_id': part_sector_id,
+                        'nickname_ids': part_nicknames
+                    }
+                    for part_template_id, part_sector_id, part_nicknames in batch.parts
+                ]
+                api_input.unpivot_function_params['parts'] = [
+                    self.get_function_params(
+                        part_template_id, part_sector_id, part_nicknames
+                    )[1]
+                    for part_template_id, part_sector_id, part_nicknames in batch.parts
+                ]
+            statement_list.append(api_input)
+        return statement_list
+
+    def observe_response(self, pivot_function_params: dict, elapsed: float, response_data):
+        """
+        feeds the query planner, see APIEndPint.observe_response
+        """
+        if not pivot_function_params or 'template_name' not in pivot_function_params:
+            return
+        self._query_planner.observe(
+            pivot_function_params['template_name'],
+            pivot_function_params['nickname_count'],
+            elapsed,
+            count_datapoints(response_data)
+        )
+
+    def compile_graph_statement(self, graph_statement: str) -> CompiledStatement:
+        """
+        the statement parsed once for every statement key, see CompiledStatement
+        :param graph_statement: graph ql statement with the statement keys
+        :return: CompiledStatement
+        """
+        return compile_statement(
+            graph_statement,
+            tuple(
+                [stmnt_key for __, stmnt_key in self._config.get_http_arg_map_key_pairs()]
+                + [
+                    _APPIAN_START_DATE_KEY,
+                    _APPIAN_TEMPLATE_NAME_KEY,
+                    _APPIAN_NICKNAME_LIST_KEY,
+                    _APPIAN_FDR_ID_LIST_KEY
+                ]
+            )
+        )
+
+    def get_statement_values(self, json_headers: dict) -> dict:
+        """
+        values of the statement keys sent via Helios or their fall back values
+        :param json_headers: HTTP headers passed via Helios call
+        :return: dict of statement key -> value
+        """
+        statement_values = {}
         for http_key, stmnt_key in self._config.get_http_arg_map_key_pairs():
 
             # if http_key has been sent via Helios call
-            # replace the stmnt_key with the received data
+            # use the received data for the stmnt_key
             if http_key in json_headers:
-                graph_ql = graph_ql.replace(
-                    stmnt_key, list_to_string(json_headers[http_key])
-                )
+                statement_values[stmnt_key] = json_headers[http_key]
             # if http_key has not been sent via Helios call
             # check default fall back parameters
             elif self._config.is_stmt_in_fallback_params(stmnt_key):
-                graph_ql = graph_ql.replace(
-                    stmnt_key,
-                    list_to_string(
-                        self._config.get_fallback_graph_key(stmnt_key)
-                    )
-                )
+                statement_values[stmnt_key] = self._config.get_fallback_graph_key(stmnt_key)
+        return statement_values
 
+    @staticmethod
+    def group_nicknames(json_headers: dict) -> list:
+        """
+        nicknames sent via Helios grouped by template and sector in one pass, groups are sorted
+        so the statement list does not depend on the order of the tuples
+        :param json_headers: HTTP headers passed via Helios call
+        :return: list of ((template_id, sector_id), nickname list)
+        """
         # nickname and templates
-        nick_and_temps, UNIQUE_TEMPLATE_SECTORS = unwrap_nick_temps_and_sectors(
+        nick_and_temps, __ = unwrap_nick_temps_and_sectors(
             json_headers[_HELIOS_NICKNAME_TEMPLATE_SECTOR_TUPLE_KEY]
         )
-        statement_list = []
-        for template_id, sector_id in UNIQUE_TEMPLATE_SECTORS:
-            nicknames_matching_template = [
-                __[0] for __ in nick_and_temps
-                if __[1] == template_id and __[2] == sector_id
-
-            ]
-            fdrs = self._FDR_MAP.get_fdr(
-                template_id,
-                sector_id
+        groups = {}
+        for nickname_id, template_id, sector_id in nick_and_temps:
+            # a dict keeps the nicknames in input order and drops repeated tuples
+            groups.setdefault((template_id, sector_id), {})[nickname_id] = None
+        return [
+            (template_sector, list(groups[template_sector]))
+            for template_sector in sorted(
+                groups,
+                key=lambda template_sector: tuple(_id_sort_key(__) for __ in template_sector)
             )
-            query_statement = (
-                graph_ql.replace(
-                    _APPIAN_TEMPLATE_NAME_KEY,
-                    self._FDR_MAP.get_template_name(template_id, sector_id)
-                ).replace(
-                    _APPIAN_NICKNAME_LIST_KEY,
-                    list_to_string(nicknames_matching_template)
-                ).replace(
-                    _APPIAN_FDR_ID_LIST_KEY,
-                    list_to_string(fdrs)
-                )
+        ]
+
+    def build_api_input(
+            self,
+            statement: CompiledStatement,
+            statement_values: dict,
+            template_id,
+            sector_id,
+            nicknames_matching_template: list
+    ) -> APIInputParams:
+        """
+        request of a template/sector for the given nicknames
+        :param statement: see compile_graph_statement
+        :param statement_values: see get_statement_values
+        :return: APIInputParams
+        """
+        pivot_params, unpivot_params = self.get_function_params(
+            template_id, sector_id, nicknames_matching_template
+        )
+        return APIInputParams(
+            url=get_graph_ql_web_link(),
+            request_type='get',
+            params=statement.render_params(
+                {
+                    _APPIAN_TEMPLATE_NAME_KEY: self._FDR_MAP.get_template_name(
+                        template_id, sector_id
+                    ),
+                    _APPIAN_NICKNAME_LIST_KEY: nicknames_matching_template,
+                    _APPIAN_FDR_ID_LIST_KEY: self._FDR_MAP.get_fdr(template_id, sector_id),
+                    # values sent via Helios win, e.g. an explicit FDR id list
+                    **statement_values
+                }
+            ),
+            pivot_function_params=pivot_params,
+            unpivot_function_params=unpivot_params,
+            response_decoder=(
+                stream_decode_fdr_response if self._LOW_MEMORY_DECODE
+                else decode_fdr_response
             )
-            pivot_params = {
-                'template_id': template_id,
-                'sector_id': sector_id
+        )
 
+    @staticmethod
+    def get_function_params(template_id, sector_id, nicknames_matching_template: list) -> tuple:
+        """
+        parameters handed to the pivot and unpivot functions for a template/sector
+        :return: (pivot_params, unpivot_params)
+        """
+        pivot_params = {
+            'template_id': template_id,
+            'sector_id': sector_id
+
+        }
+        unpivot_params = {
+            **pivot_params,
+            **{'nickname_ids': nicknames_matching_template}
+        }
+        return pivot_params, unpivot_params
+
+    def get_query_shape(self, template_id, sector_id, statement_values: dict) -> str:
+        """
+        digest of what a statement of the template/sector asks for besides its nicknames and
+        dates: the graph statement, the FDR ids and every other statement key such as
+        STATEMENT_TYPE. Snapshot statements are only reused by pulls of the same shape
+        :param statement_values: see get_statement_values
+        :return: str
+        """
+        shape = {
+            'graph_statement': self._graph_statement,
+            _APPIAN_FDR_ID_LIST_KEY: self._FDR_MAP.get_fdr(template_id, sector_id),
+            **{
+                stmnt_key: value for stmnt_key, value in statement_values.items()
+                if stmnt_key not in (_APPIAN_START_DATE_KEY, _APPIAN_END_DATE_KEY)
             }
-            unpivot_params = {
-                **pivot_params,
-                **{'nickname_ids': nicknames_matching_template}
-            }
-            statement_list.append(
-                APIInputParams(
-                    url=get_graph_ql_web_link(),
-                    request_type='get',
-                    params={'query': query_statement},
-                    pivot_function_params=pivot_params,
-                    unpivot_function_params=unpivot_params
+        }
+        return hashlib.sha256(
+            json.dumps(shape, sort_keys=True, default=str).encode('utf-8')
+        ).hexdigest()[:16]
+
+    def build_incremental_query_list(
+            self,
+            watermark_store: FDRWatermarkStore,
+            lookback_days: int = 0
+    ) -> list:
+        """
+        statement list of an incremental pull, the nicknames of a template/sector are split by
+        their START_DATE so that every query only asks for statements after the watermark.
+        Nicknames without a watermark, or whose snapshot starts after the START_DATE sent via
+        Helios, keep the START_DATE sent via Helios
+        :param watermark_store: snapshot the watermarks are read from
+        :param lookback_days: days fetched again before the watermark
+        :return: list of APIInputParams, pivot_function_params carry nickname_ids, start_date,
+        window_start and query_shape
+        """
+        statement = self.compile_graph_statement(self._graph_statement)
+        statement_values = self.get_statement_values(self._json_headers)
+        window_start = window_date(statement_values.get(_APPIAN_START_DATE_KEY))
+        statement_list = []
+        for (template_id, sector_id), nicknames in self.group_nicknames(self._json_headers):
+            query_shape = self.get_query_shape(template_id, sector_id, statement_values)
+            nicknames_by_start = {}
+            for nickname_id in nicknames:
+                start_date = watermark_store.get_start_date(
+                    nickname_id,
+                    template_id,
+                    sector_id,
+                    query_shape,
+                    lookback_days,
+                    window_start
                 )
-            )
+                nicknames_by_start.setdefault(start_date, []).append(nickname_id)
+            for start_date, start_nicknames in nicknames_by_start.items():
+                api_input = self.build_api_input(
+                    statement,
+                    statement_values if start_date is None
+                    else {**statement_values, _APPIAN_START_DATE_KEY: start_date},
+                    template_id,
+                    sector_id,
+                    start_nicknames
+                )
+                api_input.pivot_function_params = {
+                    **api_input.pivot_function_params,
+                    'nickname_ids': start_nicknames,
+                    'start_date': start_date,
+                    'window_start': window_start,
+                    'query_shape': query_shape
+                }
+                statement_list.append(api_input)
         return statement_list
 
+    @staticmethod
+    def _parse_statement_date(report_date, agent_id, nickname_id):
+        """
+        normalized statement date, None with an error message if it can not be parsed
+        :param report_date: statementDate of the statement
+        :return: StatementDate or None
+        """
+        try:
+            return parse_statement_date(report_date)
+        except (TypeError, ValueError) as e:
+            print(
+                "Error for " + str(agent_id) + "" + str(report_date)
+                + "" + str(nickname_id)
+            )
+            print(str(e))
+            return None
+
     def pivot_function(self, p_json_data: dict, metadata: dict = None) -> dict:
         """
         Turns Json response into {{},{},{},{}...}
@@ -128,11 +413,23 @@ class FDRHandle(APIEndPint):
         :param metadata: dict
         :return:
         """
+        # one container per response so memory does not grow with the number of responses,
+        # the columnar one appends the winners straight to columns
+        ordered_container = (
+            ColumnarOrderedContainer if self._columnar else DataOrderedContainer
+        )(self._operation_mode)
+        sector_id = metadata['sector_id']
+        template_id = metadata['template_id']
         for agent_details in p_json_data['data']['getFDRData']:
             agent_id = agent_details['agent']['agent_id']
             nickname_id = agent_details['nicknameId']
             for agent_data in agent_details['statementMaster']:
                 report_date = agent_data['statementDate']
+                # the date is parsed once per statement, every datapoint below shares it
+                statement_date = self._parse_statement_date(report_date, agent_id, nickname_id)
+                if statement_date is None:
+                    continue
+                year_int = statement_date.year
                 period_type = get_value_from_api_dict(
                     'periodType', 'periodTypeDesc', agent_data
                 )
@@ -142,29 +439,34 @@ class FDRHandle(APIEndPint):
                         for datapoint in datapoints['stmntData']:
                             try:
                                 # only get datapoints with adjusted value present
-                                if datapoint['adjustedValue'] is not None:
-                                    year_int = int(
-                                        datetime.strftime(
-                                            datetime.strftime(
-                                                report_date,
-                                                '%Y-%m-%d'
-                                            ),
-                                            '%Y'
-                                        )
+                                if datapoint['adjustedValue'] is None:
+                                    continue
+                                if self._columnar:
+                                    ordered_container.add_datapoint(
+                                        statement_date.date_key,
+                                        period_type,
+                                        agent_id,
+                                        nickname_id,
+                                        datapoint['fdrId'],
+                                        year_int,
+                                        float(datapoint['adjustedValue'])
                                     )
+                                else:
                                     data = {
                                         'agent_id': agent_id,
                                         'nickname_id': nickname_id,
-                                        'sector_id': metadata['sector_id'],
-                                        'template_id': metadata['template_id'],
+                                        'sector_id': sector_id,
+                                        'template_id': template_id,
                                         'report_date': year_int,
                                         'period_type': period_type,
                                         'fdr_id': datapoint['fdrId'],
-                                        'adjustedVaule': float(
+                                        'adjustedValue': float(
                                             datapoint['adjustedValue']
                                         )
                                     }
-                                    self._OFC.add_data(report_date, period_type, data)
+                                    ordered_container.add_data(
+                                        statement_date.date_key, period_type, data
+                                    )
                             except Exception as e:
                                 print(
                                     "Error for " + str(agent_id) + "" + str(report_date)
@@ -172,7 +474,9 @@ class FDRHandle(APIEndPint):
                                     + "" + str(datapoint['adjustedValue'])
                                 )
                                 print(str(e))
-        return self._OFC.get_data()
+        if self._columnar:
+            return ordered_container.get_data(sector_id, template_id)
+        return ordered_container.get_data()
 
     def pivot_function_with_details(self, p_json_data: dict, metadata: dict = None) -> dict:
         """
@@ -181,6 +485,9 @@ class FDRHandle(APIEndPint):
         :param metadata: dict
         :return:
         """
+        ordered_container = DataOrderedContainer(self._operation_mode)
+        sector_id = metadata['sector_id']
+        template_id = metadata['template_id']
         compare_analyst_flag = True
         if metadata['template_id'] == '2':
             compare_analyst_flag = False
@@ -191,6 +498,10 @@ class FDRHandle(APIEndPint):
             for agent_data in agent_details['statementMaster']:
                 fiscal_end_year = agent_data['fiscalYearEnd']
                 report_date = agent_data['statementDate']
+                statement_date = self._parse_statement_date(report_date, agent_id, nickname_id)
+                if statement_date is None:
+                    continue
+                year_int = statement_date.year
                 exchange_rate = agent_data['exchangeRate']
                 scale_desc = get_value_from_api_dict(
                     'scale', 'scaleDesc', agent_data
@@ -218,29 +529,31 @@ class FDRHandle(APIEndPint):
 
                         for datapoint in datapoints['stmntData']:
                             try:
-                                if datapoint['adjustedValue'] is not None:
-                                    year_int = int(
-                                        datetime.strftime(
-                                            datetime.strftime(
-                                                report_date,
-                                                '%Y-%m-%d'
-                                            ),
-                                            '%Y'
-                                        )
-                                    )
+                                # only get datapoints with adjusted value present
+                                if datapoint['adjustedValue'] is None:
+                                    continue
                                 data = {
                                     'agent_id': agent_id,
                                     'nickname_id': nickname_id,
-                                    'sector_id': metadata['sector_id'],
-                                    'template_id': metadata['template_id'],
+                                    'sector_id': sector_id,
+                                    'template_id': template_id,
                                     'report_date': year_int,
                                     'period_type': period_type,
                                     'fdr_id': datapoint['fdrId'],
-                                    'adjustedVaule': float(
+                                    'adjustedValue': float(
                                         datapoint['adjustedValue']
-                                    )
+                                    ),
+                                    # fields data_download_with_details_print matches on
+                                    'scale_desc': scale_desc,
+                                    'currency_code': currency_code,
+                                    'fiscal_year_end': fiscal_end_year,
+                                    'exchange_rate': exchange_rate,
+                                    'statement_type': statement_type,
+                                    'private_flag': private_flag
                                 }
-                                self._OFC.add_data(report_date, period_type, data)
+                                ordered_container.add_data(
+                                    statement_date.date_key, period_type, data
+                                )
 
                             except Exception as e:
                                 print(
@@ -249,7 +562,7 @@ class FDRHandle(APIEndPint):
                                     + "" + str(datapoint['adjustedValue'])
                                 )
                                 print(str(e))
-        return self._OFC.get_data()
+        return ordered_container.get_data()
 
     def get_data(
             self,
@@ -262,53 +575,335 @@ class FDRHandle(APIEndPint):
         :param unpivot_function:
         :return:
         """
-        self._FDRData = self.get_appian_data(
-            self._FDRStatements,
-            pivot_function=pivot_function,
-            unpivot_function=unpivot_function
+        checkpoint = self.get_checkpoint()
+        with self.get_metrics().timer('get_data'):
+            self._FDRData = self.get_appian_data(
+                self.get_checkpointed_statements(checkpoint),
+                pivot_function=planned_pivot(pivot_function),
+                unpivot_function=planned_unpivot(unpivot_function),
+                checkpoint=checkpoint
+            )
+        self._query_planner.save()
+
+    def get_checkpointed_statements(self, checkpoint: RequestCheckpoint) -> list:
+        """
+        statement list of a checkpointed run. The first attempt saves its query batches in the
+        checkpoint, an attempt started again rebuilds its statements from them so every request
+        key matches even if the query planner has been tuned in the meantime
+        :param checkpoint: see get_checkpoint
+        :return: list of APIInputParams
+        """
+        if checkpoint is None:
+            return self._FDRStatements
+        plan = checkpoint.load_plan()
+        if plan is None:
+            checkpoint.save_plan([
+                [batch.template_name, batch.fdrs, batch.parts, batch.nicknames]
+                for batch in self._query_batches
+            ])
+            return self._FDRStatements
+        return self.build_graph_ql_query_list(
+            self._json_headers,
+            self._graph_statement,
+            [
+                _QUERY_BATCH(template_name, fdrs, parts, nicknames, None)
+                for template_name, fdrs, parts, nicknames in plan
+            ]
         )
 
-    def print_data(
+    def get_checkpoint(self):
+        """
+        checkpoint of this run, keyed by the command line dict and everything else that shapes
+        the rows, so running the same command again resumes it
+        :return: RequestCheckpoint or None if _CHECKPOINT_DIR is not set
+        """
+        if self._CHECKPOINT_DIR is None:
+            return None
+        return RequestCheckpoint(
+            self._CHECKPOINT_DIR,
+            make_run_key(
+                type(self).__name__,
+                self._json_headers,
+                self._graph_statement,
+                self._operation_mode,
+                self._columnar
+            ),
+            self._CHECKPOINT_MAX_AGE
+        )
+
+    def get_incremental_data(
+            self,
+            pivot_function,
+            unpivot_function,
+            snapshot_dir: str = None,
+            lookback_days: int = None
+    ) -> dict:
+        """
+        get_data that only downloads statements newer than the local watermarks. Responses are
+        merged into the snapshot, whose statements dated within START_DATE..END_DATE are then
+        pivoted and unpivoted locally as if the whole window had been pulled. START_DATE is
+        substituted as yyyy-mm-dd
+        :param pivot_function:
+        :param unpivot_function:
+        :param snapshot_dir: defaults to _SNAPSHOT_DIR
+        :param lookback_days: defaults to _INCREMENTAL_LOOKBACK_DAYS
+        :return: dict with the number of queries sent and statements merged
+        """
+        watermark_store = FDRWatermarkStore(
+            snapshot_dir if snapshot_dir is not None else self._SNAPSHOT_DIR
+        )
+        statements = self.build_incremental_query_list(
+            watermark_store,
+            lookback_days if lookback_days is not None else self._INCREMENTAL_LOOKBACK_DAYS
+        )
+
+        def merge_function(p_json_data, metadata):
+            # the merged count is the only row, the rows themselves come from the snapshot.
+            # Runs in this process, a pivot process would merge into its own copy of the store
+            return [
+                watermark_store.merge_response(
+                    p_json_data,
+                    metadata['template_id'],
+                    metadata['sector_id'],
+                    metadata['query_shape'],
+                    metadata['nickname_ids'],
+                    metadata['start_date'],
+                    metadata['window_start']
+                )
+            ]
+
+        metrics = self.get_metrics()
+        with metrics.timer('incremental_fetch'):
+            merged = sum(
+                self.get_appian_data(
+                    statements, pivot_function=merge_function, transform_processes=False
+                )
+            )
+            watermark_store.save()
+
+        statement_values = self.get_statement_values(self._json_headers)
+        window_start = window_date(statement_values.get(_APPIAN_START_DATE_KEY))
+        window_end = window_date(statement_values.get(_APPIAN_END_DATE_KEY))
+        self._FDRData = []
+        with metrics.timer('transform_snapshot'):
+            for (template_id, sector_id), nicknames in self.group_nicknames(self._json_headers):
+                pivot_params, unpivot_params = self.get_function_params(
+                    template_id, sector_id, nicknames
+                )
+                self._FDRData.extend(
+                    self.transform_snapshot(
+                        watermark_store.build_response(
+                            template_id,
+                            sector_id,
+                            self.get_query_shape(template_id, sector_id, statement_values),
+                            nicknames,
+                            window_start,
+                            window_end
+                        ),
+                        pivot_function,
+                        pivot_params,
+                        unpivot_function,
+                        unpivot_params,
+                        metrics
+                    )
+                )
+        return {'queries': len(statements), 'statements_merged': merged}
+
+    @staticmethod
+    def transform_snapshot(
+            response_json: dict,
+            pivot_function=None,
+            pivot_params=None,
+            unpivot_function=None,
+            unpivot_params=None,
+            metrics=None
+    ) -> list:
+        """
+        pivot and unpivot of a snapshot response, rows as get_appian_data returns them
+        """
+        rows = APIDataParser.transform_response(
+            response_json,
+            pivot_function,
+            pivot_params,
+            unpivot_function,
+            unpivot_params,
+            metrics
+        )
+        if isinstance(rows, dict):
+            return [rows]
+        return list(rows) if rows is not None else []
+
+    def save_datapoints(self, pivot_function, snapshot_path: str) -> int:
+        """
+        pulls and pivots like get_data but writes the datapoints of every response to a local
+        snapshot instead of unpivoting them, any tab can then be rendered from it with
+        get_snapshot_data without going back to the API
+        :param pivot_function: e.g. pivot_function_with_details for the details tab
+        :param snapshot_path: snapshot directory, replaced once the pull succeeded
+        :return: number of datapoints saved
+        """
+        metrics = self.get_metrics()
+        with metrics.timer('save_datapoints'), DatapointSnapshotWriter(snapshot_path) as writer:
+            self.stream_appian_data(
+                self._FDRStatements,
+                writer.write_segments,
+                pivot_function=planned_pivot(pivot_function),
+                unpivot_function=planned_unpivot(snapshot_segment)
+            )
+        self._query_planner.save()
+        snapshot_size = len(DatapointSnapshot(snapshot_path))
+        metrics.count('datapoints_saved', snapshot_size)
+        return snapshot_size
+
+    def get_pivoted_data(self, pivot_functions: list) -> list:
+        """
+        pulls the statements once and pivots every response with each of the pivot functions,
+        the printers of several tabs can then run on the same datapoints, see FDR_reports
+        :param pivot_functions: e.g. [pivot_function, pivot_function_with_details]
+        :return: list of (unpivot_params, tuple of the datapoints of every pivot function), one
+        per response
+        """
+        with self.get_metrics().timer('get_data'):
+            segments = self.get_appian_data(
+                self._FDRStatements,
+                pivot_function=_MultiPivot(pivot_functions),
+                unpivot_function=planned_unpivot(snapshot_segment)
+            )
+        self._query_planner.save()
+        return segments
+
+    def get_snapshot_data(self, unpivot_function, snapshot_path: str) -> None:
+        """
+        get_data from a snapshot written by save_datapoints, the unpivot function runs on the
+        memory mapped datapoints of every pulled response with the parameters it was pulled with
+        :param unpivot_function: e.g. overview_tab_print or data_download_print
+        :param snapshot_path: snapshot directory
+        """
+        metrics = self.get_metrics()
+        with metrics.timer('get_snapshot_data'):
+            self._FDRData = []
+            for datapoints, unpivot_params in DatapointSnapshot(snapshot_path).iter_segments():
+                self._FDRData.extend(
+                    self.transform_snapshot(
+                        datapoints,
+                        unpivot_function=unpivot_function,
+                        unpivot_params=unpivot_params,
+                        metrics=metrics
+                    )
+                )
+
+    def stream_data(
+            self,
+            pivot_function,
+            unpivot_function,
+            destination=sys.stdout,
+            mode='csv',
+            header=False,
+            newline='\n',
+            queue_size: int = None,
+            compress: bool = None
+    ) -> int:
+        """
+        fetches, pivots, unpivots and writes every response as it arrives instead of building
+        _FDRData first, memory stays flat whatever the number of nickname/template tuples
+        :param pivot_function:
+        :param unpivot_function:
+        :param destination: path of the output file or sys.stdout
+        :param mode: csv, jsonl, json, parquet or arrow (IPC file)
+        :param header: write csv header
+        :param newline:
+        :param queue_size: number of responses/row chunks buffered between the stages
+        :param compress: gzip the output, by default when the path ends with .gz. For parquet and
+        arrow zstd compression of the columns, by default parquet only
+        :return: number of rows written
+        """
+        writer_params = {'newline': newline, 'compress': compress}
+        if mode == 'csv':
+            writer_params['delimiter'] = self._config.get_csv_delimiter()
+            writer_params['header'] = header
+        metrics = self.get_metrics()
+        with metrics.timer('stream_data'), get_row_writer(
+                mode, destination, **writer_params
+        ) as writer:
+
+            def write_rows(rows):
+                with metrics.timer('write'):
+                    writer.write_rows(rows)
+
+            self.stream_appian_data(
+                self._FDRStatements,
+                write_rows,
+                pivot_function=planned_pivot(pivot_function),
+                unpivot_function=planned_unpivot(unpivot_function),
+                queue_size=queue_size
+            )
+        metrics.count('rows_written', writer.rows_written)
+        self._query_planner.save()
+        return writer.rows_written
+
+    def get_print_writer(
             self,
             mode='default',
             destination=sys.stdout,
             header=False,
-            newline='\n'
+            newline='\n',
+            compress: bool = None
     ):
-        if mode not in ('default', 'csv', 'json', 'raw'):
-            return ValueError(
-                'Only None(i.e. std.output),csv, json, raw are allowed'
+        """
+        row writer of a print_data mode
+        :param mode: default (print delimiter), csv, json, parquet or arrow (IPC file)
+        :param destination: path of the output file or sys.stdout
+        :param header: write csv header
+        :param newline:
+        :param compress: gzip the output, by default when the path ends with .gz. For parquet and
+        arrow zstd compression of the columns, by default parquet only
+        :return: RowWriter
+        """
+        if mode not in ('default', 'csv', 'json', 'parquet', 'arrow'):
+            raise ValueError(
+                'Only None(i.e. std.output),csv, json, parquet, arrow, raw are allowed'
             )
-        if mode == 'default':
-            if isinstance(destination, str):
-                with open(destination, 'w+', newline=newline) as f:
-                    dict_writer = csv.DictWriter(
-                        f,
-                        self._FDRData[0].keys(),
-                        delimiter=self._config.get_print_delimiter()
-                    )
-                    if header:
-                        dict_writer = csv.DictWriter()
-                    dict_writer.writerows(self._FDRData)
-        elif mode == 'csv':
-            if isinstance(destination, str):
-                with open(destination, 'w+', newline=newline) as f:
-                    dict_writer = csv.DictWriter(
-                        f,
-                        self._FDRData[0].keys(),
-                        delimiter=self._config.get_csv_delimiter()
-                    )
-                    if header:
-                        dict_writer.writeheader()
-                    dict_writer.writerows(self._FDRData)
-
-        elif mode == 'json':
-            if isinstance(destination, str):
-                with open(destination, 'w+', newline=newline) as f:
-                    f.write(json.dumps(self._FDRData))
-            else:
-                # std.output
-                sys.stdout.write(json.dumps(self._FDRData))
-
-        elif mode == 'raw':
+        writer_params = {'newline': newline, 'compress': compress}
+        if mode in ('json', 'parquet', 'arrow'):
+            writer_mode = mode
+            if mode in ('parquet', 'arrow'):
+                # a year column can be empty in the first row group, its type is set up front
+                writer_params['float_columns'] = [
+                    str(year) for year in self._config.get_year_range()
+                ]
+        else:
+            writer_mode = 'csv'
+            writer_params['header'] = header
+            writer_params['delimiter'] = (
+                self._config.get_print_delimiter() if mode == 'default'
+                else self._config.get_csv_delimiter()
+            )
+        return get_row_writer(writer_mode, destination, **writer_params)
+
+    def print_data(
+            self,
+            mode='default',
+            destination=sys.stdout,
+            header=False,
+            newline='\n',
+            compress: bool = None
+    ):
+        """
+        writes _FDRData through a streaming row writer, see writers.row_writers
+        :param mode: default (print delimiter), csv, json, parquet, arrow (IPC file) or raw to
+        get the rows back
+        :param destination: path of the output file or sys.stdout
+        :param header: write csv header
+        :param newline:
+        :param compress: gzip the output, by default when the path ends with .gz. For parquet and
+        arrow zstd compression of the columns, by default parquet only
+        :return: the rows in raw mode
+        """
+        if mode == 'raw':
             return self._FDRData
+        metrics = self.get_metrics()
+        with metrics.timer('print_data'), self.get_print_writer(
+                mode, destination, header, newline, compress
+        ) as writer:
+            writer.write_rows(self._FDRData)
+        metrics.count('rows_written', writer.rows_written)
@@ -0,0 +1,145 @@
+# This file is developed to render every tab of a workbook from a single FDR pull
+import concurrent.futures
+import json
+import sys
+
+from appian_graphql.FDR_annual import FDRAnnual
+from appian_graphql.FDR_handle import FDRHandle
+from sql.helpers import extract_and_cleans_fdr_input_from_cmd_line
+
+# tabs Helios asks for, printer and the pivot it reads
+_REPORT_FUNCTIONS = {
+    'overview_tab': ('overview_tab_print', 'pivot_function'),
+    'data_download': ('data_download_print', 'pivot_function'),
+    'data_download_with_details': (
+        'data_download_with_details_print', 'pivot_function_with_details'
+    ),
+}
+
+
+class FDRReport:
+
+    def __init__(
+            self,
+            name: str,
+            unpivot_function,
+            destination,
+            pivot_function=None,
+            mode: str = 'default',
+            header: bool = False,
+            compress: bool = None
+    ):
+        """
+        a tab of the workbook rendered by run_reports
+        :param name: report name used in the metrics and the result
+        :param unpivot_function: printer e.g. FDRAnnual.overview_tab_print
+        :param destination: path of the output file or sys.stdout
+        :param pivot_function: pivot the printer reads, defaults to the pivot_function of the
+        handle
+        :param mode: see FDRHandle.print_data
+        :param header: write csv header
+        :param compress: see FDRHandle.print_data
+        """
+        self.name = name
+        self.unpivot_function = unpivot_function
+        self.destination = destination
+        self.pivot_function = pivot_function
+        self.mode = mode
+        self.header = header
+        self.compress = compress
+
+
+def _render_report(handle: FDRHandle, report: FDRReport, pivot_idx: int, segments: list) -> int:
+    """
+    unpivots the datapoints of every response and writes the rows as they are produced
+    :return: rows written
+    """
+    metrics = handle.get_metrics()
+    with metrics.timer('report:' + report.name), handle.get_print_writer(
+            report.mode, report.destination, report.header, compress=report.compress
+    ) as writer:
+        for unpivot_params, pivoted in segments:
+            writer.write_rows(
+                handle.transform_snapshot(
+                    pivoted[pivot_idx],
+                    unpivot_function=report.unpivot_function,
+                    unpivot_params=unpivot_params
+                )
+            )
+    metrics.count('rows_written:' + report.name, writer.rows_written)
+    return writer.rows_written
+
+
+def run_reports(handle: FDRHandle, reports: list, max_workers: int = None) -> dict:
+    """
+    fetches the statements of the handle once and renders every report from the same
+    datapoints, the reports run concurrently and each is written to its own destination.
+    Every response is pivoted once per distinct pivot function, not once per report
+    :param handle: FDRHandle built from the command line dict
+    :param reports: list of FDRReport
+    :param max_workers: reports rendered at the same time, defaults to one per report
+    :return: report name -> rows written
+    """
+    pivot_functions = []
+    pivot_indexes = []
+    for report in reports:
+        pivot_function = (
+            report.pivot_function if report.pivot_function is not None
+            else handle.pivot_function
+        )
+        if pivot_function not in pivot_functions:
+            pivot_functions.append(pivot_function)
+        pivot_indexes.append(pivot_functions.index(pivot_function))
+
+    segments = handle.get_pivoted_data(pivot_functions)
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers or max(len(reports), 1)
+    ) as executor:
+        futures = [
+            executor.submit(_render_report, handle, report, pivot_idx, segments)
+            for report, pivot_idx in zip(reports, pivot_indexes)
+        ]
+        return {
+            report.name: future.result() for report, future in zip(reports, futures)
+        }
+
+
+def build_reports(handle: FDRHandle, destinations: dict, mode: str = 'default') -> list:
+    """
+    reports of the Helios tabs
+    :param handle: FDRHandle the printers are bound to
+    :param destinations: tab name (overview_tab, data_download, data_download_with_details) ->
+    path of the output file
+    :param mode: see FDRHandle.print_data
+    :return: list of FDRReport
+    """
+    reports = []
+    for name, destination in destinations.items():
+        if name not in _REPORT_FUNCTIONS:
+            raise ValueError(f'Only {", ".join(_REPORT_FUNCTIONS)} are allowed')
+        unpivot_name, pivot_name = _REPORT_FUNCTIONS[name]
+        reports.append(
+            FDRReport(
+                name,
+                getattr(handle, unpivot_name),
+                destination,
+                pivot_function=getattr(handle, pivot_name),
+                mode=mode
+            )
+        )
+    return reports
+
+
+if __name__ == '__main__':
+    # same arguments as FDR_annual, followed by {"tab name": "output path"}
+    input_header_dict = json.loads(sys.argv[2])
+    fdr_type = sys.argv[3]
+    with open(sys.argv[4]) as statement_file:
+        graph_statement = statement_file.read()
+    report_destinations = json.loads(sys.argv[5])
+
+    param_dict = extract_and_cleans_fdr_input_from_cmd_line(input_header_dict)
+    a = FDRAnnual(param_dict, fdr_type, graph_statement)
+    with a.profile():
+        run_reports(a, build_reports(a, report_destinations))
+    a.write_metrics_report()
@@ -0,0 +1,159 @@
+# This file is developed to decode large getFDRData responses keeping only what the pivots use
+import json
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_AGENTS_PREFIX = 'data.getFDRData.item'
+# statement level fields read by pivot_function and pivot_function_with_details
+_STATEMENT_FIELDS = (
+    'statementDate',
+    'fiscalYearEnd',
+    'exchangeRate',
+    'scale',
+    'currency',
+    'periodType',
+    'statementType'
+)
+# bodies up to this size are kept while streaming so responses without any agent, e.g. graph ql
+# errors with data null, can be handed over unchanged
+_SMALL_BODY_BYTES = 1 << 20
+_READ_SIZE = 1 << 16
+
+
+class _CappedTee:
+
+    def __init__(self, stream, cap: int):
+        """
+        file like wrapper keeping a copy of the first cap bytes read from stream
+        """
+        self._stream = stream
+        self._cap = cap
+        self._head = []
+        self._head_size = 0
+        self.overflow = False
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._stream.read(size)
+        if not self.overflow and chunk:
+            self._head_size += len(chunk)
+            if self._head_size > self._cap:
+                self.overflow = True
+                self._head = []
+            else:
+                self._head.append(chunk)
+        return chunk
+
+    def head(self) -> bytes:
+        return b''.join(self._head)
+
+
+def _loads(body: bytes):
+    return orjson.loads(body) if orjson is not None else json.loads(body)
+
+
+def prune_fdr_agent(agent: dict, copy_datapoints: bool = True) -> dict:
+    """
+    copies an element of getFDRData keeping only the fields the pivots read, datapoints without
+    adjustedValue are dropped since both pivots skip them
+    :param agent: element of data.getFDRData
+    :param copy_datapoints: reduce datapoints to fdrId and adjustedValue, when False the decoded
+    datapoint dicts are reused which is faster but keeps every field the query selected
+    :return: dict with the same shape
+    """
+    statements = []
+    for statement in agent.get('statementMaster') or ():
+        pruned = {field: statement.get(field) for field in _STATEMENT_FIELDS}
+        infos = []
+        for info in statement.get('templateStatementInfo') or ():
+            pruned_info = {
+                'analystReviewed': info.get('analystReviewed'),
+                'stmntData': [
+                    {
+                        'fdrId': datapoint.get('fdrId'),
+                        'adjustedValue': datapoint['adjustedValue']
+                    }
+                    for datapoint in info.get('stmntData') or ()
+                    if datapoint.get('adjustedValue') is not None
+                ] if copy_datapoints else [
+                    datapoint for datapoint in info.get('stmntData') or ()
+                    if datapoint.get('adjustedValue') is not None
+                ]
+            }
+            if 'privateFlg' in info:
+                pruned_info['privateFlg'] = info['privateFlg']
+            infos.append(pruned_info)
+        pruned['templateStatementInfo'] = infos
+        statements.append(pruned)
+    return {
+        'agent': agent.get('agent'),
+        'nicknameId': agent.get('nicknameId'),
+        'statementMaster': statements
+    }
+
+
+def prune_fdr_response(response_json: dict, copy_datapoints: bool = False) -> dict:
+    """
+    prunes a fully decoded response, anything other than a getFDRData list is returned as is
+    :param response_json: decoded response
+    :param copy_datapoints: see prune_fdr_agent, the decoded response is released afterwards so
+    the datapoint dicts are reused by default
+    :return: dict
+    """
+    agents = ((response_json or {}).get('data') or {}).get('getFDRData')
+    if not isinstance(agents, list):
+        return response_json
+    return {
+        'data': {
+            'getFDRData': [prune_fdr_agent(agent, copy_datapoints) for agent in agents]
+        }
+    }
+
+
+def decode_fdr_response_bytes(body: bytes) -> dict:
+    """
+    fastest path, decodes a complete body with orjson (json if not installed) and prunes it
+    :param body: response body
+    :return: dict
+    """
+    return prune_fdr_response(_loads(body))
+
+
+def decode_fdr_response(stream) -> dict:
+    """
+    default decoder handed to APIInputParams, reads the whole body and decodes it with
+    decode_fdr_response_bytes
+    :param stream: file like object returning bytes e.g. requests Response.raw
+    :return: dict with the same shape as the full response, pruned
+    """
+    return decode_fdr_response_bytes(stream.read())
+
+
+def stream_decode_fdr_response(stream) -> dict:
+    """
+    low memory decoder for data.getFDRData[].statementMaster[].templateStatementInfo[].stmntData[]
+    responses. With ijson installed the body is parsed one agent at a time straight from the
+    socket and every agent is pruned down to the fields the pivots read before the next is read,
+    so neither the body nor the full document is ever held. Slower than decode_fdr_response,
+    without ijson it falls back to it
+    :param stream: file like object returning bytes e.g. requests Response.raw
+    :return: dict with the same shape as the full response, pruned
+    """
+    if ijson is None:
+        return decode_fdr_response(stream)
+    tee = _CappedTee(stream, _SMALL_BODY_BYTES)
+    agents = [
+        prune_fdr_agent(agent)
+        for agent in ijson.items(tee, _AGENTS_PREFIX, use_float=True, buf_size=_READ_SIZE)
+    ]
+    if not agents and not tee.overflow:
+        # no agent found, e.g. an empty list or an error response, keep what the server sent
+        return prune_fdr_response(_loads(tee.head()))
+    return {'data': {'getFDRData': agents}}
@@ -0,0 +1,266 @@
+# This file is developed to keep a local FDR snapshot so that pulls only fetch new statements
+import json
+import os
+import threading
+import warnings
+from datetime import datetime, timedelta
+from sql.helpers import parse_statement_date, get_value_from_api_dict
+from api_integration.local_storage import ensure_private_dir, open_private_file
+from api_integration.local_storage import write_private_file
+
+_SNAPSHOT_SUFFIX = '.json'
+_DATE_FORMAT = '%Y-%m-%d'
+
+
+def _statement_identity(statement: dict, date_key: str) -> tuple:
+    """
+    a statement fetched again replaces the stored statement with the same identity
+    """
+    return (
+        date_key,
+        get_value_from_api_dict('periodType', 'periodTypeDesc', statement),
+        get_value_from_api_dict('statementType', 'statementTypeDesc', statement)
+    )
+
+
+def _date_key(statement: dict):
+    try:
+        return parse_statement_date(statement['statementDate']).date_key
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def window_date(value):
+    """
+    START_DATE/END_DATE of a statement as 'yyyy-mm-dd', None if it is not set or not a date
+    """
+    if value in (None, ''):
+        return None
+    try:
+        return parse_statement_date(value).date_key
+    except (TypeError, ValueError):
+        return None
+
+
+class FDRWatermarkStore:
+
+    def __init__(self, snapshot_dir: str):
+        """
+        local snapshot of the getFDRData statements, one JSON file per (template, sector, query
+        shape) holding the statements of every nickname pulled so far. The query shape is a
+        digest of everything that changes what a statement holds, e.g. the FDR list or the
+        statement type, so statements fetched under another shape are never reused. The
+        watermark of a nickname is the latest statement date in its snapshot, the next pull
+        only asks for statements from the watermark on and merges them in. Every nickname also
+        records the START_DATE its snapshot covers, an earlier START_DATE pulls it in full again
+        :param snapshot_dir: directory of the snapshot files, see ensure_private_dir
+        """
+        self._snapshot_dir = snapshot_dir
+        # (template_id, sector_id, query_shape) -> {nickname key: record}
+        self._groups = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def _group_path(self, template_id, sector_id, query_shape) -> str:
+        return os.path.join(
+            self._snapshot_dir, f'{template_id}_{sector_id}_{query_shape}{_SNAPSHOT_SUFFIX}'
+        )
+
+    def _get_group(self, template_id, sector_id, query_shape: str) -> dict:
+        """
+        snapshot of a (template, sector, query shape), loaded on first use. Call with the lock
+        held
+        """
+        group_key = (str(template_id), str(sector_id), query_shape)
+        group = self._groups.get(group_key)
+        if group is None:
+            group = {}
+            try:
+                with open_private_file(self._group_path(*group_key)) as f:
+                    stored = json.load(f)
+                if isinstance(stored, dict):
+                    group = stored
+            except (OSError, ValueError):
+                # missing or not trusted, its nicknames are pulled again in full
+                pass
+            self._groups[group_key] = group
+        return group
+
+    def get_watermark(self, nickname_id, template_id, sector_id, query_shape: str):
+        """
+        latest statement date stored for the nickname
+        :return: 'yyyy-mm-dd' or None if the nickname has not been pulled yet
+        """
+        with self._lock:
+            record = self._get_group(template_id, sector_id, query_shape).get(str(nickname_id))
+        return None if record is None else record['watermark']
+
+    def covers(self, nickname_id, template_id, sector_id, query_shape: str, window_start) -> bool:
+        """
+        the snapshot of the nickname holds every statement from window_start on
+        :param window_start: START_DATE of the pull as 'yyyy-mm-dd', None for no lower bound
+        """
+        with self._lock:
+            record = self._get_group(template_id, sector_id, query_shape).get(str(nickname_id))
+        if record is None or 'start_date' not in record:
+            return False
+        return record['start_date'] is None or (
+            window_start is not None and record['start_date'] <= window_start
+        )
+
+    def get_start_date(
+            self,
+            nickname_id,
+            template_id,
+            sector_id,
+            query_shape: str,
+            lookback_days: int = 0,
+            window_start: str = None
+    ):
+        """
+        START_DATE of the next pull for the nickname, the lookback picks up statements that were
+        loaded late or revised in Appian
+        :param query_shape: see FDRHandle.get_query_shape
+        :param lookback_days: days fetched again before the watermark
+        :param window_start: START_DATE of the pull as 'yyyy-mm-dd'
+        :return: 'yyyy-mm-dd' or None if the full window has to be pulled
+        """
+        if not self.covers(nickname_id, template_id, sector_id, query_shape, window_start):
+            return None
+        watermark = self.get_watermark(nickname_id, template_id, sector_id, query_shape)
+        if watermark is None:
+            return None
+        start_date = datetime.strptime(watermark, _DATE_FORMAT) - timedelta(days=lookback_days)
+        return start_date.strftime(_DATE_FORMAT)
+
+    def merge_response(
+            self,
+            response_json: dict,
+            template_id,
+            sector_id,
+            query_shape: str,
+            nickname_ids: list,
+            start_date: str = None,
+            window_start: str = None
+    ) -> int:
+        """
+        merges a response into the snapshot. The response is the complete state of the window it
+        was asked for, stored statements of nickname_ids dated start_date or later are dropped
+        first so statements removed in Appian go away too
+        :param response_json: decoded getFDRData response
+        :param query_shape: see FDRHandle.get_query_shape
+        :param nickname_ids: nicknames the query asked for
+        :param start_date: START_DATE of the query, None if the full window was pulled
+        :param window_start: START_DATE of the full window, recorded as what the snapshot of
+        the nicknames covers when start_date is None
+        :return: number of statements merged
+        """
+        agents = ((response_json or {}).get('data') or {}).get('getFDRData') or []
+        merged = 0
+        with self._lock:
+            group = self._get_group(template_id, sector_id, query_shape)
+            for nickname_id in nickname_ids:
+                record = group.get(str(nickname_id))
+                if record is None:
+                    continue
+                record['statements'] = [
+                    statement for statement in record['statements']
+                    if start_date is not None and (_date_key(statement) or '') < start_date
+                ]
+            for agent in agents:
+                nickname_key = str(agent['nicknameId'])
+                record = group.get(nickname_key)
+                if record is None:
+                    record = group[nickname_key] = {
+                        'nicknameId': agent['nicknameId'],
+                        'statements': [],
+                        'watermark': None
+                    }
+                record['agent'] = agent['agent']
+                statements = {}
+                for statement in record['statements']:
+                    statements[_statement_identity(statement, _date_key(statement))] = statement
+                for statement in agent.get('statementMaster') or ():
+                    date_key = _date_key(statement)
+                    if date_key is None:
+                        # the pivot functions skip statements without a valid date as well
+                        continue
+                    statements[_statement_identity(statement, date_key)] = statement
+                    merged += 1
+                record['statements'] = list(statements.values())
+            for nickname_id in nickname_ids:
+                record = group.get(str(nickname_id))
+                if record is None:
+                    # nothing returned yet, the window is still covered
+                    record = group[str(nickname_id)] = {
+                        'nicknameId': nickname_id,
+                        'statements': [],
+                        'watermark': None
+                    }
+                if start_date is None:
+                    record['start_date'] = window_start
+                record['watermark'] = max(
+                    (_date_key(statement) for statement in record['statements']),
+                    default=None
+                )
+            self._dirty.add((str(template_id), str(sector_id), query_shape))
+        return merged
+
+    def build_response(
+            self,
+            template_id,
+            sector_id,
+            query_shape: str,
+            nickname_ids: list,
+            window_start: str = None,
+            window_end: str = None
+    ) -> dict:
+        """
+        the snapshot of the nicknames in the shape of a getFDRData response, to be handed to the
+        pivot functions. Only statements dated within the window are kept, the same ones a pull
+        of the window returns
+        :param query_shape: see FDRHandle.get_query_shape
+        :param window_start: START_DATE as 'yyyy-mm-dd', None for no lower bound
+        :param window_end: END_DATE as 'yyyy-mm-dd', None for no upper bound
+        :return: dict
+        """
+        def in_window(statement) -> bool:
+            date_key = _date_key(statement)
+            return date_key is not None and (
+                (window_start is None or date_key >= window_start)
+                and (window_end is None or date_key <= window_end)
+            )
+
+        with self._lock:
+            group = self._get_group(template_id, sector_id, query_shape)
+            agents = []
+            for record in (group.get(str(nickname_id)) for nickname_id in nickname_ids):
+                if record is None:
+                    continue
+                statements = [
+                    statement for statement in record['statements'] if in_window(statement)
+                ]
+                if statements:
+                    agents.append({
+                        'agent': record.get('agent'),
+                        'nicknameId': record['nicknameId'],
+                        'statementMaster': statements
+                    })
+        return {'data': {'getFDRData': agents}}
+
+    def save(self) -> None:
+        """
+        writes the snapshots changed since the last save, every file is replaced atomically.
+        A snapshot that can not be written is warned about, the next pull fetches it again
+        """
+        with self._lock:
+            try:
+                ensure_private_dir(self._snapshot_dir)
+                for group_key in sorted(self._dirty):
+                    write_private_file(
+                        self._group_path(*group_key),
+                        json.dumps(self._groups[group_key], separators=(',', ':')).encode()
+                    )
+                    self._dirty.discard(group_key)
+            except OSError as e:
+                warnings.warn(f'FDR snapshot {self._snapshot_dir} not written: {e}')
@@ -0,0 +1,341 @@
+# This file is developed to batch FDR graph ql queries into evenly sized requests
+import functools
+import json
+import os
+import threading
+import warnings
+from collections import namedtuple
+
+from api_integration.local_storage import ensure_private_dir, open_private_file
+from api_integration.local_storage import write_private_file
+
+# nicknames of a template/sector sent via Helios, fdrs is the FDR list put in the query
+_QUERY_GROUP = namedtuple(
+    'QueryGroup',
+    'template_name fdrs template_id sector_id nicknames'
+)
+# one request, parts lists the (template_id, sector_id, nicknames) it covers
+_QUERY_BATCH = namedtuple(
+    'QueryBatch',
+    'template_name fdrs parts nicknames estimated_cost'
+)
+
+
+def count_datapoints(response_json: dict) -> int:
+    """
+    number of stmntData entries of a getFDRData response
+    :param response_json: decoded response
+    :return: int
+    """
+    agents = ((response_json or {}).get('data') or {}).get('getFDRData') or ()
+    return sum(
+        len(info.get('stmntData') or ())
+        for agent in agents
+        for statement in agent.get('statementMaster') or ()
+        for info in statement.get('templateStatementInfo') or ()
+    )
+
+
+def split_response(response_json: dict, parts: list) -> list:
+    """
+    splits the response of a merged query by nicknameId
+    :param response_json: decoded getFDRData response
+    :param parts: list of dicts with template_id, sector_id and nickname_ids
+    :return: list of (response, part)
+    """
+    agents = ((response_json or {}).get('data') or {}).get('getFDRData') or []
+    agents_by_nickname = {}
+    for agent in agents:
+        agents_by_nickname.setdefault(str(agent['nicknameId']), []).append(agent)
+    return [
+        (
+            {
+                'data': {
+                    'getFDRData': [
+                        agent
+                        for nickname_id in part['nickname_ids']
+                        for agent in agents_by_nickname.get(str(nickname_id), ())
+                    ]
+                }
+            },
+            part
+        )
+        for part in parts
+    ]
+
+
+def _part_positions(key_rows, part: dict) -> list:
+    nickname_ids = {str(nickname_id) for nickname_id in part['nickname_ids']}
+    return [
+        idx for idx, (template_id, sector_id, nickname_id) in enumerate(key_rows)
+        if template_id == part['template_id'] and sector_id == part['sector_id']
+        and str(nickname_id) in nickname_ids
+    ]
+
+
+def split_pivot_data(pivot_data, parts: list) -> list:
+    """
+    splits the pivoted datapoints of a merged query back into its parts, by the template,
+    sector and nickname the pivot labelled every datapoint with
+    :param pivot_data: dict rows, a ColumnarDatapointStore or a tuple of either, one per pivot
+    function, see FDRHandle.get_pivoted_data
+    :param parts: list of dicts with template_id, sector_id and nickname_ids
+    :return: list of the datapoints of every part
+    """
+    if isinstance(pivot_data, tuple):
+        return list(zip(*[split_pivot_data(data, parts) for data in pivot_data]))
+    if hasattr(pivot_data, 'take'):
+        key_rows = list(zip(
+            pivot_data.decoded_column('template_id'),
+            pivot_data.decoded_column('sector_id'),
+            pivot_data.decoded_column('nickname_id')
+        ))
+        return [pivot_data.take(_part_positions(key_rows, part)) for part in parts]
+    rows = list(pivot_data or ())
+    key_rows = [(row['template_id'], row['sector_id'], row['nickname_id']) for row in rows]
+    return [[rows[idx] for idx in _part_positions(key_rows, part)] for part in parts]
+
+
+class _PlannedPivot:
+
+    def __init__(self, pivot_function):
+        # a class rather than a closure so the pivot can be pickled to pivot processes
+        self._pivot_function = pivot_function
+        functools.update_wrapper(self, pivot_function)
+
+    def __call__(self, p_json_data: dict, metadata: dict = None):
+        parts = (metadata or {}).get('parts')
+        if not parts:
+            return self._pivot_function(p_json_data, metadata)
+        merged = None
+        for part_response, part in split_response(p_json_data, parts):
+            part_data = self._pivot_function(part_response, {**metadata, **part})
+            if merged is None:
+                merged = part_data
+            else:
+                # dict rows and ColumnarDatapointStore both extend in place
+                merged.extend(part_data)
+        return merged
+
+
+def planned_pivot(pivot_function):
+    """
+    wraps a pivot function so it can be handed the response of a merged query, every part is
+    pivoted with its own template/sector and the results are concatenated
+    :param pivot_function: pivot function taking (response, metadata)
+    :return: pivot function
+    """
+    if pivot_function is None:
+        return None
+    return _PlannedPivot(pivot_function)
+
+
+class _PlannedUnpivot:
+
+    def __init__(self, unpivot_function):
+        # a class rather than a closure so the unpivot can be pickled to pivot processes
+        self._unpivot_function = unpivot_function
+        functools.update_wrapper(self, unpivot_function)
+
+    def __call__(self, pivot_data, unpivot_params: dict = None):
+        parts = (unpivot_params or {}).get('parts')
+        if not parts:
+            return self._unpivot_function(pivot_data, unpivot_params)
+        rows = []
+        for part_data, part_params in zip(split_pivot_data(pivot_data, parts), parts):
+            part_rows = self._unpivot_function(part_data, part_params)
+            if isinstance(part_rows, dict):
+                rows.append(part_rows)
+            elif part_rows is not None:
+                rows.extend(part_rows)
+        return rows
+
+
+def planned_unpivot(unpivot_function):
+    """
+    wraps an unpivot function so the datapoints of a merged query are unpivoted part by part,
+    each with the template/sector and nicknames of its own part instead of the ones of the
+    first part
+    :param unpivot_function: unpivot function taking (datapoints, params)
+    :return: unpivot function
+    """
+    if unpivot_function is None:
+        return None
+    return _PlannedUnpivot(unpivot_function)
+
+
+class FDRQueryPlanner:
+
+    def __init__(
+            self,
+            default_chunk_size: int = 50,
+            min_chunk_size: int = 1,
+            max_chunk_size: int = 1000,
+            target_seconds: float = 15.0,
+            target_datapoints: int = 250000,
+            smoothing: float = 0.3,
+            state_path: str = None
+    ):
+        """
+        splits the nicknames of a template/sector into chunks and merges small groups sharing a
+        template name and FDR list into one query. Chunk sizes are tuned per template name from
+        the latency and datapoint count of earlier responses so that requests take about
+        target_seconds, batches are returned largest first so the long ones start first
+        :param default_chunk_size: nicknames per request before anything was observed
+        :param min_chunk_size: lower bound of the tuned chunk size
+        :param max_chunk_size: upper bound of the tuned chunk size
+        :param target_seconds: latency a request should have
+        :param target_datapoints: datapoints a response should have at most
+        :param smoothing: weight of a new observation in the moving averages
+        :param state_path: JSON file the observations are kept in between runs, in a private
+        directory of the user e.g. get_private_dir('query_planner')
+        """
+        self._default_chunk_size = default_chunk_size
+        self._min_chunk_size = min_chunk_size
+        self._max_chunk_size = max_chunk_size
+        self._target_seconds = target_seconds
+        self._target_datapoints = target_datapoints
+        self._smoothing = smoothing
+        self._state_path = state_path
+        # template name -> {'seconds_per_nickname', 'datapoints_per_nickname', 'observations'}
+        self._stats = {}
+        self._lock = threading.Lock()
+        if state_path is not None and os.path.exists(state_path):
+            try:
+                # a state file that is not a private file of the user is not trusted
+                with open_private_file(state_path) as f:
+                    stats = json.load(f)
+                if isinstance(stats, dict):
+                    self._stats = stats
+            except (OSError, ValueError):
+                # a broken state file only costs the tuning
+                self._stats = {}
+
+    def chunk_size(self, template_name: str) -> int:
+        """
+        nicknames per request for the template
+        :param template_name: graph ql template name
+        :return: int
+        """
+        stats = self._stats.get(template_name)
+        if stats is None:
+            return self._default_chunk_size
+        limits = [self._max_chunk_size]
+        if stats['seconds_per_nickname'] > 0:
+            limits.append(self._target_seconds / stats['seconds_per_nickname'])
+        if stats['datapoints_per_nickname'] > 0:
+            limits.append(self._target_datapoints / stats['datapoints_per_nickname'])
+        return max(self._min_chunk_size, int(min(limits)))
+
+    def estimate_cost(self, template_name: str, nickname_count: int) -> float:
+        """
+        expected seconds of a request, nickname count while nothing was observed
+        """
+        stats = self._stats.get(template_name)
+        if stats is None or stats['seconds_per_nickname'] <= 0:
+            return float(nickname_count)
+        return stats['seconds_per_nickname'] * nickname_count
+
+    def plan(self, groups: list) -> list:
+        """
+        turns template/sector groups into request batches
+        :param groups: list of QueryGroup
+        :return: list of QueryBatch, most expensive first
+        """
+        batches = []
+        # groups too small to fill a chunk, merged per template name and FDR list
+        small_groups = {}
+        for group in groups:
+            if not group.nicknames:
+                continue
+            chunk_size = self.chunk_size(group.template_name)
+            nicknames = list(group.nicknames)
+            full_chunks = len(nicknames) // chunk_size
+            for idx in range(full_chunks):
+                chunk = nicknames[idx * chunk_size:(idx + 1) * chunk_size]
+                batches.append(
+                    self._batch(group, [(group.template_id, group.sector_id, chunk)], chunk)
+                )
+            rest = nicknames[full_chunks * chunk_size:]
+            if rest:
+                small_groups.setdefault(
+                    (group.template_name, tuple(group.fdrs)), []
+                ).append((group, rest))
+
+        for (template_name, __), pending in small_groups.items():
+            chunk_size = self.chunk_size(template_name)
+            parts, nicknames = [], []
+            for group, rest in pending:
+                if nicknames and len(nicknames) + len(rest) > chunk_size:
+                    batches.append(self._batch(pending[0][0], parts, nicknames))
+                    parts, nicknames = [], []
+                parts.append((group.template_id, group.sector_id, rest))
+                nicknames.extend(rest)
+            if nicknames:
+                batches.append(self._batch(pending[0][0], parts, nicknames))
+
+        # largest first, workers picking up the long requests early finish together
+        batches.sort(key=lambda batch: batch.estimated_cost, reverse=True)
+        return batches
+
+    def _batch(self, group, parts: list, nicknames: list):
+        return _QUERY_BATCH(
+            group.template_name,
+            group.fdrs,
+            parts,
+            list(nicknames),
+            self.estimate_cost(group.template_name, len(nicknames))
+        )
+
+    def observe(
+            self,
+            template_name: str,
+            nickname_count: int,
+            elapsed: float,
+            datapoints: int
+    ) -> None:
+        """
+        records a response, thread safe
+        :param template_name: graph ql template name of the request
+        :param nickname_count: nicknames the request asked for
+        :param elapsed: seconds from sending the request to the decoded response
+        :param datapoints: datapoints returned
+        """
+        if nickname_count <= 0:
+            return
+        seconds_per_nickname = elapsed / nickname_count
+        datapoints_per_nickname = datapoints / nickname_count
+        with self._lock:
+            stats = self._stats.get(template_name)
+            if stats is None:
+                self._stats[template_name] = {
+                    'seconds_per_nickname': seconds_per_nickname,
+                    'datapoints_per_nickname': datapoints_per_nickname,
+                    'observations': 1
+                }
+                return
+            weight = self._smoothing
+            stats['seconds_per_nickname'] += weight * (
+                seconds_per_nickname - stats['seconds_per_nickname']
+            )
+            stats['datapoints_per_nickname'] += weight * (
+                datapoints_per_nickname - stats['datapoints_per_nickname']
+            )
+            stats['observations'] += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._stats.items()}
+
+    def save(self) -> None:
+        """
+        writes the observations to state_path, replaced atomically. Best effort, a state that
+        can not be written only costs the tuning of the next run
+        """
+        if self._state_path is None:
+            return
+        try:
+            ensure_private_dir(os.path.dirname(self._state_path))
+            write_private_file(self._state_path, json.dumps(self.get_stats()).encode('utf-8'))
+        except OSError as e:
+            warnings.warn(f'query planner state {self._state_path} not written: {e}')
@@ -0,0 +1,150 @@
+# This file is developed to parse graph ql statements once and render them per request
+import json
+import re
+from functools import lru_cache
+
+# $NAME: Type declarations of the operation, e.g. query FDR($NICKNAME_ID_LIST: [Int!]!)
+_VARIABLE_DECLARATION = re.compile(r'\$(\w+)\s*:\s*([\[\]\w!]+)')
+_SCALAR_TYPES = {'Int': int, 'Float': float}
+
+
+def _to_list(value) -> list:
+    if isinstance(value, str):
+        return [__.strip() for __ in value.split(',') if __.strip() != '']
+    if isinstance(value, (list, tuple, set)):
+        return list(value)
+    return [value]
+
+
+def _to_text(value) -> str:
+    """
+    text substitution of a value, lists are comma separated as list_to_string does
+    """
+    if isinstance(value, (list, tuple)):
+        return ','.join(map(str, value))
+    return str(value)
+
+
+def _coerce(value, graph_type: str):
+    """
+    turns a statement value into the JSON value of a variable of the declared graph ql type
+    """
+    base_type = graph_type.replace('!', '')
+    if base_type.startswith('['):
+        item_type = base_type.strip('[]')
+        return [_coerce(item, item_type) for item in _to_list(value)]
+    scalar = _SCALAR_TYPES.get(base_type)
+    if scalar is not None and value is not None:
+        return scalar(value)
+    if isinstance(value, (list, tuple)):
+        return _to_text(value)
+    return value
+
+
+class CompiledStatement:
+
+    def __init__(self, graph_statement: str, keys: tuple):
+        """
+        graph ql statement parsed once into literal segments and slots for the statement keys.
+        A key written as $KEY is a graph ql variable: the query text stays the same for every
+        request and its value is sent in variables, typed after the declaration of the
+        operation. Keys written without $ are substituted into the text
+        :param graph_statement: statement with the statement keys
+        :param keys: statement keys, e.g. NICKNAME_ID_LIST
+        """
+        self._graph_statement = graph_statement
+        self._declared_types = dict(_VARIABLE_DECLARATION.findall(graph_statement))
+        # segments alternate literal text and key names, segments[1::2] are the slots
+        self._segments = []
+        self._variables = []
+        if keys:
+            # longest first so that a key containing another key wins
+            pattern = re.compile(
+                r'(\$?)(' + '|'.join(
+                    re.escape(key) for key in sorted(set(keys), key=len, reverse=True)
+                ) + r')'
+            )
+            position = 0
+            literal = []
+            for match in pattern.finditer(graph_statement):
+                literal.append(graph_statement[position:match.start()])
+                position = match.end()
+                if match.group(1):
+                    # variable reference, part of the constant text
+                    literal.append(match.group(0))
+                    if match.group(2) not in self._variables:
+                        self._variables.append(match.group(2))
+                    continue
+                self._segments.append(''.join(literal))
+                self._segments.append(match.group(2))
+                literal = []
+            literal.append(graph_statement[position:])
+            self._segments.append(''.join(literal))
+        else:
+            self._segments.append(graph_statement)
+
+    @property
+    def slots(self) -> list:
+        """
+        keys substituted into the text
+        """
+        return self._segments[1::2]
+
+    @property
+    def variables(self) -> list:
+        """
+        keys sent as graph ql variables
+        """
+        return list(self._variables)
+
+    def render_text(self, values: dict) -> str:
+        """
+        statement text with the slots filled, a slot without a value keeps its key
+        :param values: key -> str, number or list
+        :return: str
+        """
+        segments = self._segments
+        parts = [segments[0]]
+        for idx in range(1, len(segments), 2):
+            key = segments[idx]
+            parts.append(_to_text(values[key]) if key in values else key)
+            parts.append(segments[idx + 1])
+        return ''.join(parts)
+
+    def render_variables(self, values: dict) -> dict:
+        """
+        graph ql variables, only keys with a value are sent
+        :param values: key -> str, number or list
+        :return: dict
+        """
+        return {
+            key: _coerce(values[key], self._declared_types.get(key, 'String'))
+            for key in self._variables
+            if key in values
+        }
+
+    def render_params(self, values: dict) -> dict:
+        """
+        parameters of a graph ql GET request
+        :param values: key -> str, number or list
+        :return: dict with query and, if the statement uses variables, variables as JSON
+        """
+        params = {'query': self.render_text(values)}
+        if self._variables:
+            params['variables'] = json.dumps(
+                self.render_variables(values),
+                sort_keys=True,
+                separators=(',', ':')
+            )
+        return params
+
+
+@lru_cache(maxsize=64)
+def compile_statement(graph_statement: str, keys: tuple) -> CompiledStatement:
+    """
+    cached CompiledStatement, a statement is parsed once per process
+    :param graph_statement: statement with the statement keys
+    :param keys: statement keys, has to be a tuple
+    :return: CompiledStatement
+    """
+    return CompiledStatement(graph_statement, keys)
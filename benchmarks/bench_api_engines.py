@@ -0,0 +1,78 @@
+# This file is developed to compare the thread and the async API engines against a local stub
+# run from the repository root: python -m benchmarks.bench_api_engines
+import argparse
+import time
+
+from api_integration.api_interface import APIEndPint, APIInputParams
+from benchmarks.stub_server import StubGraphQLServer
+
+
+class _BenchEndPoint(APIEndPint):
+
+    def __init__(self, engine: str):
+        self._API_ENGINE = engine
+
+    def build_graph_ql_query_list(self) -> list:
+        pass
+
+    def get_data(self):
+        pass
+
+
+def count_datapoints(p_json_data: dict, metadata: dict = None) -> dict:
+    """
+    cheap pivot so the benchmark measures the engines and not the FDR pivot
+    """
+    return {
+        'datapoints': sum(
+            len(info['stmntData'])
+            for agent in p_json_data['data']['getFDRData']
+            for statement in agent['statementMaster']
+            for info in statement['templateStatementInfo']
+        )
+    }
+
+
+def run(engine: str, url: str, requests: int, concurrency: int) -> float:
+    """
+    :return: wall time in seconds
+    """
+    api_objects = [
+        APIInputParams(url=url, request_type='get', params={'query': f'{{ q{idx} }}'})
+        for idx in range(requests)
+    ]
+    end_point = _BenchEndPoint(engine)
+    start = time.perf_counter()
+    data = end_point.get_appian_data(
+        api_objects,
+        pivot_function=count_datapoints,
+        max_workers=concurrency
+    )
+    elapsed = time.perf_counter() - start
+    assert len(data) == requests
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--thread-workers', type=int, default=20)
+    parser.add_argument('--async-concurrency', type=int, default=500)
+    args = parser.parse_args()
+
+    with StubGraphQLServer(latency=args.latency) as server:
+        for engine, concurrency in (
+            ('thread', args.thread_workers),
+            ('async', args.async_concurrency)
+        ):
+            elapsed = run(engine, server.url, args.requests, concurrency)
+            print(
+                f'{engine:>6} engine, concurrency {concurrency:>4}: '
+                f'{args.requests} requests in {elapsed:.2f}s '
+                f'({args.requests / elapsed:.0f} req/s)'
+            )
+
+
+if __name__ == '__main__':
+    main()
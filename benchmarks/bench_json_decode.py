@@ -0,0 +1,76 @@
+# This file is developed to compare decoders of large getFDRData responses
+# run from the repository root: python -m benchmarks.bench_json_decode [recorded_payload.json ...]
+import argparse
+import gc
+import io
+import json
+import time
+import tracemalloc
+
+from appian_graphql.fdr_response_decoder import stream_decode_fdr_response
+from appian_graphql.fdr_response_decoder import decode_fdr_response_bytes
+from appian_graphql.fdr_response_decoder import prune_fdr_response
+from benchmarks.synthetic_fdr import build_fdr_payload_bytes
+
+# name, decoder, whether the whole body has to be held in memory
+_DECODERS = (
+    ('json.loads (full)', lambda body: json.loads(body), True),
+    ('json.loads + prune', lambda body: prune_fdr_response(json.loads(body)), True),
+    ('orjson + prune', decode_fdr_response_bytes, True),
+    ('streaming decoder', lambda body: stream_decode_fdr_response(io.BytesIO(body)), False),
+)
+
+
+def measure(decoder, body: bytes) -> tuple:
+    """
+    :return: (seconds, peak traced bytes)
+    """
+    gc.collect()
+    start = time.perf_counter()
+    result = decoder(body)
+    elapsed = time.perf_counter() - start
+    del result
+    gc.collect()
+    tracemalloc.start()
+    result = decoder(body)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('payloads', nargs='*', help='recorded getFDRData responses')
+    parser.add_argument('--nicknames', type=int, default=200)
+    parser.add_argument('--fdrs', type=int, default=150)
+    parser.add_argument('--years', type=int, default=10)
+    args = parser.parse_args()
+
+    if args.payloads:
+        bodies = []
+        for path in args.payloads:
+            with open(path, 'rb') as f:
+                bodies.append((path, f.read()))
+    else:
+        bodies = [(
+            'synthetic',
+            build_fdr_payload_bytes(
+                list(range(1, args.nicknames + 1)),
+                list(range(1000, 1000 + args.fdrs)),
+                list(range(2022 - args.years, 2022)),
+                statements_per_year=2
+            )
+        )]
+
+    for name, body in bodies:
+        print(f'{name}: {len(body) / 1e6:.1f} MB')
+        for decoder_name, decoder, holds_body in _DECODERS:
+            elapsed, peak = measure(decoder, body)
+            # a streaming decoder reads from the socket, the others need the body downloaded
+            peak += len(body) if holds_body else 0
+            print(f'  {decoder_name:<20} {elapsed:6.2f}s  peak {peak / 1e6:8.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
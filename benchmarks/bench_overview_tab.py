@@ -0,0 +1,97 @@
+# This file is developed to guard FDRAnnual.overview_tab_print against regressions
+# run from the repository root: python -m benchmarks.bench_overview_tab
+import argparse
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+
+from appian_graphql.FDR_annual import FDRAnnual
+from benchmarks.synthetic_fdr import build_fdr_rows, SyntheticFDRMap
+from sql.helpers import helios_output_data
+
+
+def legacy_overview_tab_print(self, data: list, params: list) -> list:
+    """
+    list scan implementation overview_tab_print replaced, kept as the reference output
+    """
+    UNQ_NICKNAMES_AGENTS_TEMPLATES_SECTORS = sorted(
+        set(
+            (x['nickname_id'], x['agent_id'], x['template_id'], x['sector_id'])
+            for x in data
+        )
+    )
+    res_list = []
+    for nickname_id, agent_id, template_id, sector_id in UNQ_NICKNAMES_AGENTS_TEMPLATES_SECTORS:
+        UNQ_YEARS = sorted(
+            set(
+                x['report_date'] for x in data
+                if x['agent_id'] == agent_id and x['nickname_id'] == nickname_id
+            ),
+            reverse=True
+        )
+        res_dict = OrderedDict()
+        fdrs = self._FDR_MAP.get_fdr(template_id, sector_id)
+        res_dict['sector_id'] = sector_id
+        res_dict['template_id'] = template_id
+        res_dict['first_year'] = UNQ_YEARS[0]
+        res_dict['years'] = helios_output_data(
+            UNQ_YEARS[1:] if len(UNQ_YEARS) > 1 else []
+        )
+        data_list = []
+        for idx, year in enumerate(UNQ_YEARS):
+            data_list.append([None for __ in range(len(fdrs))])
+            for fdr_idx, fdr in enumerate(fdrs):
+                try:
+                    datapoint = [
+                        __['adjustedValue'] for __ in data
+                        if __['agent_id'] == agent_id
+                        and __['nickname_id'] == nickname_id
+                        and __['report_date'] == year
+                        and __['fdr_id'] == fdr
+                        and __['template_id'] == template_id
+                        and __['sector_id'] == sector_id
+                    ]
+                    data_list[idx][fdr_idx] = datapoint[0]
+                except Exception:
+                    continue
+        res_dict['first_data_column'] = helios_output_data(data_list[0])
+        res_dict['data'] = helios_output_data(data_list[1:])
+        res_dict['agent_id'] = agent_id
+        res_list.append(res_dict)
+    return res_list
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--nicknames', type=int, default=50)
+    parser.add_argument('--fdrs', type=int, default=40)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--skip-legacy', action='store_true')
+    args = parser.parse_args()
+
+    fdr_ids = list(range(1000, 1000 + args.fdrs))
+    data = build_fdr_rows(
+        args.nicknames,
+        [('1', '10'), ('2', '20'), ('3', '30')],
+        fdr_ids,
+        list(range(2022 - args.years, 2022))
+    )
+    fake_self = SimpleNamespace(_FDR_MAP=SyntheticFDRMap(fdr_ids))
+
+    start = time.perf_counter()
+    result = FDRAnnual.overview_tab_print(fake_self, data, None)
+    indexed = time.perf_counter() - start
+    print(f'indexed overview_tab_print: {len(data)} rows in {indexed:.3f}s')
+
+    if not args.skip_legacy:
+        start = time.perf_counter()
+        expected = legacy_overview_tab_print(fake_self, data, None)
+        legacy = time.perf_counter() - start
+        print(f'legacy overview_tab_print:  {len(data)} rows in {legacy:.3f}s')
+        assert result == expected, 'overview_tab_print output differs from the legacy output'
+        assert repr(result) == repr(expected)
+        print(f'outputs identical, speed up x{legacy / indexed:.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# This file is developed to measure the per datapoint cost of date handling in the FDR pivot
+# run from the repository root: python -m benchmarks.bench_pivot_dates
+import argparse
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+from appian_graphql.FDR_handle import FDRHandle
+from benchmarks.synthetic_fdr import build_fdr_payload
+from sql.helpers import parse_statement_date
+
+
+def year_per_datapoint(payload: dict) -> int:
+    """
+    the old approach, the statement date is parsed again for every datapoint
+    """
+    total = 0
+    for agent in payload['data']['getFDRData']:
+        for statement in agent['statementMaster']:
+            report_date = statement['statementDate']
+            for info in statement['templateStatementInfo']:
+                for datapoint in info['stmntData']:
+                    if datapoint['adjustedValue'] is not None:
+                        total += int(
+                            datetime.strptime(report_date[:10], '%Y-%m-%d').strftime('%Y')
+                        )
+    return total
+
+
+def year_per_statement(payload: dict) -> int:
+    """
+    the statement date is normalized once per statement and shared by its datapoints
+    """
+    total = 0
+    for agent in payload['data']['getFDRData']:
+        for statement in agent['statementMaster']:
+            year = parse_statement_date(statement['statementDate']).year
+            for info in statement['templateStatementInfo']:
+                for datapoint in info['stmntData']:
+                    if datapoint['adjustedValue'] is not None:
+                        total += year
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--nicknames', type=int, default=200)
+    parser.add_argument('--fdrs', type=int, default=150)
+    parser.add_argument('--years', type=int, default=10)
+    args = parser.parse_args()
+
+    payload = build_fdr_payload(
+        list(range(1, args.nicknames + 1)),
+        list(range(1000, 1000 + args.fdrs)),
+        list(range(2022 - args.years, 2022)),
+        statements_per_year=2
+    )
+    datapoints = sum(
+        len(info['stmntData'])
+        for agent in payload['data']['getFDRData']
+        for statement in agent['statementMaster']
+        for info in statement['templateStatementInfo']
+    )
+
+    timings = {}
+    for name, function in (
+        ('parse per datapoint', year_per_datapoint),
+        ('parse per statement', year_per_statement)
+    ):
+        parse_statement_date.cache_clear()
+        start = time.perf_counter()
+        function(payload)
+        timings[name] = time.perf_counter() - start
+        print(f'{name}: {timings[name] / datapoints * 1e9:.0f} ns/datapoint')
+
+    handle = SimpleNamespace(_operation_mode='annual', _columnar=False)
+    handle._parse_statement_date = FDRHandle._parse_statement_date
+    start = time.perf_counter()
+    rows = FDRHandle.pivot_function(handle, payload, {'template_id': '1', 'sector_id': '10'})
+    elapsed = time.perf_counter() - start
+    print(
+        f'FDRHandle.pivot_function: {datapoints} datapoints -> {len(rows)} rows, '
+        f'{elapsed / datapoints * 1e9:.0f} ns/datapoint'
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# This file is developed to compare pivoting in the I/O threads with pivoting on worker processes
+# run from the repository root: python -m benchmarks.bench_pivot_processes
+import argparse
+import os
+import time
+
+from api_integration.api_interface import APIEndPint, APIInputParams
+from benchmarks.stub_server import StubGraphQLServer
+from benchmarks.synthetic_fdr import build_fdr_payload_bytes
+
+
+class _BenchEndPoint(APIEndPint):
+
+    def __init__(self, engine: str, pivot_processes: int):
+        self._API_ENGINE = engine
+        self._PIVOT_PROCESSES = pivot_processes
+
+    def build_graph_ql_query_list(self) -> list:
+        pass
+
+    def get_data(self):
+        pass
+
+
+def pivot_rows(p_json_data: dict, metadata: dict = None) -> list:
+    """
+    dict row per reviewed datapoint, the same kind of pure python loop as the FDR pivot
+    """
+    rows = []
+    for agent in p_json_data['data']['getFDRData']:
+        for statement in agent['statementMaster']:
+            year = int(statement['statementDate'][:4])
+            period_type = statement['periodType']['periodTypeDesc']
+            for info in statement['templateStatementInfo']:
+                if info['analystReviewed'] != 'Y':
+                    continue
+                for datapoint in info['stmntData']:
+                    if datapoint['adjustedValue'] is None:
+                        continue
+                    rows.append({
+                        'agent_id': agent['agent']['agentId'],
+                        'nickname_id': agent['nicknameId'],
+                        'template_id': metadata['template_id'],
+                        'report_date': year,
+                        'period_type': period_type,
+                        'fdr_id': datapoint['fdrId'],
+                        'adjustedValue': float(datapoint['adjustedValue'])
+                    })
+    return rows
+
+
+def run(engine: str, url: str, requests: int, workers: int, pivot_processes: int) -> tuple:
+    """
+    :return: wall time in seconds, rows
+    """
+    api_objects = [
+        APIInputParams(
+            url=url,
+            request_type='get',
+            params={'query': f'{{ q{idx} }}'},
+            pivot_function_params={'template_id': idx % 7}
+        )
+        for idx in range(requests)
+    ]
+    end_point = _BenchEndPoint(engine, pivot_processes)
+    start = time.perf_counter()
+    data = end_point.get_appian_data(api_objects, pivot_function=pivot_rows, max_workers=workers)
+    return time.perf_counter() - start, len(data)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--nicknames', type=int, default=20)
+    parser.add_argument('--fdrs', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--workers', type=int, default=20)
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--engine', choices=('thread', 'async'), default='thread')
+    args = parser.parse_args()
+
+    payload = build_fdr_payload_bytes(
+        list(range(1, args.nicknames + 1)),
+        list(range(1000, 1000 + args.fdrs)),
+        list(range(2012, 2022))
+    )
+    with StubGraphQLServer(payload=payload, latency=args.latency) as server:
+        for name, pivot_processes in (
+            ('I/O threads', None),
+            (f'{args.processes} processes', args.processes)
+        ):
+            elapsed, rows = run(
+                args.engine, server.url, args.requests, args.workers, pivot_processes
+            )
+            print(
+                f'{name:>12}: {args.requests} responses, {rows} rows in {elapsed:.2f}s '
+                f'({args.requests / elapsed:.1f} responses/s)'
+            )
+
+
+if __name__ == '__main__':
+    main()
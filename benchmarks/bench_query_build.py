@@ -0,0 +1,102 @@
+# This file is developed to measure building the FDR statement list for many Helios tuples
+# run from the repository root: python -m benchmarks.bench_query_build
+import argparse
+import time
+from random import Random
+
+from appian_graphql.FDR_handle import FDRHandle
+from appian_graphql.statement_compiler import compile_statement
+from benchmarks.synthetic_fdr import SyntheticFDRMap
+from sql.helpers import unwrap_nick_temps_and_sectors
+
+_GRAPH_STATEMENT = (
+    '{ getFDRData(nicknameIds: [NICKNAME_ID_LIST], templateName: "TEMPLATE_NAME", '
+    'fdrIds: [FDR_IDS_LIST], startDate: "START_DATE", endDate: "END_DATE", '
+    'statementType: "STATEMENT_TYPE") { agent { agentId } nicknameId statementMaster { '
+    'statementDate periodType { periodTypeDesc } templateStatementInfo { analystReviewed '
+    'stmntData { fdrId adjustedValue } } } } }'
+)
+_HEADER_VALUES = {
+    'START_DATE': '2012-01-01',
+    'END_DATE': '2021-12-31',
+    'STATEMENT_TYPE': 'Original'
+}
+_KEYS = tuple(_HEADER_VALUES) + ('TEMPLATE_NAME', 'NICKNAME_ID_LIST', 'FDR_IDS_LIST')
+
+
+def build_tuples(count: int, template_sectors: int, seed: int = 0) -> str:
+    rng = Random(seed)
+    return '|'.join(
+        f'({nickname_id},{rng.randrange(template_sectors) % 40},{rng.randrange(template_sectors)})'
+        for nickname_id in range(1, count + 1)
+    )
+
+
+def legacy_query_list(tuples: str, fdr_map) -> list:
+    """
+    the old approach, a replace chain over the statement and a scan of every tuple per group
+    """
+    graph_ql = _GRAPH_STATEMENT
+    for stmnt_key, value in _HEADER_VALUES.items():
+        graph_ql = graph_ql.replace(stmnt_key, value)
+    nick_and_temps, unique_template_sectors = unwrap_nick_temps_and_sectors(tuples)
+    queries = []
+    for template_id, sector_id in unique_template_sectors:
+        nicknames = [
+            __[0] for __ in nick_and_temps
+            if __[1] == template_id and __[2] == sector_id
+        ]
+        queries.append(
+            graph_ql.replace(
+                'TEMPLATE_NAME', fdr_map.get_template_name(template_id, sector_id)
+            ).replace(
+                'NICKNAME_ID_LIST', ','.join(nicknames)
+            ).replace(
+                'FDR_IDS_LIST', ','.join(str(__) for __ in fdr_map.get_fdr(template_id, sector_id))
+            )
+        )
+    return queries
+
+
+def compiled_query_list(tuples: str, fdr_map) -> list:
+    """
+    statement parsed once, nicknames grouped in one pass
+    """
+    statement = compile_statement(_GRAPH_STATEMENT, _KEYS)
+    return [
+        statement.render_params(
+            {
+                'TEMPLATE_NAME': fdr_map.get_template_name(template_id, sector_id),
+                'NICKNAME_ID_LIST': nicknames,
+                'FDR_IDS_LIST': fdr_map.get_fdr(template_id, sector_id),
+                **_HEADER_VALUES
+            }
+        )['query']
+        for (template_id, sector_id), nicknames
+        in FDRHandle.group_nicknames({'dwbi-nickname_template_sector_tuples': tuples})
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tuples', type=int, default=10000)
+    parser.add_argument('--template-sectors', type=int, default=400)
+    parser.add_argument('--fdrs', type=int, default=300)
+    args = parser.parse_args()
+
+    tuples = build_tuples(args.tuples, args.template_sectors)
+    fdr_map = SyntheticFDRMap(list(range(1000, 1000 + args.fdrs)))
+    results = {}
+    for name, function in (
+        ('replace chain', legacy_query_list),
+        ('compiled statement', compiled_query_list)
+    ):
+        start = time.perf_counter()
+        results[name] = function(tuples, fdr_map)
+        print(f'{name}: {time.perf_counter() - start:.3f}s, {len(results[name])} queries')
+    print('same queries:', sorted(results['replace chain']) == sorted(results['compiled statement']))
+    print('deterministic:', compiled_query_list(tuples, fdr_map) == results['compiled statement'])
+
+
+if __name__ == '__main__':
+    main()
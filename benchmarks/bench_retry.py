@@ -0,0 +1,90 @@
+# This file is developed to measure retries and throttling against a fault injecting stub
+# run from the repository root: python -m benchmarks.bench_retry
+import argparse
+import time
+
+from api_integration.api_interface import APIEndPint, APIInputParams, APIRequestError
+from api_integration.retry_policy import RetryPolicy
+from benchmarks.bench_api_engines import count_datapoints
+from benchmarks.stub_server import StubGraphQLServer
+
+
+class _BenchEndPoint(APIEndPint):
+
+    def __init__(self, engine: str, retry_policy: RetryPolicy, rate_limit: float):
+        self._API_ENGINE = engine
+        self._RETRY_POLICY = retry_policy
+        self._RATE_LIMIT = rate_limit
+
+    def build_graph_ql_query_list(self) -> list:
+        pass
+
+    def get_data(self):
+        pass
+
+
+def run(engine: str, server_args: dict, requests: int, concurrency: int,
+        retry_policy: RetryPolicy, rate_limit: float) -> tuple:
+    """
+    :return: wall time in seconds, failed requests, stub server stats, limiter stats
+    """
+    # a class per run, the rate limiter is kept on the end point class
+    end_point_class = type('_RunEndPoint', (_BenchEndPoint,), {})
+    end_point = end_point_class(engine, retry_policy, rate_limit)
+    with StubGraphQLServer(**server_args) as server:
+        api_objects = [
+            APIInputParams(url=server.url, request_type='get', params={'query': f'{{ q{idx} }}'})
+            for idx in range(requests)
+        ]
+        start = time.perf_counter()
+        try:
+            end_point.get_appian_data(
+                api_objects,
+                pivot_function=count_datapoints,
+                max_workers=concurrency
+            )
+            failed = 0
+        except APIRequestError as e:
+            failed = len(e.failures)
+        elapsed = time.perf_counter() - start
+        server_stats = server.stats
+    rate_limiter = end_point.get_rate_limiter()
+    return elapsed, failed, server_stats, rate_limiter.get_stats() if rate_limiter else None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--fault-rate', type=float, default=0.05)
+    parser.add_argument('--server-rate-limit', type=float, default=200)
+    parser.add_argument('--client-rate-limit', type=float, default=400)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--engine', choices=('thread', 'async'), default='thread')
+    args = parser.parse_args()
+
+    server_args = {
+        'latency': args.latency,
+        'fault_rate': args.fault_rate,
+        'rate_limit': args.server_rate_limit,
+        'retry_after': 1,
+    }
+    for name, retry_policy, rate_limit in (
+        ('no retry', RetryPolicy(max_attempts=1), None),
+        ('retry', RetryPolicy(max_attempts=8, backoff_base=0.1), None),
+        ('retry + limiter', RetryPolicy(max_attempts=8, backoff_base=0.1), args.client_rate_limit),
+    ):
+        elapsed, failed, server_stats, limiter_stats = run(
+            args.engine, server_args, args.requests, args.concurrency, retry_policy, rate_limit
+        )
+        done = args.requests - failed
+        print(
+            f'{name:>15}: {done}/{args.requests} requests in {elapsed:.2f}s '
+            f'({done / elapsed:.0f} req/s), sent {server_stats["requests"]}, '
+            f'{server_stats["faults"]} faults, {server_stats["throttled"]} throttled'
+            + (f', limiter rate {limiter_stats["rate"]:.0f}/s' if limiter_stats else '')
+        )
+
+
+if __name__ == '__main__':
+    main()
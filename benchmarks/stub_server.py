@@ -0,0 +1,145 @@
+# This file is developed to stand in for the Appian graph ql API during benchmarks
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.synthetic_fdr import build_fdr_payload_bytes
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._respond()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self._respond(self.rfile.read(length) if length else b'')
+
+    def _respond(self, request_body: bytes = b''):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        status = self.server.next_status()
+        if status != 200:
+            body = b'{"errors": []}'
+        elif self.server.payload_factory is not None:
+            body = self.server.payload_factory(self.path, request_body)
+        else:
+            body = self.server.payload
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if status == 429:
+            self.send_header('Retry-After', str(self.server.retry_after))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+
+    # listen() is called in the constructor, the backlog has to be set on the class
+    request_queue_size = 1024
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # clients dropping the connection after an error response are expected here
+        pass
+
+    def setup_faults(self, fault_rate: float, fault_status: int, rate_limit: float, seed: int):
+        self._faults_lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self.fault_rate = fault_rate
+        self.fault_status = fault_status
+        self.rate_limit = rate_limit
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self.stats = {'requests': 0, 'faults': 0, 'throttled': 0}
+
+    def next_status(self) -> int:
+        """
+        status of the next response: 429 above rate_limit requests in the current second,
+        fault_status for a random fault_rate share of the rest, 200 otherwise
+        """
+        with self._faults_lock:
+            self.stats['requests'] += 1
+            if self.rate_limit:
+                now = time.monotonic()
+                if now - self._window_start >= 1.0:
+                    self._window_start = now
+                    self._window_count = 0
+                self._window_count += 1
+                if self._window_count > self.rate_limit:
+                    self.stats['throttled'] += 1
+                    return 429
+            if self.fault_rate and self._rng.random() < self.fault_rate:
+                self.stats['faults'] += 1
+                return self.fault_status
+            return 200
+
+
+class StubGraphQLServer:
+
+    def __init__(
+            self,
+            payload: bytes = None,
+            latency: float = 0.05,
+            host: str = '127.0.0.1',
+            port: int = 0,
+            fault_rate: float = 0.0,
+            fault_status: int = 503,
+            rate_limit: float = None,
+            retry_after: float = 1,
+            seed: int = 0,
+            payload_factory=None
+    ):
+        """
+        local HTTP server answering every request with the same getFDRData payload
+        :param payload: response body, a small synthetic payload is used if not provided
+        :param latency: seconds slept before answering, stands in for server time
+        :param host: interface to bind
+        :param port: port to bind, 0 picks a free port
+        :param fault_rate: share of requests failed with fault_status
+        :param fault_status: HTTP status of injected faults
+        :param rate_limit: requests per second answered, the rest get 429 with Retry-After
+        :param retry_after: seconds sent in Retry-After
+        :param seed: seed of the fault injection
+        :param payload_factory: called with the request path and body, returns the response
+        body. Lets a benchmark answer with payloads that depend on the query, payload is used
+        if None
+        """
+        self._server = _StubHTTPServer((host, port), _StubHandler)
+        self._server.payload = (
+            payload if payload is not None
+            else build_fdr_payload_bytes([1, 2], [101, 102, 103], [2020, 2021])
+        )
+        self._server.payload_factory = payload_factory
+        self._server.latency = latency
+        self._server.retry_after = retry_after
+        self._server.setup_faults(fault_rate, fault_status, rate_limit, seed)
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/data-service/graphql'
+
+    @property
+    def stats(self) -> dict:
+        """
+        requests received, faults injected and requests throttled
+        """
+        return dict(self._server.stats)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._server.shutdown()
+        self._server.server_close()
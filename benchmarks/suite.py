@@ -0,0 +1,331 @@
+# This file is developed to run the benchmark scenarios together and keep their results per commit
+# run from the repository root: python -m benchmarks.suite --save --compare <earlier results>
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from api_integration.api_interface import APIInputParams
+from appian_graphql.FDR_annual import FDRAnnual
+from benchmarks.stub_server import StubGraphQLServer
+from benchmarks.synthetic_fdr import build_fdr_payload, build_fdr_payload_bytes, build_fdr_rows
+from benchmarks.synthetic_fdr import SyntheticFDRConfig, SyntheticFDRMap
+from data_structures.datapoint_snapshot import DatapointSnapshotWriter
+
+_RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+# a scenario whose rate dropped by more than this share is reported as a regression
+_REGRESSION_THRESHOLD = 0.1
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(_RESULTS_DIR)
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def _template_sectors(count: int) -> list:
+    return [(str(idx % 40 + 1), str(idx + 10)) for idx in range(count)]
+
+
+def _build_handle(args) -> FDRAnnual:
+    """
+    FDRAnnual without its constructor, synthetic map and config stand in for the Appian ones
+    """
+    handle = FDRAnnual.__new__(FDRAnnual)
+    handle._FDR_MAP = SyntheticFDRMap(list(range(1000, 1000 + args.fdrs)))
+    handle._config = SyntheticFDRConfig(_years(args))
+    handle._operation_mode = 'annual'
+    handle._columnar = False
+    # every request has to reach the stub server
+    handle._RESPONSE_CACHE_TTL = None
+    return handle
+
+
+def _years(args) -> list:
+    return list(range(2022 - args.years, 2022))
+
+
+def _best_of(function, repeat: int):
+    """
+    fastest of repeat runs
+    :return: seconds, result of the last run
+    """
+    best = None
+    result = None
+    for __ in range(max(1, repeat)):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def _result(seconds: float, items: int, unit: str, **extra) -> dict:
+    return {
+        'seconds': round(seconds, 6),
+        'items': items,
+        'unit': unit,
+        'rate': round(items / seconds, 3) if seconds else None,
+        **extra
+    }
+
+
+def _fetch_scenario(engine: str):
+
+    def scenario(args) -> dict:
+        """
+        get_appian_data against the stub server: fetch, decode and FDR pivot of every response
+        """
+        template_sectors = _template_sectors(args.template_sectors)
+        payloads = {
+            str(group): build_fdr_payload_bytes(
+                list(range(1, args.nicknames_per_request + 1)),
+                list(range(1000, 1000 + args.fdrs)),
+                _years(args),
+                seed=group
+            )
+            for group in range(len(template_sectors))
+        }
+
+        def payload_factory(path: str, body: bytes) -> bytes:
+            return payloads[parse_qs(urlsplit(path).query)['group'][0]]
+
+        handle = _build_handle(args)
+        handle._API_ENGINE = engine
+        with StubGraphQLServer(latency=args.latency, payload_factory=payload_factory) as server:
+            api_objects = []
+            for idx in range(args.requests):
+                group = idx % len(template_sectors)
+                template_id, sector_id = template_sectors[group]
+                api_objects.append(
+                    APIInputParams(
+                        url=server.url,
+                        request_type='get',
+                        params={'group': group, 'query': f'{{ q{idx} }}'},
+                        pivot_function_params={'template_id': template_id, 'sector_id': sector_id}
+                    )
+                )
+            seconds, rows = _best_of(
+                lambda: handle.get_appian_data(api_objects, pivot_function=handle.pivot_function),
+                args.repeat
+            )
+        return _result(
+            seconds,
+            args.requests,
+            'requests',
+            rows=len(rows),
+            bytes_per_response=round(sum(map(len, payloads.values())) / len(payloads))
+        )
+    return scenario
+
+
+def _pivot_scenario(args) -> dict:
+    """
+    FDRHandle.pivot_function over one response of every nickname
+    """
+    payload = build_fdr_payload(
+        list(range(1, args.nicknames + 1)),
+        list(range(1000, 1000 + args.fdrs)),
+        _years(args)
+    )
+    handle = _build_handle(args)
+    seconds, rows = _best_of(
+        lambda: handle.pivot_function(payload, {'template_id': '1', 'sector_id': '10'}),
+        args.repeat
+    )
+    return _result(seconds, len(rows), 'rows')
+
+
+def _pivoted_rows(args) -> list:
+    return build_fdr_rows(
+        args.nicknames,
+        _template_sectors(args.template_sectors),
+        list(range(1000, 1000 + args.fdrs)),
+        _years(args)
+    )
+
+
+def _overview_tab_scenario(args) -> dict:
+    data = _pivoted_rows(args)
+    handle = _build_handle(args)
+    seconds, __ = _best_of(lambda: handle.overview_tab_print(data, None), args.repeat)
+    return _result(seconds, len(data), 'rows')
+
+
+def _data_download_scenario(args) -> dict:
+    data = _pivoted_rows(args)
+    handle = _build_handle(args)
+    seconds, __ = _best_of(lambda: handle.data_download_print(data, None), args.repeat)
+    return _result(seconds, len(data), 'rows')
+
+
+def _data_download_from_snapshot_scenario(args) -> dict:
+    """
+    get_snapshot_data rendering the download tab from memory mapped datapoints
+    """
+    data = _pivoted_rows(args)
+    handle = _build_handle(args)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        snapshot_path = os.path.join(temp_dir, 'snapshot')
+        with DatapointSnapshotWriter(snapshot_path) as writer:
+            writer.add_segment(data)
+        seconds, __ = _best_of(
+            lambda: handle.get_snapshot_data(handle.data_download_print, snapshot_path),
+            args.repeat
+        )
+    return _result(seconds, len(data), 'rows')
+
+
+def _data_download_with_details_scenario(args) -> dict:
+    nickname_ids = list(range(1, args.nicknames + 1))
+    handle = _build_handle(args)
+    data = handle.pivot_function_with_details(
+        build_fdr_payload(nickname_ids, list(range(1000, 1000 + args.fdrs)), _years(args)),
+        {'template_id': '1', 'sector_id': '10'}
+    )
+    params = {'nickname_ids': nickname_ids, 'template_id': '1', 'sector_id': '10'}
+    seconds, __ = _best_of(
+        lambda: handle.data_download_with_details_print(data, params), args.repeat
+    )
+    return _result(seconds, len(data), 'rows')
+
+
+def _print_data_scenario(mode: str):
+
+    def scenario(args) -> dict:
+        """
+        print_data of the pivoted rows to a file
+        """
+        handle = _build_handle(args)
+        handle._FDRData = _pivoted_rows(args)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            destination = os.path.join(temp_dir, f'fdr.{mode}')
+            seconds, __ = _best_of(
+                lambda: handle.print_data(mode=mode, destination=destination), args.repeat
+            )
+            size = os.path.getsize(destination)
+        return _result(seconds, len(handle._FDRData), 'rows', bytes_written=size)
+    return scenario
+
+
+_SCENARIOS = {
+    'get_appian_data_thread': _fetch_scenario('thread'),
+    'get_appian_data_async': _fetch_scenario('async'),
+    'pivot_function': _pivot_scenario,
+    'overview_tab_print': _overview_tab_scenario,
+    'data_download_print': _data_download_scenario,
+    'data_download_from_snapshot': _data_download_from_snapshot_scenario,
+    'data_download_with_details_print': _data_download_with_details_scenario,
+    'print_data_csv': _print_data_scenario('csv'),
+    'print_data_json': _print_data_scenario('json'),
+    'print_data_parquet': _print_data_scenario('parquet'),
+    'print_data_arrow': _print_data_scenario('arrow'),
+}
+
+
+def run_suite(args) -> dict:
+    """
+    runs the selected scenarios, a failing scenario is recorded and the others still run
+    :return: results with the commit and the parameters they were measured with
+    """
+    results = {}
+    for name, scenario in _SCENARIOS.items():
+        if args.only and name not in args.only:
+            continue
+        try:
+            results[name] = scenario(args)
+        except Exception as e:
+            results[name] = {'error': repr(e)}
+    return {
+        'commit': _git_commit(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'params': {
+            key: value for key, value in vars(args).items()
+            if key not in ('save', 'compare', 'only', 'threshold')
+        },
+        'scenarios': results
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float = _REGRESSION_THRESHOLD) -> list:
+    """
+    rate of every scenario against the baseline
+    :return: names of the scenarios that failed or are slower than the baseline by more than
+    threshold
+    """
+    if results['params'] != baseline.get('params'):
+        print('note: the baseline was measured with different parameters')
+    regressions = []
+    for name, result in results['scenarios'].items():
+        if 'error' in result:
+            print(f'{name:>34}: FAILED')
+            regressions.append(name)
+            continue
+        before = baseline['scenarios'].get(name, {})
+        if not result.get('rate') or not before.get('rate'):
+            continue
+        ratio = result['rate'] / before['rate']
+        flag = ''
+        if ratio < 1 - threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f'{name:>34}: x{ratio:.2f} vs {baseline["commit"][:10]}{flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--nicknames', type=int, default=200)
+    parser.add_argument('--fdrs', type=int, default=60)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--template-sectors', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--nicknames-per-request', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', nargs='*', choices=sorted(_SCENARIOS))
+    parser.add_argument(
+        '--save', nargs='?', const='', default=None,
+        help='results file, benchmarks/results/<commit>.json if no path is given'
+    )
+    parser.add_argument('--compare', help='results file of an earlier run')
+    parser.add_argument('--threshold', type=float, default=_REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    results = run_suite(args)
+    for name, result in results['scenarios'].items():
+        if 'error' in result:
+            print(f'{name:>34}: failed {result["error"]}')
+        else:
+            print(
+                f'{name:>34}: {result["items"]} {result["unit"]} in {result["seconds"]:.3f}s '
+                f'({result["rate"]:.1f} {result["unit"]}/s)'
+            )
+    if args.save is not None:
+        path = args.save or os.path.join(_RESULTS_DIR, f'{results["commit"][:12]}.json')
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'saved {path}')
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+# This file is developed to generate synthetic getFDRData payloads for the benchmarks
+import json
+from random import Random
+
+_PERIOD_TYPES = (
+    '3 Months - 1st Quarter',
+    '6 Months - Interim',
+    '9 Months - 3rd Quarter',
+    '12 Months - 4th Quarter',
+    'Year End'
+)
+
+
+def build_fdr_payload(
+        nickname_ids: list,
+        fdr_ids: list,
+        years: list,
+        statements_per_year: int = 1,
+        null_ratio: float = 0.1,
+        seed: int = 0
+) -> dict:
+    """
+    builds a response shaped like data.getFDRData of the Appian graph ql API
+    :param nickname_ids: one agent is generated per nickname
+    :param fdr_ids: FDR ids present in every statement
+    :param years: statement years
+    :param statements_per_year: statements per year, each with a different period type
+    :param null_ratio: share of datapoints without adjustedValue
+    :param seed: random seed, payloads are deterministic for a given seed
+    :return: dict
+    """
+    rnd = Random(seed)
+    agents = []
+    for nickname_id in nickname_ids:
+        statements = []
+        for year in years:
+            for period_idx in range(statements_per_year):
+                period_type = _PERIOD_TYPES[
+                    (len(_PERIOD_TYPES) - 1 - period_idx) % len(_PERIOD_TYPES)
+                ]
+                statements.append({
+                    'statementDate': f'{year}-12-{31 - period_idx:02d}',
+                    'fiscalYearEnd': '12',
+                    'exchangeRate': 1.0,
+                    'scale': {'scaleDesc': 'Thousands'},
+                    'currency': {'currencyCode': 'USD'},
+                    'periodType': {'periodTypeDesc': period_type},
+                    'statementType': {'statementTypeDesc': 'Consolidated'},
+                    'templateStatementInfo': [{
+                        'analystReviewed': 'Y',
+                        'privateFlg': 'N',
+                        'stmntData': [
+                            {
+                                'fdrId': fdr_id,
+                                'adjustedValue': (
+                                    None if rnd.random() < null_ratio
+                                    else round(rnd.uniform(-1e6, 1e6), 2)
+                                ),
+                                'reportedValue': round(rnd.uniform(-1e6, 1e6), 2),
+                                'comments': None
+                            }
+                            for fdr_id in fdr_ids
+                        ]
+                    }]
+                })
+        agents.append({
+            'agent': {'agent_id': nickname_id * 10, 'agentId': nickname_id * 10},
+            'nicknameId': nickname_id,
+            'statementMaster': statements
+        })
+    return {'data': {'getFDRData': agents}}
+
+
+def build_fdr_payload_bytes(*args, **kwargs) -> bytes:
+    """
+    same as build_fdr_payload but JSON encoded
+    :return: bytes
+    """
+    return json.dumps(build_fdr_payload(*args, **kwargs)).encode('utf-8')
+
+
+def build_fdr_rows(
+        nickname_count: int,
+        template_sectors: list,
+        fdr_ids: list,
+        years: list,
+        fill_ratio: float = 0.9,
+        seed: int = 0
+) -> list:
+    """
+    builds pivoted datapoints in the shape the FDRHandle pivot functions return
+    :param nickname_count: nicknames are spread evenly over template_sectors
+    :param template_sectors: list of (template_id, sector_id)
+    :param fdr_ids: FDR ids per statement
+    :param years: report years
+    :param fill_ratio: share of (year, fdr) combinations that have a datapoint
+    :param seed: random seed
+    :return: list of dicts
+    """
+    rnd = Random(seed)
+    rows = []
+    for nickname_id in range(1, nickname_count + 1):
+        template_id, sector_id = template_sectors[nickname_id % len(template_sectors)]
+        for year in years:
+            for fdr_id in fdr_ids:
+                if rnd.random() > fill_ratio:
+                    continue
+                rows.append({
+                    'agent_id': nickname_id * 10,
+                    'nickname_id': nickname_id,
+                    'sector_id': sector_id,
+                    'template_id': template_id,
+                    'report_date': year,
+                    'period_type': 'Year End',
+                    'fdr_id': fdr_id,
+                    'adjustedValue': round(rnd.uniform(-1e6, 1e6), 2)
+                })
+    rnd.shuffle(rows)
+    return rows
+
+
+class SyntheticFDRMap:
+
+    def __init__(self, fdr_ids: list):
+        """
+        stands in for FDRTemplateMap, every template/sector maps to the same FDR ids
+        """
+        self._fdr_ids = list(fdr_ids)
+
+    def get_fdr(self, template_id, sector_id) -> list:
+        return self._fdr_ids
+
+    def get_template_name(self, template_id, sector_id) -> str:
+        return f'Template {template_id}'
+
+    def get_sector_name(self, template_id, sector_id) -> str:
+        return f'Sector {sector_id}'
+
+    def get_fdrid_type(self, template_id, sector_id, fdr_id) -> str:
+        return 'core'
+
+
+class SyntheticFDRConfig:
+
+    def __init__(self, years: list):
+        """
+        stands in for AppianFDRConfig in the printers and print_data
+        :param years: years of get_year_range
+        """
+        self._years = list(years)
+
+    def get_year_range(self) -> list:
+        return self._years
+
+    def get_output_columns(self) -> list:
+        return [
+            'NICKNAME_ID', 'AGENT_ID', 'TEMPLATE_ID', 'SECTOR_ID', 'FDR_ID', 'SECTOR_NAME',
+            'TEMPLATE_NAME'
+        ] + [str(year) for year in self._years]
+
+    def get_output_columns_with_details(self) -> list:
+        return [
+            'NICKNAME_ID', 'AGENT_ID', 'TEMPLATE_ID', 'SECTOR_ID', 'FDR_ID', 'SECTOR_NAME',
+            'TEMPLATE_NAME', 'FDR_SECTION', 'SCALE_DESC', 'CURRENCY_CODE', 'STATEMENT_TYPE',
+            'PRIVATE_FLAG', 'FISCAL_END_YEAR', 'EXCHANGE_RATE'
+        ] + [str(year) for year in self._years]
+
+    def get_csv_delimiter(self) -> str:
+        return ','
+
+    def get_print_delimiter(self) -> str:
+        return '|'
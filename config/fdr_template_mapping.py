@@ -0,0 +1,209 @@
+# This file is developed to look up the FDR ids and names of templates and sectors
+import hashlib
+import json
+import os
+import threading
+import warnings
+
+from api_integration.local_storage import ensure_private_dir, get_private_dir
+from api_integration.local_storage import open_private_file, write_private_file
+from sql.helpers import get_mapping_file_location
+
+_FDR_TYPE_ALL = 'all'
+# bumped whenever the layout of the compiled index changes
+_INDEX_VERSION = 2
+_CACHE_SUFFIX = '.json'
+
+# mapping file -> (signature of the file, index), every FDRTemplateMap of the process shares it
+_loaded_indexes = {}
+_load_lock = threading.Lock()
+
+
+def build_template_index(records: list) -> dict:
+    """
+    turns the records of the mapping file into dicts keyed the way the printers look them up.
+    Template, sector and FDR ids are keyed as strings so '1' and 1 find the same entry. The file
+    is a JSON list of
+    {"template_id", "template_name", "sector_id", "sector_name", "fdr_id", "fdr_type"}
+    :param records: decoded mapping file
+    :return: dict with names, fdrs and fdr_types
+    """
+    # (template, sector) -> (template name, sector name)
+    names = {}
+    # (template, sector) -> fdr type -> FDR ids in file order
+    fdrs = {}
+    # (template, sector, fdr) -> fdr type
+    fdr_types = {}
+    for record in records:
+        key = (str(record['template_id']), str(record['sector_id']))
+        if key not in names:
+            names[key] = (record.get('template_name'), record.get('sector_name'))
+        fdr_id = record.get('fdr_id')
+        if fdr_id is None:
+            continue
+        fdr_key = key + (str(fdr_id),)
+        if fdr_key in fdr_types:
+            continue
+        fdr_type = record.get('fdr_type')
+        fdr_types[fdr_key] = fdr_type
+        by_type = fdrs.get(key)
+        if by_type is None:
+            by_type = fdrs[key] = {_FDR_TYPE_ALL: []}
+        by_type[_FDR_TYPE_ALL].append(fdr_id)
+        if fdr_type is not None and fdr_type.lower() != _FDR_TYPE_ALL:
+            by_type.setdefault(fdr_type.lower(), []).append(fdr_id)
+    return {'names': names, 'fdrs': fdrs, 'fdr_types': fdr_types}
+
+
+def _get_signature(path: str):
+    """
+    (mtime, size) of the mapping file, None if it can not be reached
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _dump_index(index: dict) -> dict:
+    """
+    index with its tuple keys flattened into lists so it can be written as JSON
+    """
+    return {
+        'names': [list(key) + list(names) for key, names in index['names'].items()],
+        'fdrs': [list(key) + [by_type] for key, by_type in index['fdrs'].items()],
+        'fdr_types': [list(key) + [fdr_type] for key, fdr_type in index['fdr_types'].items()]
+    }
+
+
+def _load_dumped_index(dumped: dict) -> dict:
+    return {
+        'names': {(t, s): (t_name, s_name) for t, s, t_name, s_name in dumped['names']},
+        'fdrs': {(t, s): by_type for t, s, by_type in dumped['fdrs']},
+        'fdr_types': {(t, s, f): fdr_type for t, s, f, fdr_type in dumped['fdr_types']}
+    }
+
+
+def _read_cache(cache_path: str):
+    """
+    compiled copy of the mapping file, None if it is missing, not a private file of the user,
+    of another version or malformed
+    """
+    try:
+        with open_private_file(cache_path) as f:
+            cached = json.load(f)
+        if cached['version'] != _INDEX_VERSION:
+            return None
+        return {
+            'signature': tuple(cached['signature']) if cached['signature'] else None,
+            'digest': cached['digest'],
+            'index': _load_dumped_index(cached['index'])
+        }
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _write_cache(cache_path: str, signature, digest: str, index: dict) -> None:
+    cached = {
+        'version': _INDEX_VERSION,
+        'signature': signature,
+        'digest': digest,
+        'index': _dump_index(index)
+    }
+    try:
+        ensure_private_dir(os.path.dirname(cache_path))
+        write_private_file(cache_path, json.dumps(cached, separators=(',', ':')).encode('utf-8'))
+    except OSError as e:
+        # the compiled copy only saves the next process a parse
+        warnings.warn(f'mapping cache {cache_path} not written: {e}')
+
+
+def _load_index(path: str, signature, cache_dir: str = None) -> dict:
+    """
+    index of the mapping file, from the local compiled copy when the file did not change
+    """
+    cache_path = None
+    cached = None
+    if cache_dir is not None:
+        cache_path = os.path.join(
+            cache_dir, hashlib.sha256(path.encode('utf-8')).hexdigest() + _CACHE_SUFFIX
+        )
+        cached = _read_cache(cache_path)
+    if cached is not None and signature is not None and cached['signature'] == signature:
+        return cached['index']
+    if signature is None and cached is not None:
+        warnings.warn(f'{path} can not be reached, using the mapping cached in {cache_path}')
+        return cached['index']
+    with open(path, 'rb') as f:
+        content = f.read()
+    digest = hashlib.sha256(content).hexdigest()
+    if cached is not None and cached['digest'] == digest:
+        # touched but not changed
+        index = cached['index']
+    else:
+        index = build_template_index(json.loads(content))
+    if cache_path is not None:
+        _write_cache(cache_path, signature, digest, index)
+    return index
+
+
+def load_template_index(path: str, cache_dir: str = None) -> dict:
+    """
+    index of the mapping file, parsed once per process and reloaded only when the file
+    changed. The parsed index is also kept as JSON in cache_dir together with the mtime, size
+    and sha256 of the file, a new process loads it from there without reading the share
+    :param path: mapping file
+    :param cache_dir: directory of the compiled copies, None to always parse the file
+    :return: see build_template_index
+    """
+    signature = _get_signature(path)
+    with _load_lock:
+        loaded = _loaded_indexes.get(path)
+        if loaded is not None and (signature is None or loaded[0] == signature):
+            return loaded[1]
+        index = _load_index(path, signature, cache_dir)
+        _loaded_indexes[path] = (signature, index)
+    return index
+
+
+class FDRTemplateMap:
+    # compiled copies of the mapping file, None parses the file on every new process
+    _CACHE_DIR = get_private_dir('template_map')
+
+    def __init__(self, fdr_type: str = _FDR_TYPE_ALL, mapping_file: str = None):
+        """
+        FDR ids and names of every template/sector, every lookup is a dict get. The printers
+        call these for every row, the lists handed out are shared and must not be changed
+        :param fdr_type: core, complimentary or all, FDR ids returned by get_fdr
+        :param mapping_file: defaults to get_mapping_file_location
+        """
+        index = load_template_index(
+            mapping_file if mapping_file is not None else get_mapping_file_location(),
+            self._CACHE_DIR
+        )
+        self._fdr_type = fdr_type.lower()
+        self._names = index['names']
+        self._fdrs = index['fdrs']
+        self._fdr_types = index['fdr_types']
+
+    def get_fdr(self, template_id, sector_id) -> list:
+        """
+        FDR ids of the template/sector matching the fdr type, in file order
+        :return: list
+        """
+        by_type = self._fdrs.get((str(template_id), str(sector_id)))
+        if by_type is None:
+            return []
+        return by_type.get(self._fdr_type, [])
+
+    def get_template_name(self, template_id, sector_id) -> str:
+        names = self._names.get((str(template_id), str(sector_id)))
+        return names[0] if names is not None else None
+
+    def get_sector_name(self, template_id, sector_id) -> str:
+        names = self._names.get((str(template_id), str(sector_id)))
+        return names[1] if names is not None else None
+
+    def get_fdrid_type(self, template_id, sector_id, fdr_id) -> str:
+        return self._fdr_types.get((str(template_id), str(sector_id), str(fdr_id)))
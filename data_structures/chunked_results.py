@@ -0,0 +1,63 @@
+from itertools import chain
+
+from data_structures.fdr_index import _is_columnar
+
+
+class ChunkedResults:
+
+    def __init__(self):
+        """
+        accumulates API results as a list of chunks, one chunk per processed response.
+        list.append is atomic so worker threads can add chunks without a lock, and nothing
+        is copied until the chunks are merged once in to_list
+        """
+        self._chunks = []
+
+    def add(self, data) -> None:
+        """
+        adds a processed response, a dict counts as a single row, anything else as a chunk of rows
+        :param data: dict or list of rows
+        """
+        if isinstance(data, dict):
+            self._chunks.append([data])
+        elif data is not None:
+            self._chunks.append(data)
+
+    def iter_chunks(self):
+        """
+        lazy iterator over the chunks in the order they were added
+        """
+        # chunks added while iterating are picked up as well
+        idx = 0
+        while idx < len(self._chunks):
+            yield self._chunks[idx]
+            idx += 1
+
+    def __iter__(self):
+        return chain.from_iterable(self.iter_chunks())
+
+    def __len__(self) -> int:
+        return sum(len(chunk) for chunk in self._chunks)
+
+    def to_list(self) -> list:
+        """
+        merges every chunk into a single list of rows
+        :return: list
+        """
+        return list(self)
+
+    def merge(self):
+        """
+        merges every chunk once, chunks that are all ColumnarDatapointStores are merged into a
+        single store without going through dict rows
+        :return: ColumnarDatapointStore or list of rows
+        """
+        chunks = list(self.iter_chunks())
+        if not chunks or not all(_is_columnar(chunk) for chunk in chunks):
+            return self.to_list()
+        # imported here, numpy is only needed once the columnar pivot is used
+        from data_structures.columnar_store import ColumnarDatapointStore
+        store = ColumnarDatapointStore(sum(len(chunk) for chunk in chunks))
+        for chunk in chunks:
+            store.extend(chunk)
+        return store
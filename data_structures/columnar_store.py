@@ -0,0 +1,227 @@
+import numpy as np
+
+# id like columns are kept as int32 codes into a per column code book
+_CODED_COLUMNS = (
+    'agent_id', 'nickname_id', 'sector_id', 'template_id', 'period_type', 'fdr_id'
+)
+_YEAR_COLUMN = 'report_date'
+_VALUE_COLUMN = 'adjustedValue'
+# order of the keys in the dict rows handed out for backward compatibility
+_ROW_COLUMNS = (
+    'agent_id', 'nickname_id', 'sector_id', 'template_id', 'report_date',
+    'period_type', 'fdr_id', 'adjustedValue'
+)
+
+
+class ColumnarDatapointStore:
+
+    def __init__(self, capacity: int = 1024):
+        """
+        columnar store of pivoted FDR datapoints: integer coded ids, an int32 year array and a
+        float64 value array, grown in batches. Iterating it yields the same dict rows the pivot
+        functions used to return
+        :param capacity: initial number of datapoints allocated
+        """
+        capacity = max(int(capacity), 1)
+        self._size = 0
+        self._code_books = {column: {} for column in _CODED_COLUMNS}
+        self._code_values = {column: [] for column in _CODED_COLUMNS}
+        self._codes = {column: np.empty(capacity, dtype=np.int32) for column in _CODED_COLUMNS}
+        self._years = np.empty(capacity, dtype=np.int32)
+        self._values = np.empty(capacity, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def columns(self) -> tuple:
+        """
+        keys of the dict rows in order
+        """
+        return _ROW_COLUMNS
+
+    def _reserve(self, extra: int) -> None:
+        """
+        makes room for extra datapoints, capacity doubles so appends are amortised O(1)
+        """
+        needed = self._size + extra
+        capacity = len(self._years)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for column in _CODED_COLUMNS:
+            self._codes[column] = np.resize(self._codes[column], capacity)
+        self._years = np.resize(self._years, capacity)
+        self._values = np.resize(self._values, capacity)
+
+    def encode(self, column: str, values) -> np.ndarray:
+        """
+        turns ids into codes, unseen ids are added to the code book of the column
+        :param column: one of the coded columns
+        :param values: iterable of ids
+        :return: int32 array
+        """
+        code_book = self._code_books[column]
+        code_values = self._code_values[column]
+        codes = []
+        for value in values:
+            code = code_book.get(value)
+            if code is None:
+                code = code_book[value] = len(code_values)
+                code_values.append(value)
+            codes.append(code)
+        return np.asarray(codes, dtype=np.int32)
+
+    def decode(self, column: str, codes: np.ndarray) -> list:
+        """
+        turns codes back into the original ids
+        :param column: one of the coded columns
+        :param codes: int array
+        :return: list
+        """
+        code_values = np.empty(len(self._code_values[column]), dtype=object)
+        code_values[:] = self._code_values[column]
+        return code_values[codes].tolist()
+
+    def append_batch(
+            self,
+            agent_ids,
+            nickname_ids,
+            sector_ids,
+            template_ids,
+            years,
+            period_types,
+            fdr_ids,
+            values
+    ) -> None:
+        """
+        appends a batch of datapoints given column wise, every argument has the same length
+        """
+        count = len(values)
+        if count == 0:
+            return
+        self._reserve(count)
+        start, end = self._size, self._size + count
+        for column, column_values in zip(
+            _CODED_COLUMNS,
+            (agent_ids, nickname_ids, sector_ids, template_ids, period_types, fdr_ids)
+        ):
+            self._codes[column][start:end] = self.encode(column, column_values)
+        self._years[start:end] = years
+        self._values[start:end] = values
+        self._size = end
+
+    def append_rows(self, rows: list) -> None:
+        """
+        appends dict rows as produced by the pivot functions
+        :param rows: list of dicts
+        """
+        if not rows:
+            return
+        self.append_batch(
+            *[
+                [row[column] for row in rows]
+                for column in (
+                    'agent_id', 'nickname_id', 'sector_id', 'template_id',
+                    _YEAR_COLUMN, 'period_type', 'fdr_id', _VALUE_COLUMN
+                )
+            ]
+        )
+
+    def extend(self, other: 'ColumnarDatapointStore') -> None:
+        """
+        appends every datapoint of another store, codes are remapped without going through rows
+        :param other: ColumnarDatapointStore
+        """
+        count = len(other)
+        if count == 0:
+            return
+        self._reserve(count)
+        start, end = self._size, self._size + count
+        for column in _CODED_COLUMNS:
+            remap = self.encode(column, other._code_values[column])
+            self._codes[column][start:end] = remap[other.column(column)]
+        self._years[start:end] = other.column(_YEAR_COLUMN)
+        self._values[start:end] = other.column(_VALUE_COLUMN)
+        self._size = end
+
+    def take(self, positions) -> 'ColumnarDatapointStore':
+        """
+        new store holding the datapoints at positions, in that order
+        :param positions: int array of datapoint positions
+        :return: ColumnarDatapointStore
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        store = ColumnarDatapointStore(len(positions))
+        for column in _CODED_COLUMNS:
+            store._code_books[column] = dict(self._code_books[column])
+            store._code_values[column] = list(self._code_values[column])
+            store._codes[column][:len(positions)] = self.column(column)[positions]
+        store._years[:len(positions)] = self.column(_YEAR_COLUMN)[positions]
+        store._values[:len(positions)] = self.column(_VALUE_COLUMN)[positions]
+        store._size = len(positions)
+        return store
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        read only view of a column, codes for id columns
+        :param name: column name as used in the dict rows
+        :return: np.ndarray
+        """
+        if name == _YEAR_COLUMN:
+            array = self._years
+        elif name == _VALUE_COLUMN:
+            array = self._values
+        elif name in self._codes:
+            array = self._codes[name]
+        else:
+            raise KeyError(name)
+        view = array[:self._size]
+        view.flags.writeable = False
+        return view
+
+    def decoded_column(self, name: str) -> list:
+        """
+        column values as python objects, ids decoded
+        :param name: column name as used in the dict rows
+        :return: list
+        """
+        if name in self._codes:
+            return self.decode(name, self.column(name))
+        return self.column(name).tolist()
+
+    def group_first(self, key_columns: tuple):
+        """
+        vectorized group by, returns the unique key combinations together with the position of
+        the first datapoint of each group
+        :param key_columns: columns forming the key
+        :return: (list of decoded key tuples, int array of first positions)
+        """
+        if self._size == 0:
+            return [], np.empty(0, dtype=np.int64)
+        keys = np.stack(
+            [self.column(name).astype(np.int64) for name in key_columns],
+            axis=1
+        )
+        unique_keys, first_positions = np.unique(keys, axis=0, return_index=True)
+        decoded = [
+            self.decode(name, unique_keys[:, idx]) if name in self._codes
+            else unique_keys[:, idx].tolist()
+            for idx, name in enumerate(key_columns)
+        ]
+        return list(zip(*decoded)), first_positions
+
+    def iter_rows(self):
+        """
+        dict row view of the datapoints, kept for code written against the pivot dict rows
+        """
+        columns = [self.decoded_column(name) for name in _ROW_COLUMNS]
+        for values in zip(*columns):
+            yield dict(zip(_ROW_COLUMNS, values))
+
+    def __iter__(self):
+        return self.iter_rows()
+
+    def to_rows(self) -> list:
+        return list(self.iter_rows())
@@ -0,0 +1,223 @@
+# This file is developed to keep pulled FDR datapoints on disk and render them again without the API
+import json
+import os
+import shutil
+
+import numpy as np
+
+from data_structures.columnar_store import ColumnarDatapointStore
+from data_structures.fdr_index import _is_columnar
+
+_YEAR_COLUMN = 'report_date'
+_VALUE_COLUMN = 'adjustedValue'
+# every other column is an int32 code into the string table of the column
+_COLUMN_DTYPES = {_YEAR_COLUMN: np.int32, _VALUE_COLUMN: np.float64}
+_CODE_DTYPE = np.int32
+_META_FILE = 'snapshot.json'
+_FORMAT_VERSION = 1
+
+
+def _column_file(column: str) -> str:
+    return f'column_{column}.bin'
+
+
+def snapshot_segment(pivot_data, unpivot_params: dict = None) -> list:
+    """
+    unpivot function of a snapshot pull, keeps the datapoints of a response together with the
+    parameters the printers are called with
+    :return: single (unpivot_params, datapoints) row
+    """
+    return [(unpivot_params, pivot_data)]
+
+
+class DatapointSnapshotWriter:
+
+    def __init__(self, path: str):
+        """
+        writes pivoted datapoints to a snapshot directory as they arrive: a file of fixed width
+        values per column and a string table per id column. The snapshot only replaces what is
+        at path once it is closed without an error
+        :param path: snapshot directory
+        """
+        self._path = path
+        self._temp_path = f'{path}.{os.getpid()}.tmp'
+        if os.path.exists(self._temp_path):
+            shutil.rmtree(self._temp_path)
+        os.makedirs(self._temp_path)
+        self._columns = None
+        self._files = {}
+        # column -> value -> code
+        self._code_books = {}
+        self._segments = []
+        self._size = 0
+
+    def _open(self, columns: list) -> None:
+        self._columns = list(columns)
+        for column in self._columns:
+            self._files[column] = open(
+                os.path.join(self._temp_path, _column_file(column)), 'wb'
+            )
+            if column not in _COLUMN_DTYPES:
+                self._code_books[column] = {}
+
+    def _encode(self, column: str, values) -> np.ndarray:
+        code_book = self._code_books[column]
+        return np.fromiter(
+            (code_book.setdefault(value, len(code_book)) for value in values),
+            dtype=_CODE_DTYPE,
+            count=len(values)
+        )
+
+    def _column_values(self, datapoints, column: str) -> np.ndarray:
+        if _is_columnar(datapoints):
+            if column in _COLUMN_DTYPES:
+                return datapoints.column(column)
+            # only the distinct codes of the store go through the code book
+            unique_codes, inverse = np.unique(datapoints.column(column), return_inverse=True)
+            return self._encode(column, datapoints.decode(column, unique_codes))[inverse]
+        if column in _COLUMN_DTYPES:
+            return np.array([row[column] for row in datapoints], dtype=_COLUMN_DTYPES[column])
+        return self._encode(column, [row.get(column) for row in datapoints])
+
+    def add_segment(self, datapoints, unpivot_params: dict = None) -> None:
+        """
+        appends the datapoints of a response, they are handed to the unpivot function together
+        with unpivot_params when the snapshot is rendered
+        :param datapoints: list of datapoint dicts or a ColumnarDatapointStore
+        :param unpivot_params: JSON serializable parameters of the unpivot function
+        """
+        count = len(datapoints) if datapoints is not None else 0
+        if count and self._columns is None:
+            self._open(
+                datapoints.columns if _is_columnar(datapoints) else datapoints[0].keys()
+            )
+        for column in self._columns if count else ():
+            self._column_values(datapoints, column).astype(
+                _COLUMN_DTYPES.get(column, _CODE_DTYPE), copy=False
+            ).tofile(self._files[column])
+        self._segments.append(
+            {'start': self._size, 'end': self._size + count, 'unpivot_params': unpivot_params}
+        )
+        self._size += count
+
+    def write_segments(self, segments) -> None:
+        """
+        sink of a snapshot pull, see snapshot_segment
+        :param segments: iterable of (unpivot_params, datapoints)
+        """
+        for unpivot_params, datapoints in segments:
+            self.add_segment(datapoints, unpivot_params)
+
+    def close(self) -> None:
+        for file in self._files.values():
+            file.close()
+        meta = {
+            'version': _FORMAT_VERSION,
+            'size': self._size,
+            'columns': self._columns or [],
+            # code -> value, the string table of every id column
+            'strings': {column: list(code_book) for column, code_book in self._code_books.items()},
+            'segments': self._segments
+        }
+        with open(os.path.join(self._temp_path, _META_FILE), 'w') as f:
+            json.dump(meta, f)
+        if os.path.exists(self._path):
+            shutil.rmtree(self._path)
+        os.replace(self._temp_path, self._path)
+
+    def abort(self) -> None:
+        for file in self._files.values():
+            file.close()
+        shutil.rmtree(self._temp_path, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # a failed pull leaves the previous snapshot in place
+            self.abort()
+
+
+class MappedDatapointStore(ColumnarDatapointStore):
+
+    def __init__(self, columns: list, arrays: dict, code_values: dict):
+        """
+        read only ColumnarDatapointStore over the memory mapped columns of a snapshot, the
+        printers group it vectorized like a store built by the columnar pivot. Pages are read
+        on first use so only the columns a printer touches are loaded
+        :param columns: column names in row order
+        :param arrays: column -> array, codes for the id columns
+        :param code_values: id column -> code -> value
+        """
+        self._row_columns = tuple(columns)
+        self._size = len(arrays[_VALUE_COLUMN]) if _VALUE_COLUMN in arrays else 0
+        self._code_values = code_values
+        self._code_books = None
+        self._codes = {column: array for column, array in arrays.items() if column in code_values}
+        self._years = arrays.get(_YEAR_COLUMN, np.empty(0, dtype=np.int32))
+        self._values = arrays.get(_VALUE_COLUMN, np.empty(0, dtype=np.float64))
+
+    def slice(self, start: int, end: int) -> 'MappedDatapointStore':
+        """
+        datapoints start..end sharing the mapped columns and string tables
+        """
+        arrays = {column: array[start:end] for column, array in self._codes.items()}
+        arrays[_YEAR_COLUMN] = self._years[start:end]
+        arrays[_VALUE_COLUMN] = self._values[start:end]
+        return MappedDatapointStore(self._row_columns, arrays, self._code_values)
+
+    @property
+    def columns(self) -> tuple:
+        return self._row_columns
+
+    def _reserve(self, extra: int) -> None:
+        raise TypeError('a snapshot is read only')
+
+    def iter_rows(self):
+        columns = [self.decoded_column(name) for name in self._row_columns]
+        for values in zip(*columns):
+            yield dict(zip(self._row_columns, values))
+
+
+class DatapointSnapshot:
+
+    def __init__(self, path: str):
+        """
+        snapshot written by DatapointSnapshotWriter, the columns are mapped with mmap instead of
+        read so opening it is instant whatever its size
+        :param path: snapshot directory
+        """
+        with open(os.path.join(path, _META_FILE)) as f:
+            meta = json.load(f)
+        if meta['version'] != _FORMAT_VERSION:
+            raise ValueError(f'unsupported snapshot version {meta["version"]}')
+        arrays = {}
+        for column in meta['columns']:
+            dtype = _COLUMN_DTYPES.get(column, _CODE_DTYPE)
+            # np.memmap can not map an empty file
+            arrays[column] = (
+                np.memmap(os.path.join(path, _column_file(column)), dtype=dtype, mode='r')
+                if meta['size'] else np.empty(0, dtype=dtype)
+            )
+        self._store = MappedDatapointStore(meta['columns'], arrays, meta['strings'])
+        self._segments = meta['segments']
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def get_store(self) -> MappedDatapointStore:
+        """
+        every datapoint of the snapshot
+        """
+        return self._store
+
+    def iter_segments(self):
+        """
+        datapoints of every pulled response with their unpivot parameters
+        :return: generator of (MappedDatapointStore, unpivot_params)
+        """
+        for segment in self._segments:
+            yield self._store.slice(segment['start'], segment['end']), segment['unpivot_params']
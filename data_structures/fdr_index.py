@@ -0,0 +1,121 @@
+def _is_columnar(data) -> bool:
+    """
+    ColumnarDatapointStore is recognised by its interface so numpy is only needed when used
+    """
+    return hasattr(data, 'group_first')
+
+
+class FDRDatapointIndex:
+
+    def __init__(self, data, value_key: str = 'adjustedValue'):
+        """
+        one pass hash index over pivoted FDR datapoints, replaces the list scans the printers
+        used to do for every key/year/fdr combination. The first datapoint seen for a key wins,
+        the same one the list scans returned
+        :param data: iterable of datapoint dicts produced by the pivot functions or a
+        ColumnarDatapointStore, which is grouped vectorized
+        :param value_key: key holding the datapoint value
+        """
+        # (agent, nickname, template, sector, year, fdr) -> value
+        self._values = {}
+        # (agent, nickname) -> years
+        self._years = {}
+        if _is_columnar(data):
+            self._index_store(data, value_key)
+        else:
+            self._index_rows(data, value_key)
+
+    def _index_rows(self, data, value_key: str) -> None:
+        keys = set()
+        values = self._values
+        years = self._years
+        for row in data:
+            agent_id = row['agent_id']
+            nickname_id = row['nickname_id']
+            template_id = row['template_id']
+            sector_id = row['sector_id']
+            year = row['report_date']
+            keys.add((nickname_id, agent_id, template_id, sector_id))
+            agent_years = years.get((agent_id, nickname_id))
+            if agent_years is None:
+                agent_years = years[(agent_id, nickname_id)] = set()
+            agent_years.add(year)
+            key = (agent_id, nickname_id, template_id, sector_id, year, row['fdr_id'])
+            if key not in values:
+                values[key] = row.get(value_key)
+        self._keys = sorted(keys)
+
+    def _index_store(self, store, value_key: str) -> None:
+        keys, first_positions = store.group_first(
+            ('agent_id', 'nickname_id', 'template_id', 'sector_id', 'report_date', 'fdr_id')
+        )
+        self._values = dict(zip(keys, store.column(value_key)[first_positions].tolist()))
+        year_keys, __ = store.group_first(('agent_id', 'nickname_id', 'report_date'))
+        for agent_id, nickname_id, year in year_keys:
+            self._years.setdefault((agent_id, nickname_id), set()).add(year)
+        self._keys = sorted(
+            store.group_first(('nickname_id', 'agent_id', 'template_id', 'sector_id'))[0]
+        )
+
+    def keys(self) -> list:
+        """
+        sorted unique (nickname, agent, template, sector) tuples
+        :return: list
+        """
+        return self._keys
+
+    def years(self, agent_id, nickname_id) -> list:
+        """
+        years with at least one datapoint for the agent/nickname, latest first
+        :return: list
+        """
+        return sorted(self._years.get((agent_id, nickname_id), ()), reverse=True)
+
+    def get_value(self, agent_id, nickname_id, template_id, sector_id, year, fdr_id, default=None):
+        """
+        O(1) lookup of a single datapoint value
+        """
+        return self._values.get(
+            (agent_id, nickname_id, template_id, sector_id, year, fdr_id),
+            default
+        )
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
+def group_year_values(
+        data,
+        key_fields: tuple,
+        year_key: str = 'report_date',
+        value_key: str = 'adjustedValue'
+) -> dict:
+    """
+    buckets datapoints once by their composite key, the printers fill the year columns from the
+    buckets instead of scanning data for every key and year. The first datapoint seen for a
+    key/year wins, the same one the list scans returned
+    :param data: iterable of datapoint dicts or a ColumnarDatapointStore, which is grouped
+    vectorized
+    :param key_fields: fields forming the composite key, in key order
+    :param year_key: field holding the year
+    :param value_key: field holding the datapoint value
+    :return: dict of key tuple -> {year: value}
+    """
+    buckets = {}
+    if _is_columnar(data):
+        keys, first_positions = data.group_first(tuple(key_fields) + (year_key,))
+        for key, value in zip(keys, data.column(value_key)[first_positions].tolist()):
+            year_values = buckets.get(key[:-1])
+            if year_values is None:
+                year_values = buckets[key[:-1]] = {}
+            year_values[key[-1]] = value
+        return buckets
+    for row in data:
+        key = tuple([row[field] for field in key_fields])
+        year_values = buckets.get(key)
+        if year_values is None:
+            year_values = buckets[key] = {}
+        year = row[year_key]
+        if year not in year_values:
+            year_values[year] = row[value_key]
+    return buckets
@@ -1,6 +1,169 @@
-from datetime import datetime
-from queue import  PriorityQueue
+from datetime import date, datetime
+import threading
+from sql.helpers import _GRAP_QL_PERIOD_PRIORITY
 
 
-class DateOrderedContainer:
-    pass
+def _statement_date_key(report_date) -> str:
+    """
+    ISO yyyy-mm-dd string of a statement date, ISO strings compare in date order
+    :param report_date: str, date or datetime
+    :return: str
+    """
+    if isinstance(report_date, (date, datetime)):
+        return report_date.strftime('%Y-%m-%d')
+    return str(report_date)[:10]
+
+
+class DataOrderedContainer:
+
+    def __init__(self, operation_mode: str):
+        """
+        keeps only the winning datapoint per (agent, nickname, fdr), superseded datapoints are
+        dropped on insert. annual mode keeps a winner per year, preferring the period type with
+        the highest _GRAP_QL_PERIOD_PRIORITY and then the latest statement. latest mode keeps
+        one winner, preferring the latest statement and then the period type priority
+        :param operation_mode: annual or latest
+        """
+        if operation_mode not in ('annual', 'latest'):
+            raise ValueError('Only annual and latest operation modes are allowed')
+        self._operation_mode = operation_mode
+        # key -> (rank, data), a dict keeps keys in the order they were first seen
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _key_rank(self, report_date, period_type: str, agent_id, nickname_id, fdr_id, year):
+        """
+        key a datapoint competes under and its rank, the higher rank wins
+        """
+        priority = _GRAP_QL_PERIOD_PRIORITY.get(period_type, 0)
+        date_key = _statement_date_key(report_date)
+        if self._operation_mode == 'annual':
+            return (agent_id, nickname_id, fdr_id, year), (priority, date_key)
+        return (agent_id, nickname_id, fdr_id), (date_key, priority)
+
+    def add_data(self, report_date, period_type: str, data: dict) -> None:
+        """
+        O(1) insert, data replaces the current winner of its key only if it ranks higher
+        :param report_date: statement date, str, date or datetime
+        :param period_type: periodTypeDesc of the statement
+        :param data: datapoint dict with agent_id, nickname_id, fdr_id and report_date (year)
+        """
+        key, rank = self._key_rank(
+            report_date,
+            period_type,
+            data['agent_id'],
+            data['nickname_id'],
+            data['fdr_id'],
+            data['report_date']
+        )
+        with self._lock:
+            current = self._data.get(key)
+            # on a tie the datapoint seen first is kept
+            if current is None or rank > current[0]:
+                self._data[key] = (rank, data)
+
+    def get_data(self) -> list:
+        """
+        winning datapoints in the order their keys were first seen
+        :return: list of dicts
+        """
+        with self._lock:
+            entries = list(self._data.values())
+        return [entry[1] for entry in entries]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data = {}
+
+
+class ColumnarOrderedContainer(DataOrderedContainer):
+
+    def __init__(self, operation_mode: str):
+        """
+        DataOrderedContainer of the columnar pivot, the winning datapoints are kept column wise
+        and handed out as a ColumnarDatapointStore without building a dict per datapoint
+        :param operation_mode: annual or latest
+        """
+        super().__init__(operation_mode)
+        # key -> (rank, position of the datapoint in the columns)
+        self._data = {}
+        self._columns = ([], [], [], [], [], [])
+
+    def add_datapoint(
+            self,
+            report_date,
+            period_type: str,
+            agent_id,
+            nickname_id,
+            fdr_id,
+            year: int,
+            value: float
+    ) -> None:
+        """
+        O(1) insert, see DataOrderedContainer.add_data
+        :param report_date: statement date, str, date or datetime
+        :param period_type: periodTypeDesc of the statement
+        :param year: year of the statement date
+        :param value: adjusted value
+        """
+        key, rank = self._key_rank(report_date, period_type, agent_id, nickname_id, fdr_id, year)
+        row = (agent_id, nickname_id, year, period_type, fdr_id, value)
+        with self._lock:
+            current = self._data.get(key)
+            if current is None:
+                self._data[key] = (rank, len(self._columns[0]))
+                for column, column_value in zip(self._columns, row):
+                    column.append(column_value)
+            # on a tie the datapoint seen first is kept
+            elif rank > current[0]:
+                self._data[key] = (rank, current[1])
+                for column, column_value in zip(self._columns, row):
+                    column[current[1]] = column_value
+
+    def add_data(self, report_date, period_type: str, data: dict) -> None:
+        self.add_datapoint(
+            report_date,
+            period_type,
+            data['agent_id'],
+            data['nickname_id'],
+            data['fdr_id'],
+            data['report_date'],
+            data['adjustedValue']
+        )
+
+    def get_data(self, sector_id=None, template_id=None):
+        """
+        winning datapoints in the order their keys were first seen
+        :param sector_id: sector of every datapoint
+        :param template_id: template of every datapoint
+        :return: ColumnarDatapointStore
+        """
+        # imported here, numpy is only needed once the columnar pivot is used
+        from data_structures.columnar_store import ColumnarDatapointStore
+        with self._lock:
+            agent_ids, nickname_ids, years, period_types, fdr_ids, values = self._columns
+            count = len(values)
+            store = ColumnarDatapointStore(count)
+            store.append_batch(
+                agent_ids,
+                nickname_ids,
+                [sector_id] * count,
+                [template_id] * count,
+                years,
+                period_types,
+                fdr_ids,
+                values
+            )
+        return store
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data = {}
+            self._columns = ([], [], [], [], [], [])
+
+
+# name used when the container was first declared
+DateOrderedContainer = DataOrderedContainer
@@ -7,6 +7,8 @@ import os
 import requests
 from random import random
 from collections import namedtuple
+from datetime import date, datetime
+from functools import lru_cache
 
 _GRAP_QL_PERIOD_PRIORITY = {
     '3 Months - 1st Quarter' : 1,
@@ -21,6 +23,12 @@ _HTTP_MAP = namedtuple(
     'http_arg_key dict_key_is_required'
 )
 
+# statement date parsed once, date_key is the ISO yyyy-mm-dd string
+_STATEMENT_DATE = namedtuple(
+    'StatementDate',
+    'date_key year'
+)
+
 _HELIOS_NICKNAME_KEY ='dwbi-nickname_list'
 _HELIOS_FDR_KEY = 'dwbi-fdr_id_list'
 _HELIOS_STATEMENT_MASTER_ID = 'dwbi-statement_id_list'
@@ -53,7 +61,7 @@ def get_local_environment_type() -> str:
 
 def list_to_string(
         input_list: list,
-        data_separator: str
+        data_separator: str = ','
         ) -> str:
     """
         turns list of numbers into string format if input_list is a string we transform it by
@@ -100,6 +108,62 @@ def helios_output_data(input_list: list):
         )
 
 
+def unwrap_nick_temps_and_sectors(nickname_template_sector_tuples) -> tuple:
+    """
+    parses the nickname/template/sector tuples sent via Helios, e.g. '(1,2,3)|(4,2,3)' as built by
+    get_fdr_init_class_dict, fields may be separated by , or #
+    :param nickname_template_sector_tuples: str or list of tuples
+    :return: (list of (nickname, template, sector) str tuples, unique (template, sector) tuples
+    in the order they were first seen)
+    """
+    if isinstance(nickname_template_sector_tuples, str):
+        raw_tuples = nickname_template_sector_tuples.replace('), (', ')|(').replace('),(', ')|(')
+        raw_tuples = raw_tuples.split(_HELIOS_TUPLE_SEPARATOR)
+    else:
+        raw_tuples = nickname_template_sector_tuples
+    nick_and_temps = []
+    unique_template_sectors = {}
+    for raw_tuple in raw_tuples:
+        if isinstance(raw_tuple, str):
+            raw_tuple = raw_tuple.strip().strip('()').replace(_HELIOS_DATA_SEPARATOR, ',')
+            if raw_tuple == '':
+                continue
+            raw_tuple = raw_tuple.split(',')
+        nickname_id, template_id, sector_id = (str(__).strip() for __ in raw_tuple)
+        nick_and_temps.append((nickname_id, template_id, sector_id))
+        unique_template_sectors[(template_id, sector_id)] = None
+    return nick_and_temps, list(unique_template_sectors)
+
+
+@lru_cache(maxsize=8192)
+def parse_statement_date(statement_date) -> _STATEMENT_DATE:
+    """
+    parses a statementDate returned by the graph ql API, results are cached by value because
+    the same few statement dates repeat across agents
+    :param statement_date: 'yyyy-mm-dd' optionally followed by a time part, date or datetime
+    :return: StatementDate(date_key, year)
+    """
+    if isinstance(statement_date, (date, datetime)):
+        parsed = statement_date
+    else:
+        parsed = datetime.strptime(statement_date[:10], '%Y-%m-%d')
+    return _STATEMENT_DATE(parsed.strftime('%Y-%m-%d'), parsed.year)
+
+
+def get_value_from_api_dict(outer_key: str, inner_key: str, api_dict: dict):
+    """
+    returns api_dict[outer_key][inner_key] of nested API objects e.g. periodType.periodTypeDesc
+    :param outer_key: key of the nested object
+    :param inner_key: key inside the nested object
+    :param api_dict: API object
+    :return: value or None if either level is missing or null
+    """
+    nested = api_dict.get(outer_key)
+    if nested is None:
+        return None
+    return nested.get(inner_key)
+
+
 def get_graph_ql_web_link():
     """
     returns valid graphql link given the environment
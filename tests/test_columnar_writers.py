@@ -0,0 +1,51 @@
+import pytest
+
+pyarrow = pytest.importorskip('pyarrow')
+import pyarrow.ipc
+import pyarrow.parquet
+
+from writers.columnar_writers import ColumnarRowWriter
+
+
+def _read(path: str, file_format: str):
+    if file_format == 'parquet':
+        return pyarrow.parquet.read_table(path)
+    return pyarrow.ipc.open_file(path).read_all()
+
+
+@pytest.mark.parametrize('file_format', ['parquet', 'arrow'])
+def test_year_column_empty_in_first_row_group_stays_float(tmp_path, file_format):
+    # the oldest year of the range has no datapoints in the first row group
+    rows = [
+        {'NICKNAME_ID': 1, 'FDR_ID': 10, '2012': None, '2013': 1.5},
+        {'NICKNAME_ID': 2, 'FDR_ID': 10, '2012': None, '2013': 2},
+        {'NICKNAME_ID': 3, 'FDR_ID': 11, '2012': 3.5, '2013': None},
+        {'NICKNAME_ID': 4, 'FDR_ID': 11, '2012': 4, '2013': 5.0},
+    ]
+    path = str(tmp_path / f'out.{file_format}')
+    with ColumnarRowWriter(
+            path, file_format, row_group_size=2, float_columns=('2012', '2013')
+    ) as writer:
+        writer.write_rows(rows)
+
+    table = _read(path, file_format)
+    assert table.schema.field('2012').type == pyarrow.float64()
+    assert table.column('2012').to_pylist() == [None, None, 3.5, 4.0]
+    assert table.column('2013').to_pylist() == [1.5, 2.0, None, 5.0]
+
+
+@pytest.mark.parametrize('file_format', ['parquet', 'arrow'])
+def test_later_values_of_another_type_are_coerced(tmp_path, file_format):
+    rows = [
+        {'NICKNAME_ID': 1, 'SCALE_DESC': None, '2013': 1.5},
+        {'NICKNAME_ID': 2, 'SCALE_DESC': None, '2013': 2.0},
+        {'NICKNAME_ID': '3', 'SCALE_DESC': 'millions', '2013': '4.5'},
+    ]
+    path = str(tmp_path / f'out.{file_format}')
+    with ColumnarRowWriter(path, file_format, row_group_size=2) as writer:
+        writer.write_rows(rows)
+
+    table = _read(path, file_format)
+    assert table.column('NICKNAME_ID').to_pylist() == ['1', '2', '3']
+    assert table.column('SCALE_DESC').to_pylist() == [None, None, 'millions']
+    assert table.column('2013').to_pylist() == [1.5, 2.0, 4.5]
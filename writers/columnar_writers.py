@@ -0,0 +1,226 @@
+# This file is developed to write rows out as typed columns in Parquet or Arrow IPC files
+import warnings
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    # csv and json outputs keep working without pyarrow
+    pyarrow = None
+
+# rows per row group/record batch, large enough for the column encodings to pay off
+_ROW_GROUP_SIZE = 65536
+# ids and names repeat on every row of a nickname, template and sector
+_DICTIONARY_COLUMNS = (
+    'NICKNAME_ID',
+    'AGENT_ID',
+    'TEMPLATE_ID',
+    'SECTOR_ID',
+    'FDR_ID',
+    'TEMPLATE_NAME',
+    'SECTOR_NAME',
+)
+_FILE_FORMATS = ('parquet', 'arrow')
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class ColumnarRowWriter:
+
+    def __init__(
+            self,
+            destination,
+            file_format: str = 'parquet',
+            compress: bool = None,
+            row_group_size: int = _ROW_GROUP_SIZE,
+            float_columns=()
+    ):
+        """
+        writes rows as they arrive in row groups of typed columns. The columns are taken from
+        the first row and their types from the first row group: float_columns and columns
+        holding only numbers are float64 as the same field can come back as int or float from
+        the API, every other column is dictionary encoded strings. A later row group is coerced to those types, a
+        value of another type is written as its string, or as a null in a float64 column if it
+        is not a number. Dictionaries grow across row groups, an IPC file carries them as deltas
+        so it can still be memory mapped
+        :param destination: path of the output file or an open stream e.g. sys.stdout
+        :param file_format: parquet or arrow (IPC file)
+        :param compress: zstd compression of the column chunks, by default parquet is
+        compressed and arrow is not so it can be read without a copy
+        :param row_group_size: rows per row group
+        :param float_columns: columns typed float64 whatever the first row group holds, e.g.
+        the year columns, which can be empty in the first row group
+        """
+        if pyarrow is None:
+            raise ImportError("parquet and arrow outputs require pyarrow, pip install pyarrow")
+        if file_format not in _FILE_FORMATS:
+            raise ValueError('Only parquet and arrow are allowed')
+        if compress is None:
+            compress = file_format == 'parquet'
+        self._owns_file = isinstance(destination, str)
+        # pyarrow writes bytes, text streams such as sys.stdout are written through their buffer
+        self._sink = (
+            destination if self._owns_file else getattr(destination, 'buffer', destination)
+        )
+        self._file_format = file_format
+        self._compression = 'zstd' if compress else None
+        self._row_group_size = row_group_size
+        self._float_columns = frozenset(float_columns)
+        self._batch = []
+        self._columns = None
+        self._schema = None
+        # column -> value -> dictionary index, shared by every row group of the file
+        self._dictionaries = {}
+        # column -> dictionary of the last record batch, the IPC file extends it by the new values
+        self._dictionary_arrays = {}
+        # float64 columns a value had to be dropped from, warned once
+        self._coerced_columns = set()
+        self._writer = None
+        self.rows_written = 0
+
+    def write_rows(self, rows) -> None:
+        """
+        :param rows: iterable of dict rows, e.g. a generator over the API responses
+        """
+        batch = self._batch
+        for row in rows:
+            batch.append(row)
+            if len(batch) == self._row_group_size:
+                self._write_batch()
+                batch = self._batch
+
+    def _infer_type(self, column: str, values: list):
+        if column in self._float_columns:
+            return pyarrow.float64()
+        if (
+                column not in _DICTIONARY_COLUMNS
+                and any(_is_number(value) for value in values)
+                and all(value is None or _is_number(value) for value in values)
+        ):
+            return pyarrow.float64()
+        return pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+
+    def _coerce_float(self, column: str, values: list) -> list:
+        coerced = []
+        for value in values:
+            try:
+                coerced.append(None if value is None else float(value))
+            except (TypeError, ValueError):
+                if column not in self._coerced_columns:
+                    self._coerced_columns.add(column)
+                    warnings.warn(f'{column} holds values that are not numbers, written as null')
+                coerced.append(None)
+        return coerced
+
+    def _build_column(self, column: str, column_type, values: list):
+        if not pyarrow.types.is_dictionary(column_type):
+            try:
+                return pyarrow.array(values, type=column_type)
+            except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+                return pyarrow.array(self._coerce_float(column, values), type=column_type)
+        values = [
+            value if value is None or isinstance(value, str) else str(value) for value in values
+        ]
+        if self._file_format == 'parquet':
+            # parquet encodes the dictionary of every row group on its own, the batch only needs
+            # the values it holds
+            codes = {}
+            indices = [
+                None if value is None else codes.setdefault(value, len(codes)) for value in values
+            ]
+            return pyarrow.DictionaryArray.from_arrays(
+                pyarrow.array(indices, type=pyarrow.int32()),
+                pyarrow.array(list(codes), type=pyarrow.string())
+            )
+        # an IPC file can only extend a dictionary, only the values new to this batch are
+        # converted and appended to the dictionary of the last batch
+        codes = self._dictionaries.setdefault(column, {})
+        new_values = []
+        indices = []
+        for value in values:
+            if value is None:
+                indices.append(None)
+                continue
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(codes)
+                new_values.append(value)
+            indices.append(code)
+        dictionary = self._dictionary_arrays.get(column)
+        if dictionary is None and not new_values:
+            # an empty first dictionary can not be extended by a delta, it starts with ''
+            codes[''] = 0
+            new_values.append('')
+        if dictionary is None or new_values:
+            new_values = pyarrow.array(new_values, type=pyarrow.string())
+            dictionary = (
+                new_values if dictionary is None
+                else pyarrow.concat_arrays([dictionary, new_values])
+            )
+            self._dictionary_arrays[column] = dictionary
+        return pyarrow.DictionaryArray.from_arrays(
+            pyarrow.array(indices, type=pyarrow.int32()), dictionary
+        )
+
+    def _open(self, column_values: list) -> None:
+        self._schema = pyarrow.schema([
+            (column, self._infer_type(column, values))
+            for column, values in zip(self._columns, column_values)
+        ])
+        if self._file_format == 'parquet':
+            self._writer = pyarrow.parquet.ParquetWriter(
+                self._sink,
+                self._schema,
+                compression=self._compression or 'none'
+            )
+        else:
+            self._writer = pyarrow.ipc.new_file(
+                self._sink,
+                self._schema,
+                options=pyarrow.ipc.IpcWriteOptions(
+                    compression=self._compression,
+                    emit_dictionary_deltas=True
+                )
+            )
+
+    def _write_batch(self) -> None:
+        batch = self._batch
+        if self._columns is None:
+            # columns are taken from the first row, the same way the csv writer does it
+            self._columns = list(batch[0].keys())
+        column_values = [[row.get(column) for row in batch] for column in self._columns]
+        if self._writer is None:
+            self._open(column_values)
+        record_batch = pyarrow.record_batch(
+            [
+                self._build_column(field.name, field.type, values)
+                for field, values in zip(self._schema, column_values)
+            ],
+            schema=self._schema
+        )
+        if self._file_format == 'parquet':
+            self._writer.write_batch(record_batch, row_group_size=self._row_group_size)
+        else:
+            self._writer.write_batch(record_batch)
+        self.rows_written += len(batch)
+        self._batch = []
+
+    def close(self) -> None:
+        if self._batch:
+            self._write_batch()
+        if self._writer is None:
+            # no rows, an empty file without columns
+            self._columns = []
+            self._open([])
+        self._writer.close()
+        if not self._owns_file and hasattr(self._sink, 'flush'):
+            self._sink.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,181 @@
+# This file is developed to write rows out incrementally as they are produced
+import csv
+import gzip
+import io
+import json
+from abc import ABC, abstractmethod
+
+# rows are serialized into a memory buffer and handed to the file in writes of about this size
+_BUFFER_SIZE = 1 << 20
+# favours speed, multi GB exports compress to a fraction either way
+_GZIP_LEVEL = 6
+
+
+class RowWriter(ABC):
+
+    def __init__(
+            self,
+            destination,
+            newline: str = '\n',
+            compress: bool = None,
+            buffer_size: int = _BUFFER_SIZE
+    ):
+        """
+        base class of the row writers, rows are written as they arrive and never kept. They are
+        serialized into a buffer of about buffer_size characters that is written out in one go,
+        so neither the rows nor the serialized output have to fit in memory
+        :param destination: path of the output file or an open text stream e.g. sys.stdout
+        :param newline: newline translation used when destination is a path
+        :param compress: gzip the output, by default when the path ends with .gz
+        :param buffer_size: characters serialized before they are written out
+        """
+        if compress is None:
+            compress = isinstance(destination, str) and destination.endswith('.gz')
+        self._owns_file = isinstance(destination, str)
+        if self._owns_file and compress:
+            self._file = gzip.open(
+                destination, 'wt', compresslevel=_GZIP_LEVEL, encoding='utf-8', newline=newline
+            )
+        elif self._owns_file:
+            self._file = open(destination, 'w+', newline=newline, encoding='utf-8')
+        elif compress:
+            # gzip goes to the bytes underneath the stream, closing it leaves the stream open
+            self._file = io.TextIOWrapper(
+                gzip.GzipFile(
+                    fileobj=getattr(destination, 'buffer', destination),
+                    mode='wb',
+                    compresslevel=_GZIP_LEVEL
+                ),
+                encoding='utf-8',
+                newline=newline
+            )
+        else:
+            self._file = destination
+        self._stream = destination if not self._owns_file else None
+        self._compress = compress
+        self._buffer = io.StringIO()
+        self._buffer_size = buffer_size
+        self.rows_written = 0
+
+    @abstractmethod
+    def write_rows(self, rows) -> None:
+        """
+        :param rows: iterable of dict rows, e.g. a generator over the API responses
+        """
+        pass
+
+    def _flush_if_full(self) -> None:
+        if self._buffer.tell() >= self._buffer_size:
+            self._flush_buffer()
+
+    def _flush_buffer(self) -> None:
+        self._file.write(self._buffer.getvalue())
+        self._buffer.seek(0)
+        self._buffer.truncate()
+
+    def close(self) -> None:
+        self._flush_buffer()
+        if self._owns_file or self._compress:
+            self._file.close()
+        if self._stream is not None:
+            self._stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class CSVRowWriter(RowWriter):
+
+    def __init__(self, destination, delimiter: str = ',', header: bool = False, **kwargs):
+        """
+        :param destination: path of the output file or an open text stream
+        :param delimiter: csv delimiter
+        :param header: write the keys of the first row as header
+        :param kwargs: see RowWriter
+        """
+        super().__init__(destination, **kwargs)
+        self._delimiter = delimiter
+        self._header = header
+        self._dict_writer = None
+
+    def write_rows(self, rows) -> None:
+        for row in rows:
+            if self._dict_writer is None:
+                # columns are taken from the first row, the same way print_data does it
+                self._dict_writer = csv.DictWriter(
+                    self._buffer,
+                    row.keys(),
+                    delimiter=self._delimiter
+                )
+                if self._header:
+                    self._dict_writer.writeheader()
+            self._dict_writer.writerow(row)
+            self.rows_written += 1
+            self._flush_if_full()
+
+
+class JSONLinesRowWriter(RowWriter):
+
+    def write_rows(self, rows) -> None:
+        write = self._buffer.write
+        for row in rows:
+            write(json.dumps(row))
+            write('\n')
+            self.rows_written += 1
+            self._flush_if_full()
+
+
+class JSONArrayRowWriter(RowWriter):
+
+    # rows serialized by one json.dumps call, most of the encoding then runs in C
+    _BATCH_ROWS = 1024
+
+    def write_rows(self, rows) -> None:
+        """
+        rows become the items of a single JSON array, the output is the same as json.dumps of
+        the list of rows
+        """
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == self._BATCH_ROWS:
+                self._write_batch(batch)
+                batch = []
+        if batch:
+            self._write_batch(batch)
+
+    def _write_batch(self, batch: list) -> None:
+        self._buffer.write(', ' if self.rows_written else '[')
+        # the items of the batch without the brackets of the list
+        self._buffer.write(json.dumps(batch)[1:-1])
+        self.rows_written += len(batch)
+        self._flush_if_full()
+
+    def close(self) -> None:
+        self._buffer.write(']' if self.rows_written else '[]')
+        super().close()
+
+
+def get_row_writer(mode: str, destination, **kwargs) -> RowWriter:
+    """
+    returns the writer matching the output mode
+    :param mode: csv, jsonl, json, parquet or arrow
+    :param destination: path of the output file or an open text stream
+    :param kwargs: passed on to the writer
+    :return: RowWriter
+    """
+    if mode == 'csv':
+        return CSVRowWriter(destination, **kwargs)
+    elif mode == 'jsonl':
+        return JSONLinesRowWriter(destination, **kwargs)
+    elif mode == 'json':
+        return JSONArrayRowWriter(destination, **kwargs)
+    elif mode in ('parquet', 'arrow'):
+        # imported here, pyarrow is only needed for the columnar outputs
+        from writers.columnar_writers import ColumnarRowWriter
+        kwargs.pop('newline', None)
+        return ColumnarRowWriter(destination, file_format=mode, **kwargs)
+    raise ValueError('Only csv, jsonl, json, parquet and arrow are allowed')